@@ -0,0 +1,72 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+APDU encoding and response parsing, compared to per-call format strings.
+"""
+
+from u2flib_host.apdu import encode_apdu, APDUResponse
+from benchmarks import run_all
+import struct
+
+SIZES = [
+    ('version', 0),
+    ('register', 64),
+    ('authenticate', 64 + 1 + 64),
+    ('extended', 1024),
+    ('extended_max', 0xffff),
+]
+
+
+def format_string_apdu(ins, p1, p2, data):
+    size = len(data)
+    return struct.pack('B B B B B B B %is B B' % size, 0, ins, p1, p2,
+                       size >> 16 & 0xff, size >> 8 & 0xff, size & 0xff,
+                       data, 0x00, 0x00)
+
+
+def format_string_response(resp):
+    status = struct.unpack('>H', resp[-2:])[0]
+    return status, resp[:-2]
+
+
+def benchmarks():
+    for name, size in SIZES:
+        data = b'\xab' * size
+        resp = data + b'\x90\x00'
+        yield ('apdu.encode.%s' % name,
+               lambda data=data: encode_apdu(0x02, 0x03, 0, data))
+        yield ('apdu.encode_format_string.%s' % name,
+               lambda data=data: format_string_apdu(0x02, 0x03, 0, data))
+        yield ('apdu.response.%s' % name,
+               lambda resp=resp: APDUResponse(resp))
+        yield ('apdu.response_slice.%s' % name,
+               lambda resp=resp: format_string_response(resp))
+
+
+if __name__ == '__main__':
+    run_all(benchmarks())
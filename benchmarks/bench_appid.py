@@ -0,0 +1,82 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+AppIDVerifier.least_specific over a snapshot of the public suffix list.
+
+The snapshot is read from the file named by the U2F_BENCH_SUFFIX_LIST
+environment variable, or downloaded once to benchmarks/data/.
+"""
+
+from __future__ import print_function
+
+from u2flib_host.appid import AppIDVerifier, SUFFIX_URL, parse_suffixes
+from benchmarks import run_all
+import os
+import io
+
+SNAPSHOT = os.path.join(os.path.dirname(__file__), 'data',
+                        'effective_tld_names.dat')
+
+HOSTS = [
+    'https://example.com',
+    'https://login.example.co.uk',
+    'https://a.b.c.example.github.io',
+    'https://www.example.se',
+]
+
+
+def load_suffixes():
+    path = os.environ.get('U2F_BENCH_SUFFIX_LIST', SNAPSHOT)
+    if not os.path.isfile(path):
+        import requests
+        resp = requests.get(SUFFIX_URL, verify=True)
+        resp.raise_for_status()
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with io.open(path, 'w', encoding='utf8') as f:
+            f.write(resp.text)
+    with io.open(path, 'r', encoding='utf8') as f:
+        return parse_suffixes(f.read())
+
+
+def benchmarks():
+    try:
+        suffixes = load_suffixes()
+    except Exception as e:
+        print('Skipping appid benchmarks, no suffix list: %s' % e)
+        return
+    verifier = AppIDVerifier()
+    verifier._suffixes = suffixes
+    for url in HOSTS:
+        host = url.split('://')[1]
+        yield ('appid.least_specific.%s' % host,
+               lambda url=url: verifier.least_specific(url))
+
+
+if __name__ == '__main__':
+    run_all(benchmarks())
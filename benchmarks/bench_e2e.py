@@ -0,0 +1,60 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+End to end register and authenticate, from u2f through HIDDevice to an
+emulated device.
+"""
+
+from u2flib_host import u2f
+from u2flib_host.hid_emulator import U2FHIDEmulator, EmulatedHIDDevice
+from u2flib_host.utils import websafe_decode, websafe_encode
+from benchmarks.bench_soft import soft_device
+from benchmarks import run_all
+
+FACET = 'https://example.com'
+REG_DATA = {
+    'version': 'U2F_V2',
+    'challenge': 'challenge',
+    'appId': FACET
+}
+
+
+def benchmarks():
+    dev = EmulatedHIDDevice(U2FHIDEmulator(soft_device()))
+    dev.open()
+    yield ('e2e.register', lambda: u2f.register(dev, REG_DATA, FACET))
+
+    reg_data = bytearray(websafe_decode(
+        u2f.register(dev, REG_DATA, FACET)['registrationData']))
+    key_handle = bytes(reg_data[67:67 + reg_data[66]])
+    auth_data = dict(REG_DATA, keyHandle=websafe_encode(key_handle))
+    yield ('e2e.authenticate', lambda: u2f.authenticate(dev, auth_data, FACET))
+
+
+if __name__ == '__main__':
+    run_all(benchmarks())
@@ -0,0 +1,106 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+HID framing, with _send_req and _read_resp running against in-memory handles.
+
+Writes skip the fixed delay in HIDDevice._write_to_device, so that only the
+cost of the framing itself is measured.
+"""
+
+from u2flib_host import hid_transport
+from u2flib_host.device import U2FDevice
+from u2flib_host.hid_emulator import U2FHIDEmulator
+from benchmarks import run_all
+import itertools
+
+SIZES = [0, 57, 64 + 9, 129 + 9, 1024, 7609]
+CID = b'\0\0\0\x01'
+
+
+class FramingDevice(hid_transport.HIDDevice):
+
+    def _write_to_device(self, to_send, timeout=2.0):
+        self.handle.write(to_send)
+
+
+class WriteHandle(object):
+
+    def write(self, data):
+        return len(data)
+
+    def close(self):
+        pass
+
+
+class ReadHandle(object):
+
+    def __init__(self, cmd, data):
+        emulator = U2FHIDEmulator(None)
+        handle = emulator.handle()
+        handle.open_path(None)
+        emulator._send(CID, cmd, data)
+        reports = [list(bytearray(r)) for _, r in handle._reports]
+        self._reports = itertools.cycle(reports)
+
+    def read(self, size):
+        return next(self._reports)
+
+    def close(self):
+        pass
+
+
+class LoopbackDevice(U2FDevice):
+
+    def _do_send_apdu(self, apdu_data):
+        return b'\x90\x00'
+
+
+def benchmarks():
+    for size in SIZES:
+        data = b'\xab' * size
+
+        dev = FramingDevice('bench')
+        dev.handle = WriteHandle()
+        yield ('hid.send_req.%d' % size,
+               lambda dev=dev, data=data: dev._send_req(
+                   CID, hid_transport.CMD_APDU, data))
+
+        dev = FramingDevice('bench')
+        dev.handle = ReadHandle(hid_transport.CMD_APDU, data)
+        yield ('hid.read_resp.%d' % size,
+               lambda dev=dev: dev._read_resp(CID, hid_transport.CMD_APDU))
+
+    dev = LoopbackDevice()
+    for size in (0, 64, 129, 1024):
+        data = b'\xab' * size
+        yield ('device.send_apdu.%d' % size,
+               lambda data=data: dev.send_apdu(0x02, 0x03, 0, data))
+
+
+if __name__ == '__main__':
+    run_all(benchmarks())
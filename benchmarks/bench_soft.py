@@ -0,0 +1,67 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+SoftU2FDevice register and authenticate throughput, including persisting the
+device file.
+"""
+
+from u2flib_host.constants import INS_ENROLL, INS_SIGN
+from u2flib_host.soft import SoftU2FDevice
+from benchmarks import run_all
+import tempfile
+import atexit
+import os
+
+CLIENT_PARAM = b'clientABCDEFGHIJKLMNOPQRSTUVWXYZ'
+APP_PARAM = b'bench_SoftU2FDevice0123456789ABC'
+
+
+def soft_device():
+    fd, path = tempfile.mkstemp(suffix='.json')
+    os.write(fd, b'{"counter": 0, "keys": {}}')
+    os.close(fd)
+    atexit.register(os.unlink, path)
+    return SoftU2FDevice(path)
+
+
+def benchmarks():
+    dev = soft_device()
+    register_request = CLIENT_PARAM + APP_PARAM
+    yield ('soft.register',
+           lambda: dev.send_apdu(INS_ENROLL, 0x03, 0, register_request))
+
+    dev = soft_device()
+    resp = bytearray(dev.send_apdu(INS_ENROLL, 0x03, 0, register_request))
+    key_handle = bytes(resp[66:67 + resp[66]])
+    sign_request = CLIENT_PARAM + APP_PARAM + key_handle
+    yield ('soft.authenticate',
+           lambda: dev.send_apdu(INS_SIGN, 0x03, 0, sign_request))
+
+
+if __name__ == '__main__':
+    run_all(benchmarks())
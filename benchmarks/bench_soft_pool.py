@@ -0,0 +1,80 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+PooledSoftU2FDevice signing throughput with an increasing number of worker
+processes. Each call signs BATCH requests from as many threads, so the time
+per call should fall close to linearly with the number of processes, up to
+the number of CPUs.
+"""
+
+from __future__ import print_function
+
+from u2flib_host.constants import INS_ENROLL, INS_SIGN
+from u2flib_host.soft import PooledSoftU2FDevice, SigningPool
+from benchmarks import run_all
+from benchmarks.bench_soft import soft_device, CLIENT_PARAM, APP_PARAM
+from multiprocessing.pool import ThreadPool
+import multiprocessing
+import atexit
+
+BATCH = 32
+
+
+def process_counts():
+    cpus = multiprocessing.cpu_count()
+    counts = [1]
+    while counts[-1] * 2 <= cpus:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cpus:
+        counts.append(cpus)
+    return counts
+
+
+def benchmarks():
+    threads = ThreadPool(BATCH)
+    atexit.register(threads.close)
+    for processes in process_counts():
+        pool = SigningPool(processes)
+        atexit.register(pool.close)
+        dev = PooledSoftU2FDevice(soft_device().filename, pool)
+        resp = bytearray(dev.send_apdu(INS_ENROLL, 0x03, 0,
+                                       CLIENT_PARAM + APP_PARAM))
+        key_handle = bytes(resp[66:67 + resp[66]])
+        sign_request = CLIENT_PARAM + APP_PARAM + key_handle
+
+        def sign_batch(dev=dev, sign_request=sign_request):
+            threads.map(lambda _: dev.send_apdu(INS_SIGN, 0x03, 0,
+                                                sign_request), range(BATCH))
+        yield ('soft_pool.authenticate_x%d.p%d' % (BATCH, processes),
+               sign_batch)
+
+
+if __name__ == '__main__':
+    for name, seconds in sorted(run_all(benchmarks(), lambda line: None)
+                                .items()):
+        print('%-40s %10.0f signatures/s' % (name, BATCH / seconds))
@@ -0,0 +1,66 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+websafe_encode and websafe_decode, at the sizes of typical U2F fields, and
+their batch versions on BATCH values at a time.
+"""
+
+from u2flib_host.utils import (websafe_encode, websafe_decode,
+                               websafe_encode_many, websafe_decode_many)
+from benchmarks import run_all
+
+SIZES = [
+    ('key_handle', 64),
+    ('client_data', 150),
+    ('signature_data', 77),
+    ('registration_data', 800),
+    ('large', 4096),
+]
+BATCH = 100
+
+
+def benchmarks():
+    for name, size in SIZES:
+        data = bytes(bytearray(range(256)) * (size // 256 + 1))[:size]
+        encoded = websafe_encode(data)
+        yield ('utils.websafe_encode.%s' % name,
+               lambda data=data: websafe_encode(data))
+        yield ('utils.websafe_decode.%s' % name,
+               lambda encoded=encoded: websafe_decode(encoded))
+
+    for name, size in SIZES[:3]:
+        values = [bytes(bytearray([i % 256]) * size) for i in range(BATCH)]
+        encoded = websafe_encode_many(values)
+        yield ('utils.websafe_encode_many.%s' % name,
+               lambda values=values: websafe_encode_many(values))
+        yield ('utils.websafe_decode_many.%s' % name,
+               lambda encoded=encoded: websafe_decode_many(encoded))
+
+
+if __name__ == '__main__':
+    run_all(benchmarks())
@@ -0,0 +1,125 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Runs the benchmark suite, optionally writing the results as JSON and comparing
+them to the results of an earlier run:
+
+    python -m benchmarks.run -o before.json
+    (apply changes)
+    python -m benchmarks.run -o after.json -c before.json
+"""
+
+from __future__ import print_function
+
+from benchmarks import run_all
+import importlib
+import argparse
+import platform
+import json
+import sys
+import re
+
+MODULES = [
+    'benchmarks.bench_apdu',
+    'benchmarks.bench_hid',
+    'benchmarks.bench_utils',
+    'benchmarks.bench_appid',
+    'benchmarks.bench_soft',
+    'benchmarks.bench_soft_pool',
+    'benchmarks.bench_e2e',
+]
+
+
+def collect(pattern=None):
+    for name in MODULES:
+        module = importlib.import_module(name)
+        for bench in module.benchmarks():
+            if pattern is None or re.search(pattern, bench[0]):
+                yield bench
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints the change relative to baseline for each benchmark, returning the
+    names of those which got slower by more than threshold.
+    """
+    regressions = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        change = results[name] / baseline[name] - 1
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print('%-40s %+8.1f%%%s' % (name, change * 100, flag))
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Runs the u2flib_host benchmarks.",
+        add_help=True
+    )
+    parser.add_argument('-k', '--pattern', help='only run benchmarks with '
+                        'names matching the given regular expression')
+    parser.add_argument('-o', '--outfile', help='write the results as JSON '
+                        'to the given file')
+    parser.add_argument('-c', '--compare', help='compare the results to an '
+                        'earlier JSON results file')
+    parser.add_argument('-t', '--threshold', type=float, default=0.1,
+                        help='relative slowdown reported as a regression '
+                        '(default: 0.1)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    results = run_all(collect(args.pattern))
+
+    if args.outfile:
+        with open(args.outfile, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'implementation': platform.python_implementation(),
+                'platform': platform.platform(),
+                'results': results
+            }, f, indent=2, sort_keys=True)
+        sys.stderr.write('Output written to %s\n' % args.outfile)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)['results']
+        print('\n---Compared to %s---' % args.compare)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
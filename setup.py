@@ -40,12 +40,21 @@ setup(
     maintainer='Yubico Open Source Maintainers',
     maintainer_email='ossmaint@yubico.com',
     url='https://github.com/Yubico/python-u2flib-host',
-    install_requires=['requests', 'hidapi>=0.7.99'],
+    install_requires=[
+        'requests',
+        'hidapi>=0.7.99; sys_platform != "linux"',
+    ],
     test_suite='test',
     entry_points={
         'console_scripts': [
             'u2f-register=u2flib_host.register:main',
             'u2f-authenticate=u2flib_host.authenticate:main',
+            'u2f-loadgen=u2flib_host.loadgen:main',
+            'u2f-server=u2flib_host.socket_transport:main',
+        ],
+        'u2flib_host.transports': [
+            'hid=u2flib_host.hid_transport',
+            'socket=u2flib_host.socket_transport',
         ],
     },
     tests_require=tests_require,
@@ -0,0 +1,53 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Coroutine based helpers for test_appid_async, which need Python 3.5+.
+"""
+
+from u2flib_host.appid import AppIDVerifier
+from u2flib_host.appid_async import AsyncAppIDVerifier
+import asyncio
+
+
+def make_verifier(responses):
+    calls = []
+
+    class MockAsyncVerifier(AsyncAppIDVerifier):
+        async def get(self, url):
+            calls.append(url)
+            await asyncio.sleep(0.01)
+            return responses[url]
+
+    responses.setdefault('https://publicsuffix.org/list/'
+                         'effective_tld_names.dat', (200, {}, b'// x\ncom\n'))
+    return MockAsyncVerifier(AppIDVerifier()), calls
+
+
+async def verify_many(verifier, app_id, facet, count):
+    await asyncio.gather(*[verifier.verify_facet(app_id, facet)
+                           for _ in range(count)])
@@ -0,0 +1,62 @@
+
+import struct
+import unittest
+
+from u2flib_host.apdu import encode_apdu, encode_short_apdu, APDUResponse
+from u2flib_host import exc
+
+
+class TestEncodeAPDU(unittest.TestCase):
+
+    def test_empty(self):
+        self.assertEqual(encode_apdu(0x03), b'\0\x03\0\0\0\0\0\0\0')
+
+    def test_matches_format_string(self):
+        for size in (0, 1, 64, 129, 255, 256, 1024, 0xffff):
+            data = b'\xab' * size
+            expected = struct.pack('B B B B B B B %is B B' % size, 0, 0x02,
+                                   0x03, 0x04, 0, size >> 8, size & 0xff,
+                                   data, 0, 0)
+            self.assertEqual(encode_apdu(0x02, 0x03, 0x04, data), expected)
+
+    def test_too_long(self):
+        self.assertRaises(ValueError, encode_apdu, 0x02, 0, 0,
+                          b'\0' * 0x10000)
+
+
+class TestEncodeShortAPDU(unittest.TestCase):
+
+    def test_empty(self):
+        self.assertEqual(encode_short_apdu(0x03), b'\0\x03\0\0\0')
+
+    def test_data(self):
+        for size in (1, 64, 255):
+            data = b'\xab' * size
+            expected = struct.pack('B B B B B %is B' % size, 0, 0x02, 0x03,
+                                   0x04, size, data, 0)
+            self.assertEqual(encode_short_apdu(0x02, 0x03, 0x04, data),
+                             expected)
+
+    def test_too_long(self):
+        self.assertRaises(ValueError, encode_short_apdu, 0x02, 0, 0,
+                          b'\0' * 0x100)
+
+
+class TestAPDUResponse(unittest.TestCase):
+
+    def test_ok(self):
+        resp = APDUResponse(b'hello\x90\x00')
+        self.assertEqual(resp.status, 0x9000)
+        self.assertEqual(resp.data.tobytes(), b'hello')
+        self.assertIs(resp.check(), resp)
+        self.assertEqual(resp.tobytes(), b'hello')
+
+    def test_status_only(self):
+        resp = APDUResponse(b'\x69\x85')
+        self.assertEqual(resp.tobytes(), b'')
+        with self.assertRaises(exc.APDUError) as context:
+            resp.check()
+        self.assertEqual(context.exception.code, 0x6985)
+
+    def test_invalid(self):
+        self.assertRaises(exc.DeviceError, APDUResponse, b'\x90')
@@ -0,0 +1,127 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+import json
+
+try:
+    import asyncio
+    from u2flib_host.appid_async import AsyncAppIDVerifier
+    # Coroutines are defined separately, as they don't compile before 3.5.
+    from test.async_helpers import make_verifier, verify_many
+except (ImportError, SyntaxError):
+    AsyncAppIDVerifier = None
+
+APP_ID = 'https://example.com/appid'
+FACET = 'https://www.example.com'
+TRUSTED_FACETS = json.dumps({
+    'trustedFacets': [{
+        'version': {'major': 1, 'minor': 0},
+        'ids': [FACET]
+    }]
+}).encode('utf8')
+TRUSTED_TYPE = 'application/fido.trusted-apps+json'
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+@unittest.skipIf(AsyncAppIDVerifier is None, 'Requires Python 3.5+')
+class TestAsyncAppIDVerifier(unittest.TestCase):
+
+    def test_no_fetch_needed(self):
+        verifier, calls = make_verifier({})
+        run(verifier.verify_facet('https://example.com/appid',
+                                  'https://example.com'))
+        run(verifier.verify_facet('http://example.com', 'http://example.com'))
+        self.assertEqual(calls, [])
+
+    def test_verify_facet(self):
+        verifier, calls = make_verifier({
+            APP_ID: (200, {'content-type': TRUSTED_TYPE}, TRUSTED_FACETS)
+        })
+        run(verifier.verify_facet(APP_ID, FACET))
+        self.assertRaises(ValueError, run,
+                          verifier.verify_facet(APP_ID, 'https://other.com'))
+
+    def test_coalesced_fetch(self):
+        verifier, calls = make_verifier({
+            APP_ID: (200, {'content-type': TRUSTED_TYPE}, TRUSTED_FACETS)
+        })
+        run(verify_many(verifier, APP_ID, FACET, 10))
+        self.assertEqual(calls.count(APP_ID), 1)
+        self.assertEqual(len(calls), 2)
+
+    def test_primes_sync_verifier(self):
+        verifier, calls = make_verifier({
+            APP_ID: (200, {'content-type': TRUSTED_TYPE}, TRUSTED_FACETS)
+        })
+        run(verifier.verify_facet(APP_ID, FACET))
+        # Any attempt to fetch the Trusted Facet List again would fail.
+        verifier._verifier.fetch_json = None
+        verifier._verifier.verify_facet(APP_ID, FACET)
+
+    def test_redirect(self):
+        verifier, calls = make_verifier({
+            APP_ID: (302, {
+                'location': 'https://example.com/other',
+                'fido-appid-redirect-authorized': 'true'
+            }, b''),
+            'https://example.com/other': (
+                200, {'content-type': TRUSTED_TYPE}, TRUSTED_FACETS)
+        })
+        run(verifier.verify_facet(APP_ID, FACET))
+        self.assertIn('https://example.com/other', calls)
+
+    def test_unauthorized_redirect(self):
+        verifier, calls = make_verifier({
+            APP_ID: (302, {'location': 'https://example.com/other'}, b'')
+        })
+        self.assertRaises(ValueError, run, verifier.verify_facet(APP_ID, FACET))
+        self.assertNotIn('https://example.com/other', calls)
+
+    def test_invalid_content_type(self):
+        verifier, calls = make_verifier({
+            APP_ID: (200, {'content-type': 'application/json'}, TRUSTED_FACETS)
+        })
+        self.assertRaises(ValueError, run, verifier.verify_facet(APP_ID, FACET))
+
+    def test_failed_fetch_is_retried(self):
+        responses = {
+            APP_ID: (200, {'content-type': 'text/plain'}, b'')
+        }
+        verifier, calls = make_verifier(responses)
+        self.assertRaises(ValueError, run, verifier.verify_facet(APP_ID, FACET))
+        responses[APP_ID] = (200, {'content-type': TRUSTED_TYPE},
+                             TRUSTED_FACETS)
+        run(verifier.verify_facet(APP_ID, FACET))
+        self.assertEqual(calls.count(APP_ID), 2)
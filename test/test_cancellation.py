@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import tempfile
+import threading
+import unittest
+
+from u2flib_host import u2f, exc
+from u2flib_host.cancellation import CancellationToken
+from u2flib_host.hid_emulator import U2FHIDEmulator, EmulatedHIDDevice
+from u2flib_host.hid_transport import CMD_PING
+from u2flib_host.polling import PollingPolicy, poll_devices
+from u2flib_host.soft import SoftU2FDevice
+
+FACET = 'https://example.com'
+REG_DATA = {
+    'version': 'U2F_V2',
+    'challenge': 'challenge',
+    'appId': FACET
+}
+
+
+def cancel_later(token, delay=0.1):
+    timer = threading.Timer(delay, token.cancel)
+    timer.start()
+    return timer
+
+
+class TestCancellationToken(unittest.TestCase):
+
+    def test_cancel(self):
+        token = CancellationToken()
+        self.assertIsNone(token.remaining())
+        token.check()
+        token.cancel()
+        self.assertTrue(token.cancelled)
+        self.assertRaises(exc.CancelledError, token.check)
+
+    def test_deadline(self):
+        token = CancellationToken(0.05)
+        self.assertTrue(0 < token.remaining() <= 0.05)
+        start = time.time()
+        self.assertRaises(exc.DeadlineExceededError, token.wait, 10)
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(token.remaining(), 0)
+
+    def test_wait_wakes_on_cancel(self):
+        token = CancellationToken()
+        cancel_later(token)
+        start = time.time()
+        self.assertRaises(exc.CancelledError, token.wait, 10)
+        self.assertLess(time.time() - start, 1)
+
+
+class TestCancelDevice(unittest.TestCase):
+
+    def setUp(self):
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(json.dumps({"counter": 0, "keys": {}}).encode('utf8'))
+            self.device_path = f.name
+
+    def tearDown(self):
+        os.unlink(self.device_path)
+
+    def emulator(self, **kwargs):
+        return U2FHIDEmulator(SoftU2FDevice(self.device_path), **kwargs)
+
+    def test_call_cancelled(self):
+        emulator = self.emulator(capabilities=0x05)
+        with EmulatedHIDDevice(emulator) as dev:
+            emulator.latency = 1.5
+            token = CancellationToken()
+            cancel_later(token)
+            start = time.time()
+            self.assertRaises(exc.CancelledError, dev.call, CMD_PING, b'ab',
+                              token)
+            self.assertLess(time.time() - start, 1)
+            self.assertEqual(emulator.cancels, 1)
+
+            # The cancelled response is dropped, not read by the next call.
+            emulator.latency = 0
+            self.assertEqual(dev.ping(b'cd'), b'cd')
+
+    def test_call_deadline_without_cancel(self):
+        emulator = self.emulator()
+        with EmulatedHIDDevice(emulator) as dev:
+            emulator.latency = 1.5
+            self.assertRaises(exc.DeadlineExceededError, dev.call, CMD_PING,
+                              b'ab', CancellationToken(0.1))
+            # CANCEL is only sent to devices supporting CTAP2.
+            self.assertEqual(emulator.cancels, 0)
+
+            # The late response isn't taken for that of the next call.
+            cid = dev.cid
+            emulator.latency = 0.5
+            self.assertEqual(dev.ping(b'fresh'), b'fresh')
+            self.assertNotEqual(dev.cid, cid)
+            emulator.latency = 0
+            self.assertEqual(dev.ping(b'again'), b'again')
+
+    def test_register_cancelled(self):
+        with EmulatedHIDDevice(self.emulator()) as dev:
+            token = CancellationToken()
+            token.cancel()
+            self.assertRaises(exc.CancelledError, u2f.register, dev,
+                              REG_DATA, FACET, token)
+            self.assertIsNone(dev.token)
+
+    def test_register_deadline(self):
+        emulator = self.emulator(capabilities=0x05)
+        with EmulatedHIDDevice(emulator) as dev:
+            dev.get_supported_versions()
+            emulator.latency = 1.5
+            self.assertRaises(exc.DeadlineExceededError, u2f.register, dev,
+                              REG_DATA, FACET, CancellationToken(0.1))
+            self.assertEqual(emulator.cancels, 1)
+
+    def test_poll_devices_cancelled(self):
+        with EmulatedHIDDevice(self.emulator(touch_delay=10)) as dev:
+            token = CancellationToken()
+            cancel_later(token, 0.2)
+            start = time.time()
+            self.assertRaises(
+                exc.CancelledError, poll_devices, [dev],
+                lambda d: u2f.register(d, REG_DATA, FACET, token),
+                PollingPolicy(initial_interval=1, max_interval=1), token=token)
+            self.assertLess(time.time() - start, 1)
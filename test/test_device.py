@@ -0,0 +1,117 @@
+
+import unittest
+
+from u2flib_host.constants import INS_ENROLL, INS_GET_VERSION, INS_SIGN
+from u2flib_host.device import U2FDevice, VersionCache
+from u2flib_host.metrics import Metrics
+
+
+class MockDevice(U2FDevice):
+
+    def __init__(self, identity=None, response=b'U2F_V2\x90\x00'):
+        self.identity = identity
+        self.response = response
+        self.apdus = []
+
+    def _do_send_apdu(self, apdu_data):
+        self.apdus.append(apdu_data)
+        return self.response
+
+
+class ExtendedOnlyDevice(MockDevice):
+
+    def _do_send_apdu(self, apdu_data):
+        self.apdus.append(apdu_data)
+        if len(apdu_data) < 7 or bytearray(apdu_data)[4] != 0:
+            return b'\x67\x00'
+        return self.response
+
+
+class TestAPDUEncoding(unittest.TestCase):
+
+    def test_short(self):
+        dev = MockDevice()
+        dev.send_apdu(INS_SIGN, 0x03, 0, b'\xab' * 100)
+        self.assertEqual(len(dev.apdus[0]), 4 + 1 + 100 + 1)
+        self.assertTrue(dev.short_apdus)
+
+    def test_extended_when_needed(self):
+        dev = MockDevice()
+        dev.send_apdu(INS_SIGN, 0x03, 0, b'\xab' * 256)
+        dev.send_apdu(INS_ENROLL, 0x03, 0, b'\xab' * 64)
+        self.assertEqual([len(a) for a in dev.apdus], [4 + 3 + 256 + 2,
+                                                         4 + 3 + 64 + 2])
+        self.assertIsNone(dev.short_apdus)
+
+    def test_fallback(self):
+        dev = ExtendedOnlyDevice()
+        dev.metrics = Metrics()
+        self.assertEqual(dev.send_apdu(INS_GET_VERSION), b'U2F_V2')
+        self.assertIs(dev.short_apdus, False)
+        self.assertEqual(dev.send_apdu(INS_GET_VERSION), b'U2F_V2')
+        self.assertEqual([len(a) for a in dev.apdus], [5, 9, 9])
+        self.assertIn({'name': 'apdu_short_rejected', 'labels': {},
+                       'value': 1}, dev.metrics.snapshot()['counters'])
+
+
+class TestVersionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = VersionCache()
+        U2FDevice.version_cache = self.cache
+
+    def tearDown(self):
+        U2FDevice.version_cache = VersionCache()
+
+    def test_probe_once_per_identity(self):
+        dev = MockDevice(('/dev/a', 0x1050, 0x0120, u''))
+        self.assertEqual(dev.get_supported_versions(), ['U2F_V2'])
+        self.assertEqual(len(dev.apdus), 1)
+        self.assertEqual(bytearray(dev.apdus[0])[1], INS_GET_VERSION)
+
+        dev2 = MockDevice(('/dev/a', 0x1050, 0x0120, u''))
+        self.assertEqual(dev2.get_supported_versions(), ['U2F_V2'])
+        self.assertEqual(dev2.apdus, [])
+
+    def test_no_identity(self):
+        for _ in range(2):
+            dev = MockDevice()
+            self.assertEqual(dev.get_supported_versions(), ['U2F_V2'])
+            self.assertEqual(len(dev.apdus), 1)
+        self.assertEqual(self.cache._versions, {})
+
+    def test_failed_probe_not_cached(self):
+        dev = MockDevice('a', b'\x6a\x80')
+        self.assertEqual(dev.get_supported_versions(), [])
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_v0(self):
+        dev = MockDevice('a', b'\x6d\x00')
+        self.assertEqual(dev.get_supported_versions(), ['v0'])
+        self.assertEqual(self.cache.get('a'), ['v0'])
+
+    def test_retain(self):
+        self.cache.put('a', ['U2F_V2'])
+        self.cache.put('b', ['U2F_V2'])
+        self.cache.retain(['b', 'c'])
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.get('b'), ['U2F_V2'])
+
+    def test_short_apdus_per_identity(self):
+        dev = ExtendedOnlyDevice('a')
+        dev.send_apdu(INS_GET_VERSION)
+        self.assertIs(self.cache.get_short_apdus('a'), False)
+
+        # A new handle to the same device skips the rejected round trip.
+        dev2 = ExtendedOnlyDevice('a')
+        dev2.send_apdu(INS_GET_VERSION)
+        self.assertEqual([len(a) for a in dev2.apdus], [9])
+
+        self.cache.retain(['b'])
+        self.assertIsNone(self.cache.get_short_apdus('a'))
+
+    def test_disabled(self):
+        U2FDevice.version_cache = None
+        dev = MockDevice('a')
+        self.assertEqual(dev.get_supported_versions(), ['U2F_V2'])
+        self.assertEqual(self.cache.get('a'), None)
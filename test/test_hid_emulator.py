@@ -0,0 +1,212 @@
+
+import os
+import json
+import time
+import tempfile
+import threading
+import unittest
+
+from u2flib_host import u2f, exc
+from u2flib_host.constants import APDU_USE_NOT_SATISFIED
+from u2flib_host.apdu import parse_apdu
+from u2flib_host.hid_emulator import U2FHIDEmulator, EmulatedHIDDevice
+from u2flib_host.hid_transport import (U2FHIDError, RetryPolicy,
+                                       ERR_CHANNEL_BUSY, ERR_INVALID_CMD,
+                                       KEEPALIVE_UPNEEDED)
+from u2flib_host.metrics import Metrics
+from u2flib_host.soft import SoftU2FDevice
+from u2flib_host.utils import websafe_decode, websafe_encode
+
+FACET = 'https://example.com'
+REG_DATA = {
+    'version': 'U2F_V2',
+    'challenge': 'challenge',
+    'appId': FACET
+}
+
+
+class TestParseAPDU(unittest.TestCase):
+
+    def test_extended(self):
+        self.assertEqual(parse_apdu(b'\0\x02\x03\0\0\0\x02ab\0\0'),
+                         (0, 2, 3, 0, b'ab'))
+        self.assertEqual(parse_apdu(b'\0\x03\0\0\0\0\0\0\0'),
+                         (0, 3, 0, 0, b''))
+
+    def test_short(self):
+        self.assertEqual(parse_apdu(b'\0\x02\x03\0\x02ab\0'),
+                         (0, 2, 3, 0, b'ab'))
+        self.assertEqual(parse_apdu(b'\0\x03\0\0\0'), (0, 3, 0, 0, b''))
+        self.assertEqual(parse_apdu(b'\0\x03\0\0'), (0, 3, 0, 0, b''))
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, parse_apdu, b'\0\x02')
+        self.assertRaises(ValueError, parse_apdu, b'\0\x02\x03\0\x05ab')
+
+
+class TestU2FHIDEmulator(unittest.TestCase):
+
+    def setUp(self):
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(json.dumps({"counter": 0, "keys": {}}).encode('utf8'))
+            self.device_path = f.name
+        self.emulator = U2FHIDEmulator(SoftU2FDevice(self.device_path))
+
+    def tearDown(self):
+        os.unlink(self.device_path)
+
+    def test_channel_allocation(self):
+        with EmulatedHIDDevice(self.emulator) as dev1:
+            with EmulatedHIDDevice(self.emulator) as dev2:
+                self.assertNotEqual(dev1.cid, dev2.cid)
+                self.assertNotEqual(dev1.cid, b'\xff\xff\xff\xff')
+                self.assertEqual(dev1.capabilities, 0x01)
+
+    def test_ping_fragmentation(self):
+        msg = os.urandom(1000)
+        with EmulatedHIDDevice(self.emulator) as dev:
+            self.assertEqual(dev.ping(msg), msg)
+            self.assertEqual(dev.ping(b''), b'')
+
+    def test_wink(self):
+        with EmulatedHIDDevice(self.emulator) as dev:
+            dev.wink()
+        self.assertEqual(self.emulator.winks, 1)
+
+    def test_lock(self):
+        with EmulatedHIDDevice(self.emulator) as dev1:
+            with EmulatedHIDDevice(self.emulator) as dev2:
+                dev1.lock(5)
+                dev1.ping()
+                with self.assertRaises(U2FHIDError) as context:
+                    dev2.ping()
+                self.assertEqual(context.exception.code, ERR_CHANNEL_BUSY)
+                dev1.lock(0)
+                dev2.ping()
+
+    def test_invalid_cid(self):
+        with EmulatedHIDDevice(self.emulator) as dev:
+            dev.retry_policy = None
+            dev.cid = b'\0\0\0\x10'
+            self.assertRaises(U2FHIDError, dev.ping)
+
+    def test_latency(self):
+        self.emulator.latency = 0.1
+        with EmulatedHIDDevice(self.emulator) as dev:
+            start = time.time()
+            dev.wink()
+            self.assertGreaterEqual(time.time() - start, 0.1)
+
+    def test_jitter_is_seeded(self):
+        delays = []
+        for _ in range(2):
+            emulator = U2FHIDEmulator(None, jitter=0.001, seed=42)
+            with EmulatedHIDDevice(emulator) as dev:
+                dev.ping()
+            delays.append(emulator._random.random())
+        self.assertEqual(delays[0], delays[1])
+
+    def test_register_authenticate(self):
+        with EmulatedHIDDevice(self.emulator) as dev:
+            self.assertEqual(dev.get_supported_versions(), ['U2F_V2'])
+            resp = u2f.register(dev, REG_DATA, FACET)
+            # Key handle length at offset 66, followed by the key handle.
+            reg_data = bytearray(websafe_decode(resp['registrationData']))
+            key_handle = bytes(reg_data[67:67 + reg_data[66]])
+            auth_data = dict(REG_DATA, keyHandle=websafe_encode(key_handle))
+            resp = u2f.authenticate(dev, auth_data, FACET)
+            self.assertIn('signatureData', resp)
+
+    def test_extended_only(self):
+        self.emulator.short_apdus = False
+        with EmulatedHIDDevice(self.emulator) as dev:
+            resp = u2f.register(dev, REG_DATA, FACET)
+            reg_data = bytearray(websafe_decode(resp['registrationData']))
+            key_handle = bytes(reg_data[67:67 + reg_data[66]])
+            auth_data = dict(REG_DATA, keyHandle=websafe_encode(key_handle))
+            self.assertIn('signatureData',
+                          u2f.authenticate(dev, auth_data, FACET))
+            self.assertIs(dev.short_apdus, False)
+
+    def test_unknown_key_handle(self):
+        auth_data = dict(REG_DATA, keyHandle=websafe_encode(b'\0' * 64))
+        with EmulatedHIDDevice(self.emulator) as dev:
+            self.assertRaises(exc.APDUError, u2f.authenticate, dev,
+                              auth_data, FACET)
+
+    def test_touch_delay(self):
+        self.emulator.touch_delay = 0.2
+        with EmulatedHIDDevice(self.emulator) as dev:
+            with self.assertRaises(exc.APDUError) as context:
+                u2f.register(dev, REG_DATA, FACET)
+            self.assertEqual(context.exception.code, APDU_USE_NOT_SATISFIED)
+            time.sleep(0.2)
+            self.assertIn('registrationData',
+                          u2f.register(dev, REG_DATA, FACET))
+
+    def test_keepalive(self):
+        self.emulator.touch_delay = 0.35
+        self.emulator.keepalive = True
+        metrics = Metrics()
+        statuses = []
+        with EmulatedHIDDevice(self.emulator) as dev:
+            dev.get_supported_versions()
+            dev.metrics = metrics
+            dev.on_keepalive = statuses.append
+            start = time.time()
+            self.assertIn('registrationData',
+                          u2f.register(dev, REG_DATA, FACET))
+            self.assertGreaterEqual(time.time() - start, 0.35)
+        # A single request, waiting for the touch.
+        timings = dict((t['name'], t['count'])
+                       for t in metrics.snapshot()['timings'])
+        self.assertEqual(timings['apdu'], 1)
+        self.assertEqual(statuses, [KEEPALIVE_UPNEEDED] * 4)
+
+
+class TestRetry(unittest.TestCase):
+
+    def setUp(self):
+        self.emulator = U2FHIDEmulator(None)
+
+    def test_reinit_on_invalid_cid(self):
+        with EmulatedHIDDevice(self.emulator) as dev:
+            cid = dev.cid
+            # The device lost track of the channel, e.g. after a reset.
+            self.emulator._channels.clear()
+            self.assertEqual(dev.ping(b'abc'), b'abc')
+            self.assertNotEqual(dev.cid, cid)
+
+    def test_retry_busy(self):
+        with EmulatedHIDDevice(self.emulator) as dev1, \
+                EmulatedHIDDevice(self.emulator) as dev2:
+            dev2.retry_policy = RetryPolicy(10, 0.05, 0.1)
+            dev1.lock(5)
+            timer = threading.Timer(0.1, dev1.lock, (0,))
+            timer.start()
+            self.assertEqual(dev2.ping(b'abc'), b'abc')
+            timer.join()
+
+    def test_gives_up(self):
+        with EmulatedHIDDevice(self.emulator) as dev1, \
+                EmulatedHIDDevice(self.emulator) as dev2:
+            dev2.retry_policy = RetryPolicy(3, 0.01, 0.01)
+            dev1.lock(5)
+            start = time.time()
+            with self.assertRaises(U2FHIDError) as context:
+                dev2.ping()
+            self.assertTrue(context.exception.transient)
+            self.assertLess(time.time() - start, 0.5)
+
+    def test_permanent_not_retried(self):
+        with EmulatedHIDDevice(self.emulator) as dev:
+            with self.assertRaises(U2FHIDError) as context:
+                dev.call(0x3f)
+            self.assertEqual(context.exception.code, ERR_INVALID_CMD)
+            self.assertFalse(context.exception.transient)
+
+    def test_delay(self):
+        policy = RetryPolicy(initial_delay=0.1, max_delay=0.3)
+        for attempt, delay in [(1, 0.1), (2, 0.2), (3, 0.3), (4, 0.3)]:
+            self.assertTrue(delay / 2 <= policy.delay(attempt) <= delay)
+        self.assertRaises(ValueError, RetryPolicy, 0)
@@ -88,3 +88,96 @@ class HIDDeviceTest(unittest.TestCase):
         self.assertFalse(dev.ctap2_enabled())
         dev.capabilities = 0x04
         self.assertTrue(dev.ctap2_enabled())
+
+
+class ListDevicesTest(unittest.TestCase):
+    def test_identity_and_unplug(self):
+        info = {
+            'path': b'/dev/hidraw0',
+            'vendor_id': 0x1050,
+            'product_id': 0x0407,
+            'serial_number': u'',
+            'usage_page': 0xf1d0,
+            'usage': 1,
+        }
+        cache = hid_transport.U2FDevice.version_cache
+        with patch.object(hid_transport.hid, 'enumerate',
+                          return_value=[info]):
+            devices = hid_transport.list_devices()
+        self.assertEqual(len(devices), 1)
+        identity = devices[0].identity
+        self.assertEqual(identity,
+                         (b'/dev/hidraw0', 0x1050, 0x0407, u''))
+
+        cache.put(identity, ['U2F_V2'])
+        with patch.object(hid_transport.hid, 'enumerate', return_value=[]):
+            self.assertEqual(hid_transport.list_devices(), [])
+        self.assertIsNone(cache.get(identity))
+
+    def test_other_transports_kept(self):
+        cache = hid_transport.U2FDevice.version_cache
+        identity = ('127.0.0.1:6842', 'soft:a')
+        cache.put(identity, ['U2F_V2'])
+        cache.put_short_apdus(identity, False)
+        try:
+            with patch.object(hid_transport.hid, 'enumerate',
+                              return_value=[]):
+                hid_transport.list_devices()
+            self.assertEqual(cache.get(identity), ['U2F_V2'])
+            self.assertIs(cache.get_short_apdus(identity), False)
+        finally:
+            cache.invalidate(identity)
+
+    def info(self, path, product_id, usage_page=0, usage=0):
+        return {
+            'path': path,
+            'vendor_id': 0x1050,
+            'product_id': product_id,
+            'serial_number': u'',
+            'usage_page': usage_page,
+            'usage': usage,
+        }
+
+    def test_usage_page_from_descriptor(self):
+        # Without usage pages from hidapi, they're read from sysfs.
+        usages = {
+            b'/dev/hidraw0': [(0x01, 0x06)],  # Keyboard interface
+            b'/dev/hidraw1': [(0xf1d0, 0x01)],
+            b'/dev/hidraw2': [(0xf1d0, 0x01)],  # Not in DEVICES
+        }
+        infos = [self.info(b'/dev/hidraw0', 0x0407),
+                 self.info(b'/dev/hidraw1', 0x0407),
+                 self.info(b'/dev/hidraw2', 0xffff)]
+        with patch.object(hid_transport.hid, 'enumerate',
+                          return_value=infos), \
+                patch.object(hid_transport.sys, 'platform', 'linux'), \
+                patch.object(hid_transport.linux_hidraw, 'usages',
+                             side_effect=usages.get), \
+                patch.object(hid_transport.HIDDevice, 'open') as open_:
+            devices = hid_transport.list_devices()
+        self.assertEqual([d.path for d in devices],
+                         [b'/dev/hidraw1', b'/dev/hidraw2'])
+        open_.assert_not_called()
+
+    def test_unknown_usage_page(self):
+        # Devices in DEVICES are opened to check them, others ignored.
+        infos = [self.info(b'0001:0002:00', 0x0407),
+                 self.info(b'0001:0003:00', 0x0407),
+                 self.info(b'0001:0004:00', 0xffff)]
+        opened = []
+
+        def open_(device):
+            opened.append(device.path)
+            if device.path == b'0001:0003:00':
+                raise exc.DeviceError('Wrong INIT response from device')
+
+        with patch.object(hid_transport.hid, 'enumerate',
+                          return_value=infos), \
+                patch.object(hid_transport.linux_hidraw, 'usages',
+                             side_effect=IOError), \
+                patch.object(hid_transport.HIDDevice, 'open', open_), \
+                patch.object(hid_transport.HIDDevice,
+                             'get_supported_versions'):
+            devices = hid_transport.list_devices()
+        self.assertEqual([d.path for d in devices], [b'0001:0002:00'])
+        self.assertEqual(opened, [b'0001:0002:00', b'0001:0003:00'])
@@ -0,0 +1,60 @@
+
+import subprocess
+import unittest
+import sys
+
+# Cumulative budget for "import u2flib_host.u2f", in microseconds. Importing
+# requests on its own takes about this long.
+IMPORT_BUDGET_US = 100000
+
+SCRIPT = '''
+import sys
+import u2flib_host.u2f
+sys.stdout.write(",".join(m for m in ("requests", "urllib3")
+                          if m in sys.modules))
+'''
+
+
+def import_u2f():
+    proc = subprocess.Popen([sys.executable, '-X', 'importtime', '-c', SCRIPT],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = proc.communicate()
+    return proc.returncode, out.decode('utf8'), err.decode('utf8')
+
+
+def cumulative_us(importtime_output, module):
+    for line in importtime_output.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].rstrip() == ' ' + module:
+            return int(parts[1])
+    raise ValueError('No import time recorded for %s' % module)
+
+
+@unittest.skipIf(sys.version_info < (3, 7), 'Requires -X importtime')
+class TestImportTime(unittest.TestCase):
+
+    def setUp(self):
+        self.returncode, self.out, self.err = import_u2f()
+        if self.returncode != 0:
+            self.fail('Unable to import u2flib_host.u2f:\n' + self.err)
+
+    def test_no_network_imports(self):
+        self.assertEqual(self.out, '')
+
+    def test_import_budget(self):
+        self.assertLess(cumulative_us(self.err, 'u2flib_host.u2f'),
+                        IMPORT_BUDGET_US)
+
+
+class TestLazyTransports(unittest.TestCase):
+
+    def test_cli_imports(self):
+        # The CLIs only load transports once listing devices.
+        script = ('import sys, u2flib_host.authenticate, u2flib_host.register;'
+                  'sys.stdout.write(str("u2flib_host.hid_transport" in '
+                  'sys.modules))')
+        proc = subprocess.Popen([sys.executable, '-c', script],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = proc.communicate()
+        self.assertEqual(proc.returncode, 0, err.decode('utf8'))
+        self.assertEqual(out.decode('utf8'), 'False')
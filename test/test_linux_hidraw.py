@@ -0,0 +1,171 @@
+import os
+import select
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from u2flib_host import linux_hidraw
+from u2flib_host.hid_transport import _read_timeout
+from u2flib_host.linux_hidraw import parse_report_descriptor
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+FIDO_DESCRIPTOR = bytes(bytearray([
+    0x06, 0xd0, 0xf1,  # Usage Page (FIDO Alliance)
+    0x09, 0x01,  # Usage (U2F Authenticator Device)
+    0xa1, 0x01,  # Collection (Application)
+    0x09, 0x20, 0x15, 0x00, 0x26, 0xff, 0x00, 0x75, 0x08, 0x95, 0x40,
+    0x81, 0x02,  # Input
+    0x09, 0x21, 0x15, 0x00, 0x26, 0xff, 0x00, 0x75, 0x08, 0x95, 0x40,
+    0x91, 0x02,  # Output
+    0xc0  # End Collection
+]))
+
+KEYBOARD_DESCRIPTOR = bytes(bytearray([
+    0x05, 0x01,  # Usage Page (Generic Desktop)
+    0x09, 0x06,  # Usage (Keyboard)
+    0xa1, 0x01,  # Collection (Application)
+    0x05, 0x07, 0x19, 0xe0, 0x29, 0xe7, 0x75, 0x01, 0x95, 0x08,
+    0x81, 0x02,  # Input
+    0xc0  # End Collection
+]))
+
+
+class TestParseReportDescriptor(unittest.TestCase):
+
+    def test_fido(self):
+        self.assertEqual(parse_report_descriptor(FIDO_DESCRIPTOR),
+                         [(0xf1d0, 0x01)])
+
+    def test_several_collections(self):
+        self.assertEqual(
+            parse_report_descriptor(KEYBOARD_DESCRIPTOR + FIDO_DESCRIPTOR),
+            [(0x01, 0x06), (0xf1d0, 0x01)])
+
+    def test_extended_usage(self):
+        # A 4 byte usage, with its own usage page, within push and pop.
+        descriptor = bytearray([0x05, 0x01, 0xa4, 0x05, 0x0c, 0x0b, 0x01,
+                                0x00, 0xd0, 0xf1, 0xb4, 0xa1, 0x01, 0xc0])
+        self.assertEqual(parse_report_descriptor(descriptor),
+                         [(0xf1d0, 0x01)])
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, parse_report_descriptor, b'\x06\xd0')
+        self.assertRaises(ValueError, parse_report_descriptor, b'\xb4')
+
+
+class TestLinuxHidraw(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.sysfs = os.path.join(self.directory, 'sys')
+        self.dev = os.path.join(self.directory, 'dev')
+        os.mkdir(self.dev)
+        self.add('hidraw0', '0003:0000046D:0000C31C', KEYBOARD_DESCRIPTOR)
+        self.add('hidraw1', '0003:00001050:00000407', FIDO_DESCRIPTOR,
+                 'Yubico YubiKey', 'ABC')
+        self.add('hidraw2', '0003:00001234:00005678', b'\x06\xd0')
+        for name, value in (('SYSFS_HIDRAW', self.sysfs),
+                            ('DEV_DIR', self.dev)):
+            patcher = patch.object(linux_hidraw, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def add(self, name, hid_id, descriptor, hid_name='', uniq=''):
+        device_dir = os.path.join(self.sysfs, name, 'device')
+        os.makedirs(device_dir)
+        with open(os.path.join(device_dir, 'uevent'), 'w') as f:
+            f.write('DRIVER=hid-generic\nHID_ID=%s\nHID_NAME=%s\n'
+                    'HID_UNIQ=%s\n' % (hid_id, hid_name, uniq))
+        with open(os.path.join(device_dir, 'report_descriptor'), 'wb') as f:
+            f.write(descriptor)
+
+    def test_enumerate(self):
+        devices = linux_hidraw.enumerate()
+        # The device with an invalid descriptor is skipped.
+        self.assertEqual([(d['usage_page'], d['usage']) for d in devices],
+                         [(0x01, 0x06), (0xf1d0, 0x01)])
+        fido = devices[1]
+        self.assertEqual(fido['path'],
+                         os.path.join(self.dev, 'hidraw1').encode('utf8'))
+        self.assertEqual((fido['vendor_id'], fido['product_id']),
+                         (0x1050, 0x0407))
+        self.assertEqual(fido['serial_number'], 'ABC')
+        self.assertEqual(fido['product_string'], 'Yubico YubiKey')
+        self.assertEqual(linux_hidraw.enumerate(0x1050, 0x0407), [fido])
+        self.assertEqual(linux_hidraw.enumerate(0x1050, 0x0001), [])
+
+    def test_usages(self):
+        self.assertEqual(linux_hidraw.usages(b'/dev/hidraw1'),
+                         [(0xf1d0, 0x01)])
+        self.assertRaises(IOError, linux_hidraw.usages, '/dev/hidraw9')
+
+    def test_no_hidraw(self):
+        shutil.rmtree(self.sysfs)
+        self.assertEqual(linux_hidraw.enumerate(), [])
+
+    def test_read_write(self):
+        # A FIFO stands in for the character device.
+        path = os.path.join(self.dev, 'hidraw1')
+        os.mkfifo(path)
+        dev = linux_hidraw.device()
+        dev.open_path(path.encode('utf8'))
+        try:
+            self.assertEqual(dev.read(64), b'')
+            report = bytearray(b'\0' + b'\xab' * 64)
+            self.assertEqual(dev.write(report), 65)
+            self.assertEqual(dev.read(65), bytes(report))
+        finally:
+            dev.close()
+        self.assertRaises(ValueError, dev.fileno)
+
+
+class PipeHandle(object):
+
+    def __init__(self):
+        self._read, self.write_fd = os.pipe()
+        self.reads = 0
+
+    def fileno(self):
+        return self._read
+
+    def read(self, size):
+        self.reads += 1
+        try:
+            return os.read(self._read, size) if self._ready() else b''
+        except OSError:
+            return b''
+
+    def _ready(self):
+        return bool(select.select([self._read], [], [], 0)[0])
+
+    def close(self):
+        os.close(self._read)
+        os.close(self.write_fd)
+
+
+class TestReadTimeout(unittest.TestCase):
+
+    def test_waits_on_fileno(self):
+        handle = PipeHandle()
+        try:
+            timer = threading.Timer(0.2, os.write, (handle.write_fd, b'hi'))
+            timer.start()
+            start = time.time()
+            self.assertEqual(_read_timeout(handle, 64), b'hi')
+            self.assertGreaterEqual(time.time() - start, 0.15)
+            # Woken up by the data, not polling in the meantime.
+            self.assertLessEqual(handle.reads, 2)
+
+            self.assertEqual(_read_timeout(handle, 64, 0.1), [])
+            timer.join()
+        finally:
+            handle.close()
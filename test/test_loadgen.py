@@ -0,0 +1,233 @@
+import os
+import io
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from contextlib import contextmanager
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+
+from u2flib_host import loadgen
+from u2flib_host.loadgen import (LoadGenerator, HTTPRelyingParty, Report,
+                                 generate_tasks, percentile)
+from u2flib_host.soft_farm import SoftTokenFarm
+from u2flib_host.utils import websafe_decode, websafe_encode
+
+APP_ID = 'https://example.com'
+
+
+class RelyingParty(object):
+
+    # A minimal stand-in for a U2F server, checking challenges only.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.challenges = {}
+        self.key_handles = {}
+        self.completed = {'register': 0, 'authenticate': 0}
+
+    def begin(self, kind, user):
+        challenge = websafe_encode(os.urandom(32))
+        request = {'version': 'U2F_V2', 'challenge': challenge,
+                   'appId': APP_ID}
+        with self.lock:
+            if kind == 'authenticate':
+                if user not in self.key_handles:
+                    return None
+                request['keyHandle'] = self.key_handles[user]
+            self.challenges.setdefault((kind, user), set()).add(challenge)
+        return request
+
+    def complete(self, kind, user, response):
+        client_data = json.loads(websafe_decode(response['clientData'])
+                                 .decode('utf8'))
+        with self.lock:
+            challenges = self.challenges.get((kind, user), set())
+            if client_data['challenge'] not in challenges:
+                return False
+            challenges.remove(client_data['challenge'])
+            if kind == 'register':
+                reg_data = bytearray(
+                    websafe_decode(response['registrationData']))
+                self.key_handles[user] = websafe_encode(
+                    bytes(reg_data[67:67 + reg_data[66]]))
+            self.completed[kind] += 1
+        return True
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def _parse(self):
+        url = urlparse(self.path)
+        return url.path.strip('/'), parse_qs(url.query)['user'][0]
+
+    def _reply(self, status, data):
+        body = json.dumps(data).encode('utf8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        request = self.server.rp.begin(*self._parse())
+        self._reply(200 if request else 404, request or {})
+
+    def do_POST(self):
+        size = int(self.headers['Content-Length'])
+        response = json.loads(self.rfile.read(size).decode('utf8'))
+        ok = self.server.rp.complete(*(self._parse() + (response,)))
+        self._reply(200 if ok else 400, {})
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@contextmanager
+def serve():
+    server = Server(('127.0.0.1', 0), Handler)
+    server.rp = RelyingParty()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class TestLoadGenerator(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile([3], 90), 3)
+        self.assertIsNone(percentile([], 50))
+
+    def test_http(self):
+        with serve() as server:
+            url = 'http://127.0.0.1:%d/' % server.server_port
+            generator = LoadGenerator(SoftTokenFarm(self.directory),
+                                      HTTPRelyingParty(url), concurrency=4)
+            report = generator.run(generate_tasks(12, 5, 'both'))
+            self.assertEqual(server.rp.completed,
+                             {'register': 12, 'authenticate': 12})
+
+        summary = report.summary()
+        for kind in ('register', 'authenticate'):
+            stats = summary['operations'][kind]
+            self.assertEqual(stats['count'], 12)
+            self.assertEqual(stats['errors'], 0)
+            self.assertTrue(stats['p50'] <= stats['p99'] <= stats['max'])
+        self.assertIn('authenticate', report.format())
+
+    def test_errors(self):
+        with serve() as server:
+            url = 'http://127.0.0.1:%d' % server.server_port
+            generator = LoadGenerator(SoftTokenFarm(self.directory),
+                                      HTTPRelyingParty(url))
+            report = generator.run(generate_tasks(2, 2, 'authenticate'))
+        self.assertEqual(report.summary()['operations']['authenticate'],
+                         dict(count=0, errors=2, throughput=0.0, p50=None,
+                              p90=None, p99=None, max=None))
+
+    def test_rate(self):
+        generator = LoadGenerator(SoftTokenFarm(self.directory),
+                                  concurrency=4, rate=20)
+        tasks = [[('user%d' % i, 'register',
+                   {'version': 'U2F_V2', 'challenge': 'c', 'appId': APP_ID})]
+                 for i in range(6)]
+        report = generator.run(tasks)
+        # Six starts, 50 ms apart.
+        self.assertGreaterEqual(report.summary()['duration'], 0.25)
+
+    def test_default_facet(self):
+        results = []
+        generator = LoadGenerator(SoftTokenFarm(self.directory),
+                                  on_result=lambda *r: results.append(r))
+        request = {'version': 'U2F_V2', 'challenge': 'c',
+                   'appId': 'https://example.com/app-id.json'}
+        generator.run([[('alice', 'register', request)],
+                       [('bob', 'register', dict(request, appId=None))]])
+        results = dict((r[0], r) for r in results)
+
+        # The appId's origin is the facet, so no Trusted Facet List is needed.
+        user, kind, response, error = results['alice']
+        self.assertIsNone(error)
+        client_data = json.loads(websafe_decode(response['clientData'])
+                                 .decode('utf8'))
+        self.assertEqual(client_data['origin'], 'https://example.com')
+
+        user, kind, response, error = results['bob']
+        self.assertIsInstance(error, ValueError)
+        self.assertIn('appId', str(error))
+
+    def test_main_file(self):
+        rp = RelyingParty()
+        infile = os.path.join(self.directory, 'in.ndjson')
+        outfile = os.path.join(self.directory, 'out.ndjson')
+        with open(infile, 'w') as f:
+            for i in range(3):
+                user = 'user%d' % i
+                f.write(json.dumps({'user': user, 'operation': 'register',
+                                    'request': rp.begin('register', user)}))
+                f.write('\n')
+                if i == 0:
+                    f.write('{"user": "broken"\n')
+
+        stdout = io.StringIO() if str is not bytes else io.BytesIO()
+        with patch_stdout(stdout):
+            with self.assertRaises(SystemExit) as context:
+                loadgen.main(['-i', infile, '-o', outfile, '--json',
+                              '-c', '1', '-d',
+                              os.path.join(self.directory, 'tokens')])
+        self.assertEqual(context.exception.code, 1)
+        summary = json.loads(stdout.getvalue())
+        # The lines after the malformed one are still run.
+        self.assertEqual(summary['operations']['register']['count'], 3)
+        self.assertEqual(summary['operations']['input']['errors'], 1)
+
+        with open(outfile) as f:
+            results = [json.loads(line) for line in f]
+        self.assertEqual(len(results), 4)
+        errors = [r for r in results if 'error' in r]
+        self.assertEqual(len(errors), 1)
+        self.assertIn('line 2', errors[0]['error'])
+        for result in results:
+            if 'error' in result:
+                continue
+            self.assertTrue(rp.complete('register', result['user'],
+                                        result['response']))
+
+
+@contextmanager
+def patch_stdout(stream):
+    import sys
+    stdout = sys.stdout
+    sys.stdout = stream
+    try:
+        yield
+    finally:
+        sys.stdout = stdout
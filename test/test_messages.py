@@ -0,0 +1,87 @@
+import os
+import json
+import tempfile
+import unittest
+
+from u2flib_host import u2f, u2f_v2
+from u2flib_host.messages import (RegisterRequest, SignRequest,
+                                  RegisterResponse, SignResponse)
+from u2flib_host.soft import SoftU2FDevice
+from u2flib_host.utils import websafe_encode
+
+FACET = 'https://example.com'
+REG_DATA = {
+    'version': 'U2F_V2',
+    'challenge': 'challenge',
+    'appId': FACET
+}
+
+
+class TestMessages(unittest.TestCase):
+
+    def test_request_mapping(self):
+        request = RegisterRequest.from_json(json.dumps(REG_DATA))
+        self.assertEqual(request.app_id, FACET)
+        self.assertEqual(request, REG_DATA)
+        self.assertEqual(dict(request), REG_DATA)
+        self.assertEqual(json.loads(request.to_json()), REG_DATA)
+        self.assertIs(RegisterRequest.from_json(request), request)
+
+    def test_optional_app_id(self):
+        request = SignRequest('challenge', 'kh')
+        self.assertNotIn('appId', request)
+        self.assertEqual(len(request), 3)
+        self.assertEqual(request.get('appId', FACET), FACET)
+        self.assertRaises(KeyError, lambda: request['appId'])
+        self.assertEqual(SignRequest.from_dict(request.to_dict()), request)
+
+    def test_slots(self):
+        request = RegisterRequest('challenge')
+        self.assertRaises(AttributeError, setattr, request, 'other', 1)
+
+    def test_lazy_encoding(self):
+        response = RegisterResponse(b'\x05' * 10, '{}')
+        self.assertIsNone(response._registration_data)
+        self.assertEqual(response['registrationData'],
+                         websafe_encode(b'\x05' * 10))
+        self.assertEqual(response._registration_data,
+                         response['registrationData'])
+
+    def test_response_round_trip(self):
+        response = SignResponse(b'\x01\0\0\0\x01sig', '{"a": 1}', 'kh')
+        parsed = SignResponse.from_json(response.to_json())
+        self.assertEqual(parsed.signature_data, response.signature_data)
+        self.assertEqual(parsed.client_data, response.client_data)
+        self.assertEqual(parsed, response)
+
+
+class TestTypedCeremony(unittest.TestCase):
+
+    def setUp(self):
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(b'{"counter": 0, "keys": {}}')
+            self.device_path = f.name
+
+    def tearDown(self):
+        os.unlink(self.device_path)
+
+    def test_register_authenticate(self):
+        device = SoftU2FDevice(self.device_path)
+        response = u2f.register(device, RegisterRequest.from_dict(REG_DATA),
+                                FACET)
+        self.assertIsInstance(response, RegisterResponse)
+        self.assertEqual(response.registration_data[0:1], b'\x05')
+
+        reg_data = bytearray(response.registration_data)
+        key_handle = websafe_encode(bytes(reg_data[67:67 + reg_data[66]]))
+        response = u2f_v2.authenticate(
+            device, SignRequest('challenge', key_handle, FACET), FACET)
+        self.assertIsInstance(response, SignResponse)
+        self.assertEqual(response.key_handle, key_handle)
+
+        # Dicts in, dicts out.
+        response = u2f_v2.authenticate(
+            device, dict(REG_DATA, keyHandle=key_handle), FACET)
+        self.assertIs(type(response), dict)
+        self.assertEqual(set(response),
+                         set(['clientData', 'signatureData', 'keyHandle']))
@@ -0,0 +1,80 @@
+
+import json
+import unittest
+
+from u2flib_host import exc
+from u2flib_host.constants import APDU_USE_NOT_SATISFIED, INS_SIGN
+from u2flib_host.hid_emulator import U2FHIDEmulator, EmulatedHIDDevice
+from u2flib_host.hid_transport import U2FHIDError
+from u2flib_host.metrics import Metrics
+
+
+class NotTouchedDevice(object):
+
+    def get_supported_versions(self):
+        return ['U2F_V2']
+
+    def send_apdu(self, ins, p1, p2, data):
+        raise exc.APDUError(APDU_USE_NOT_SATISFIED)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_count_and_observe(self):
+        metrics = Metrics()
+        metrics.count('hid_errors', code='0x06')
+        metrics.count('hid_errors', 2, code='0x06')
+        metrics.observe('call', 0.5, cmd='0x03')
+        metrics.observe('call', 1.5, cmd='0x03')
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['counters'], [
+            {'name': 'hid_errors', 'labels': {'code': '0x06'}, 'value': 3}
+        ])
+        self.assertEqual(snapshot['timings'], [
+            {'name': 'call', 'labels': {'cmd': '0x03'}, 'count': 2,
+             'sum': 2.0, 'max': 1.5, 'mean': 1.0}
+        ])
+        self.assertEqual(json.loads(metrics.to_json()), snapshot)
+
+        metrics.reset()
+        self.assertEqual(metrics.snapshot(),
+                         {'counters': [], 'timings': []})
+
+    def test_to_prometheus(self):
+        metrics = Metrics()
+        metrics.count('read_frames', 3)
+        metrics.observe('apdu', 0.25, ins='0x02')
+        self.assertEqual(metrics.to_prometheus(), '\n'.join([
+            '# TYPE u2flib_host_read_frames_total counter',
+            'u2flib_host_read_frames_total 3',
+            '# TYPE u2flib_host_apdu_seconds summary',
+            'u2flib_host_apdu_seconds_count{ins="0x02"} 1',
+            'u2flib_host_apdu_seconds_sum{ins="0x02"} 0.250000000',
+        ]) + '\n')
+
+    def test_hid_device(self):
+        metrics = Metrics()
+        emulator = U2FHIDEmulator(NotTouchedDevice())
+        dev1 = EmulatedHIDDevice(emulator)
+        dev1.metrics = metrics
+        dev1.retry_policy = None
+        dev2 = EmulatedHIDDevice(emulator)
+        with dev1, dev2:
+            dev1.ping(b'\0' * 100)
+            self.assertRaises(exc.APDUError, dev1.send_apdu, INS_SIGN)
+            dev2.lock()
+            self.assertRaises(U2FHIDError, dev1.wink)
+
+        counters = dict(((c['name'], tuple(c['labels'].values())), c['value'])
+                        for c in metrics.snapshot()['counters'])
+        # INIT, 2 for PING, APDU and WINK.
+        self.assertEqual(counters[('write_attempts', ())], 5)
+        # As above, plus the responses to dev2's INIT and LOCK, which are
+        # read and skipped by dev1.
+        self.assertEqual(counters[('read_frames', ())], 7)
+        self.assertEqual(counters[('apdu_status', ('0x6985',))], 1)
+        self.assertEqual(counters[('hid_errors', ('0x06',))], 1)
+
+        timings = set(t['name'] for t in metrics.snapshot()['timings'])
+        self.assertEqual(timings, set(['open', 'init', 'call', 'apdu']))
@@ -0,0 +1,91 @@
+import argparse
+import itertools
+import unittest
+
+from u2flib_host import exc, polling
+from u2flib_host.constants import APDU_USE_NOT_SATISFIED, APDU_WRONG_DATA
+from u2flib_host.polling import PollingPolicy, poll_devices
+
+
+class PollDevice(object):
+
+    def __init__(self, touched_after=None, error=None):
+        self.touched_after = touched_after
+        self.error = error
+        self.attempts = 0
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def operation(self):
+        self.attempts += 1
+        if self.error is not None:
+            raise self.error
+        if self.touched_after is None or self.attempts <= self.touched_after:
+            raise exc.APDUError(APDU_USE_NOT_SATISFIED)
+        return self
+
+
+def attempt(device):
+    return device.operation()
+
+
+class TestPollingPolicy(unittest.TestCase):
+
+    def test_intervals(self):
+        policy = PollingPolicy(0.1, 2, 2, 0.5)
+        intervals = list(itertools.islice(policy.intervals(), 6))
+        self.assertEqual(intervals, [0.1, 0.1, 0.2, 0.4, 0.5, 0.5])
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, PollingPolicy, 0)
+        self.assertRaises(ValueError, PollingPolicy, 1, max_interval=0.5)
+        self.assertRaises(ValueError, PollingPolicy, backoff=0.5)
+
+    def test_from_args(self):
+        parser = argparse.ArgumentParser()
+        polling.add_arguments(parser)
+        args = parser.parse_args(['--poll-interval', '0.2', '-t', '5'])
+        policy = polling.policy_from_args(args)
+        self.assertEqual(policy.initial_interval, 0.2)
+        self.assertEqual(policy.fast_polls, 5)
+        self.assertEqual(policy.deadline, 5)
+
+
+class TestPollDevices(unittest.TestCase):
+
+    policy = PollingPolicy(0.001, max_interval=0.001)
+
+    def test_touched(self):
+        waiting = []
+        first = PollDevice()
+        second = PollDevice(touched_after=2)
+        result = poll_devices([first, second], attempt, self.policy,
+                              lambda: waiting.append(True))
+        self.assertIs(result, second)
+        self.assertEqual(first.attempts, 3)
+        self.assertEqual(waiting, [True])
+
+    def test_failing_devices_dropped(self):
+        broken = PollDevice(error=exc.DeviceError('Broken'))
+        wrong = PollDevice(error=exc.APDUError(APDU_WRONG_DATA))
+        device = PollDevice(touched_after=1)
+        result = poll_devices([broken, wrong, device], attempt, self.policy)
+        self.assertIs(result, device)
+        self.assertEqual(broken.attempts, 1)
+        self.assertTrue(broken.closed)
+        self.assertEqual(wrong.attempts, 1)
+        self.assertTrue(wrong.closed)
+
+    def test_no_devices_left(self):
+        broken = PollDevice(error=exc.DeviceError('Broken'))
+        self.assertRaises(exc.DeviceError, poll_devices, [broken], attempt,
+                          self.policy)
+
+    def test_deadline(self):
+        policy = PollingPolicy(0.01, max_interval=0.01, deadline=0.05)
+        device = PollDevice()
+        self.assertRaises(exc.DeadlineExceededError, poll_devices, [device],
+                          attempt, policy)
+        self.assertTrue(2 <= device.attempts <= 7)
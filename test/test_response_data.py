@@ -0,0 +1,93 @@
+import os
+import json
+import tempfile
+import unittest
+
+from u2flib_host import u2f
+from u2flib_host.response_data import (
+    parse_registration_data, parse_signature_data, verify_registration,
+    verify_signature, verify_registrations, verify_signatures)
+from u2flib_host.soft import SoftU2FDevice, CERT
+from u2flib_host.utils import websafe_decode, websafe_encode
+
+FACET = 'https://example.com'
+REG_DATA = {
+    'version': 'U2F_V2',
+    'challenge': 'challenge',
+    'appId': FACET
+}
+
+
+class TestResponseData(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(b'{"counter": 0, "keys": {}}')
+            cls.device_path = f.name
+        device = SoftU2FDevice(cls.device_path)
+        cls.registration = u2f.register(device, REG_DATA, FACET)
+        reg = parse_registration_data(cls.registration['registrationData'])
+        cls.key_handle = websafe_encode(reg.key_handle)
+        cls.public_key = reg.public_key.tobytes()
+        cls.authentications = [
+            u2f.authenticate(device, dict(REG_DATA, keyHandle=cls.key_handle),
+                             FACET) for _ in range(3)]
+
+    @classmethod
+    def tearDownClass(cls):
+        os.unlink(cls.device_path)
+
+    def client_data(self, response):
+        return websafe_decode(response['clientData']).decode('utf8')
+
+    def test_parse_registration_data(self):
+        raw = websafe_decode(self.registration['registrationData'])
+        reg = parse_registration_data(raw)
+        self.assertEqual(len(reg.public_key), 65)
+        self.assertEqual(reg.public_key[0:1].tobytes(), b'\x04')
+        self.assertEqual(len(reg.key_handle), 64)
+        self.assertEqual(reg.certificate.tobytes(), CERT)
+        self.assertEqual(raw.endswith(reg.signature.tobytes()), True)
+        # Slices of the original buffer, not copies.
+        self.assertIs(reg.certificate.obj, raw)
+
+    def test_parse_invalid(self):
+        raw = websafe_decode(self.registration['registrationData'])
+        self.assertRaises(ValueError, parse_registration_data,
+                          b'\x04' + raw[1:])
+        self.assertRaises(ValueError, parse_registration_data, raw[:200])
+        self.assertRaises(ValueError, parse_signature_data, b'\x01\0\0\0\x01')
+
+    def test_parse_signature_data(self):
+        sig = parse_signature_data(self.authentications[1]['signatureData'])
+        self.assertTrue(sig.user_presence)
+        self.assertEqual(sig.counter, 2)
+        self.assertEqual(sig.signature[0:1].tobytes(), b'\x30')
+
+    def test_verify_registration(self):
+        data = self.registration['registrationData']
+        client_data = self.client_data(self.registration)
+        self.assertTrue(verify_registration(data, client_data, FACET))
+        self.assertFalse(verify_registration(data, client_data,
+                                             'https://other.example.com'))
+
+    def test_verify_signature(self):
+        resp = self.authentications[0]
+        client_data = self.client_data(resp)
+        self.assertTrue(verify_signature(resp['signatureData'], client_data,
+                                         FACET, self.public_key))
+        tampered = bytearray(websafe_decode(resp['signatureData']))
+        tampered[4] ^= 1  # Change the counter.
+        self.assertFalse(verify_signature(tampered, client_data, FACET,
+                                          self.public_key))
+
+    def test_batch(self):
+        items = [(resp['signatureData'], self.client_data(resp), FACET,
+                  self.public_key) for resp in self.authentications]
+        items.append(items[0][:2] + ('https://other.example.com',
+                                     self.public_key))
+        self.assertEqual(verify_signatures(items), [True, True, True, False])
+        self.assertEqual(verify_registrations([
+            (self.registration['registrationData'],
+             self.client_data(self.registration), FACET)] * 2), [True, True])
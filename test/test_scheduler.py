@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import tempfile
+import threading
+import unittest
+
+from u2flib_host import exc
+from u2flib_host.cancellation import CancellationToken
+from u2flib_host.constants import INS_ENROLL
+from u2flib_host.hid_emulator import U2FHIDEmulator, EmulatedHIDDevice
+from u2flib_host.scheduler import DeviceScheduler
+from u2flib_host.soft import SoftU2FDevice
+
+
+class TestDeviceScheduler(unittest.TestCase):
+
+    def setUp(self):
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(json.dumps({"counter": 0, "keys": {}}).encode('utf8'))
+            self.device_path = f.name
+        self.emulator = U2FHIDEmulator(SoftU2FDevice(self.device_path))
+
+    def tearDown(self):
+        os.unlink(self.device_path)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, DeviceScheduler, 11)
+        self.assertRaises(ValueError, DeviceScheduler, 2, 2)
+
+    def test_lock_held_and_released(self):
+        scheduler = DeviceScheduler()
+        with EmulatedHIDDevice(self.emulator) as dev:
+            with scheduler.exclusive(dev):
+                self.assertEqual(self.emulator._lock_cid, dev.cid)
+                dev.ping()
+            self.assertIsNone(self.emulator._lock_cid)
+
+    def test_fifo(self):
+        scheduler = DeviceScheduler()
+        devices = [EmulatedHIDDevice(self.emulator) for _ in range(4)]
+        for dev in devices:
+            dev.open()
+        order = []
+
+        def worker(i):
+            with scheduler.exclusive(devices[i]):
+                order.append(i)
+                devices[i].ping()
+                time.sleep(0.05)
+
+        threads = [threading.Thread(target=worker, args=(i,))
+                   for i in range(4)]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.02)
+        for thread in threads:
+            thread.join()
+        for dev in devices:
+            dev.close()
+        self.assertEqual(order, [0, 1, 2, 3])
+
+    def test_other_process(self):
+        # Separate schedulers only coordinate through the device lock.
+        first, second = DeviceScheduler(), DeviceScheduler()
+        with EmulatedHIDDevice(self.emulator) as dev1, \
+                EmulatedHIDDevice(self.emulator) as dev2:
+            events = []
+
+            def other():
+                with second.exclusive(dev2):
+                    events.append('second')
+                    dev2.ping()
+
+            with first.exclusive(dev1):
+                thread = threading.Thread(target=other)
+                thread.start()
+                time.sleep(0.2)
+                events.append('first')
+                dev1.ping()
+            thread.join()
+            self.assertEqual(events, ['first', 'second'])
+
+    def test_renewal(self):
+        scheduler = DeviceScheduler(lock_time=1, renew_margin=0.5)
+        with EmulatedHIDDevice(self.emulator) as dev:
+            with scheduler.exclusive(dev):
+                time.sleep(1.2)
+                self.assertFalse(self.emulator._locked_by_other(dev.cid))
+                self.assertTrue(self.emulator._locked_by_other(b'\0\0\0\0'))
+
+    def test_renewal_during_keepalive(self):
+        # The touch wait holds the request open for longer than lock_time.
+        self.emulator.touch_delay = 1.5
+        self.emulator.keepalive = True
+        scheduler = DeviceScheduler(lock_time=1, renew_margin=0.5)
+        with EmulatedHIDDevice(self.emulator) as dev:
+            with scheduler.exclusive(dev):
+                dev.send_apdu(INS_ENROLL, 0x03, 0x00, b'\1' * 64)
+                # Renewed before the response is returned.
+                self.assertTrue(self.emulator._locked_by_other(b'\0\0\0\0'))
+                self.assertGreater(self.emulator._lock_until,
+                                   time.time() + 0.5)
+
+    def test_cancel_waiting(self):
+        scheduler = DeviceScheduler()
+        with EmulatedHIDDevice(self.emulator) as dev1, \
+                EmulatedHIDDevice(self.emulator) as dev2:
+            with scheduler.exclusive(dev1):
+                self.assertRaises(exc.DeadlineExceededError,
+                                  scheduler.run, dev2, lambda d: d.ping(),
+                                  CancellationToken(0.1))
+            # The cancelled caller no longer holds up the queue.
+            self.assertEqual(scheduler.run(dev2, lambda d: d.ping(b'x')),
+                             b'x')
+
+    def test_without_lock(self):
+        scheduler = DeviceScheduler()
+        device = SoftU2FDevice(self.device_path)
+        self.assertEqual(scheduler.run(device, lambda d: 'done'), 'done')
@@ -0,0 +1,190 @@
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+
+from u2flib_host import u2f, exc, socket_transport
+from u2flib_host.cancellation import CancellationToken
+from u2flib_host.constants import INS_GET_VERSION
+from u2flib_host.socket_transport import (SocketServer, SocketDevice,
+                                          list_devices, parse_address)
+from u2flib_host.soft import SoftU2FDevice
+from u2flib_host.utils import websafe_decode, websafe_encode
+from u2flib_host import hid_transport
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+FACET = 'https://example.com'
+REG_DATA = {
+    'version': 'U2F_V2',
+    'challenge': 'challenge',
+    'appId': FACET
+}
+
+
+class SlowDevice(SoftU2FDevice):
+
+    def __init__(self, filename):
+        super(SlowDevice, self).__init__(filename)
+        self.release = threading.Event()
+
+    def get_supported_versions(self):
+        self.release.wait(5)
+        return ['U2F_V2']
+
+
+class FakeHIDDevice(object):
+
+    def __init__(self, path, error=None):
+        self.path = path
+        self.error = error
+        self.opened = False
+
+    def open(self):
+        if self.error is not None:
+            raise self.error
+        self.opened = True
+
+    def close(self):
+        self.opened = False
+
+
+class TestParseAddress(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(parse_address('example.com:1234'),
+                         (socket_transport.socket.AF_INET,
+                          ('example.com', 1234)))
+        self.assertEqual(parse_address('localhost')[1], ('localhost', 6842))
+        self.assertEqual(parse_address('[::1]:1234'),
+                         (socket_transport.socket.AF_INET6, ('::1', 1234)))
+        self.assertEqual(parse_address('[::1]')[1], ('::1', 6842))
+        # Without brackets, the last group is part of the address.
+        self.assertEqual(parse_address('2001:db8::5:1'),
+                         (socket_transport.socket.AF_INET6,
+                          ('2001:db8::5:1', 6842)))
+        self.assertEqual(parse_address('[2001:db8::5]:1'),
+                         (socket_transport.socket.AF_INET6,
+                          ('2001:db8::5', 1)))
+        self.assertEqual(parse_address('::1')[1], ('::1', 6842))
+        self.assertRaises(ValueError, parse_address, '[::1')
+        self.assertRaises(ValueError, parse_address, '[::1]1234')
+        self.assertEqual(parse_address('unix:/tmp/u2f')[1], '/tmp/u2f')
+
+
+class TestSocketTransport(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.devices = {}
+        for name in ('a', 'b'):
+            filename = os.path.join(self.directory, name)
+            with open(filename, 'w') as f:
+                json.dump({"counter": 0, "keys": {}}, f)
+            self.devices[name] = SoftU2FDevice(filename)
+        self.slow = SlowDevice(os.path.join(self.directory, 'slow'))
+        self.devices['slow'] = self.slow
+        self.server = self.serve('127.0.0.1:0')
+
+    def tearDown(self):
+        self.slow.release.set()
+        self.server.shutdown()
+        shutil.rmtree(self.directory)
+
+    def serve(self, address):
+        server = SocketServer(address, self.devices)
+        server.start()
+        return server
+
+    def test_register_authenticate(self):
+        devices = list_devices([self.server.address])
+        self.assertEqual([d.name for d in devices], ['a', 'b', 'slow'])
+        dev = devices[0]
+        self.assertEqual(dev.get_supported_versions(), ['U2F_V2'])
+        resp = u2f.register(dev, REG_DATA, FACET)
+        reg_data = bytearray(websafe_decode(resp['registrationData']))
+        key_handle = bytes(reg_data[67:67 + reg_data[66]])
+        auth_data = dict(REG_DATA, keyHandle=websafe_encode(key_handle))
+        self.assertIn('signatureData', u2f.authenticate(dev, auth_data, FACET))
+        # The key is only on the device it was registered with.
+        self.assertRaises(exc.APDUError, u2f.authenticate, devices[1],
+                          auth_data, FACET)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_pipelining(self):
+        a = SocketDevice(self.server.address, 'a')
+        slow = SocketDevice(self.server.address, 'slow')
+        results = []
+        waiting = threading.Thread(
+            target=lambda: results.append(slow.send_apdu(INS_GET_VERSION)))
+        waiting.start()
+        # Not held up by the request to the slow device before it.
+        self.assertEqual(a.send_apdu(INS_GET_VERSION), b'U2F_V2')
+        self.assertEqual(results, [])
+        self.slow.release.set()
+        waiting.join(5)
+        self.assertEqual(results, [b'U2F_V2'])
+        self.assertEqual(self.server.connections, 1)
+
+    def test_cancelled(self):
+        slow = SocketDevice(self.server.address, 'slow')
+        token = CancellationToken(0.2)
+        self.assertRaises(exc.DeadlineExceededError, u2f.register, slow,
+                          REG_DATA, FACET, token)
+        self.slow.release.set()
+        # The late response doesn't confuse later requests.
+        a = SocketDevice(self.server.address, 'a')
+        self.assertEqual(a.send_apdu(INS_GET_VERSION), b'U2F_V2')
+
+    def test_unknown_device(self):
+        dev = SocketDevice(self.server.address, 'missing')
+        self.assertRaises(exc.DeviceError, dev.send_apdu, INS_GET_VERSION)
+
+    def test_reconnect(self):
+        a = SocketDevice(self.server.address, 'a')
+        self.assertEqual(a.send_apdu(INS_GET_VERSION), b'U2F_V2')
+        socket_transport.connect(self.server.address).close()
+        self.assertEqual(a.send_apdu(INS_GET_VERSION), b'U2F_V2')
+        self.assertEqual(self.server.connections, 2)
+
+    def test_environment(self):
+        os.environ[socket_transport.ADDRESS_ENV] = self.server.address
+        try:
+            self.assertEqual(len(list_devices()), 3)
+        finally:
+            del os.environ[socket_transport.ADDRESS_ENV]
+        self.assertEqual(list_devices(), [])
+
+    @unittest.skipUnless(hasattr(socket_transport.socket, 'AF_UNIX'),
+                         'Requires Unix sockets')
+    def test_unix(self):
+        path = os.path.join(self.directory, 'socket')
+        server = self.serve('unix:' + path)
+        try:
+            devices = list_devices(['unix:' + path])
+            self.assertEqual(devices[1].send_apdu(INS_GET_VERSION),
+                             b'U2F_V2')
+        finally:
+            server.shutdown()
+        self.assertFalse(os.path.exists(path))
+
+    def test_hid_open_failure(self):
+        devices = [FakeHIDDevice(b'/dev/hidraw0', IOError('Busy')),
+                   FakeHIDDevice(b'/dev/hidraw1'),
+                   FakeHIDDevice(b'/dev/hidraw2', exc.DeviceError('Gone'))]
+        server = SocketServer('127.0.0.1:0', hid=True)
+        server.start()
+        try:
+            with patch.object(hid_transport, 'list_devices',
+                              return_value=devices):
+                names = [d.name for d in list_devices([server.address])]
+        finally:
+            server.shutdown()
+        # Devices failing to open are skipped, not failing the listing.
+        self.assertEqual(names, ['hid:/dev/hidraw1'])
+        self.assertFalse(devices[1].opened)
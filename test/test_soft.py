@@ -4,8 +4,10 @@ import base64
 import struct
 import tempfile
 import unittest
+from multiprocessing.pool import ThreadPool
 
-from u2flib_host.soft import SoftU2FDevice
+from u2flib_host.soft import (SoftU2FDevice, PooledSoftU2FDevice,
+                              SigningPool, shared_pool)
 from u2flib_host.constants import INS_ENROLL, INS_SIGN
 
 CLIENT_PARAM = b'clientABCDEFGHIJKLMNOPQRSTUVWXYZ' # 32 bytes
@@ -53,3 +55,48 @@ class TestSoftU2FDevice(unittest.TestCase):
         self.assertTrue(touch)
         self.assertEqual(counter, 1)
 
+
+
+class TestPooledSoftU2FDevice(unittest.TestCase):
+    def setUp(self):
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(b'{"counter": 0, "keys": {}}')
+            self.device_path = f.name
+
+    def tearDown(self):
+        os.unlink(self.device_path)
+
+    def test_concurrent(self):
+        pool = SigningPool(2)
+        dev = PooledSoftU2FDevice(self.device_path, pool)
+        request = struct.pack('32s 32s', CLIENT_PARAM, APP_PARAM)
+        threads = ThreadPool(4)
+        try:
+            responses = threads.map(
+                lambda _: dev.send_apdu(INS_ENROLL, data=request), range(4))
+            self.assertEqual(len(dev.data['keys']), 4)
+
+            key_handle = responses[0][67:67 + 64]
+            request = struct.pack('32s 32s B 64s', CLIENT_PARAM, APP_PARAM,
+                                  64, key_handle)
+            responses = threads.map(
+                lambda _: dev.send_apdu(INS_SIGN, data=request), range(8))
+        finally:
+            threads.close()
+            pool.close()
+        counters = sorted(struct.unpack('>I', r[1:5])[0] for r in responses)
+        self.assertEqual(counters, list(range(1, 9)))
+
+        # The key store is persisted by the pooled device.
+        self.assertEqual(SoftU2FDevice(self.device_path).data['counter'], 8)
+
+    def test_shared_pool(self):
+        dev = PooledSoftU2FDevice(self.device_path)
+        self.assertIs(dev.pool, shared_pool())
+        dev.close()
+        self.assertIs(PooledSoftU2FDevice(self.device_path).pool, dev.pool)
+
+    def test_pool_context(self):
+        with SigningPool(1) as pool:
+            self.assertNotEqual(pool.apply(os.getpid, ()), os.getpid())
+        self.assertIsNone(pool._pool)
@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import unittest
+from multiprocessing.pool import ThreadPool
+
+from u2flib_host import soft, u2f_v2
+from u2flib_host.soft_farm import SoftTokenFarm
+from u2flib_host.utils import websafe_decode, websafe_encode
+
+FACET = 'https://example.com'
+REG_DATA = {
+    'version': 'U2F_V2',
+    'challenge': 'challenge',
+    'appId': FACET
+}
+
+
+def auth_data(register_response):
+    # Key handle length at offset 66, followed by the key handle.
+    reg_data = bytearray(websafe_decode(register_response['registrationData']))
+    key_handle = bytes(reg_data[67:67 + reg_data[66]])
+    return dict(REG_DATA, keyHandle=websafe_encode(key_handle))
+
+
+class TestSoftTokenFarm(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_register_authenticate(self):
+        users = ['user%d' % i for i in range(20)]
+        with SoftTokenFarm(self.directory, shards=4) as farm:
+            requests = dict((user, auth_data(farm.register(user, REG_DATA,
+                                                           FACET)))
+                            for user in users)
+            for user in users:
+                resp = farm.authenticate(user, requests[user], FACET)
+                self.assertIn('signatureData', resp)
+        self.assertEqual(len(os.listdir(self.directory)), 4)
+
+        farm = SoftTokenFarm(self.directory, shards=4)
+        self.assertEqual(sorted(farm.users()), sorted(users))
+        # Signature counters are per user, and persisted.
+        resp = farm.authenticate('user0', requests['user0'], FACET)
+        counter = bytearray(websafe_decode(resp['signatureData']))[1:5]
+        self.assertEqual(counter, b'\0\0\0\x02')
+
+    def test_wrong_user(self):
+        farm = SoftTokenFarm(self.directory)
+        request = auth_data(farm.register('alice', REG_DATA, FACET))
+        self.assertRaises(ValueError, farm.authenticate, 'bob', request, FACET)
+
+    def test_concurrent(self):
+        farm = SoftTokenFarm(self.directory, shards=2)
+        threads = ThreadPool(4)
+        try:
+            threads.map(lambda i: farm.register('user%d' % i, REG_DATA, FACET),
+                        range(16))
+        finally:
+            threads.close()
+        farm.flush()
+        self.assertEqual(len(SoftTokenFarm(self.directory, 2).users()), 16)
+
+    def test_attestation_key_loaded_once(self):
+        self.assertIs(soft._attestation_key(), soft._attestation_key())
+
+    def test_facet_verified_unlocked(self):
+        # A slow Trusted Facet List fetch mustn't hold up the shard.
+        farm = SoftTokenFarm(self.directory, shards=1)
+        shard = farm._shard('alice')
+        locked = []
+        verify_facet = u2f_v2.verify_facet
+
+        def verify(app_id, facet):
+            locked.append(shard.lock.locked())
+            verify_facet(app_id, facet)
+        u2f_v2.verify_facet = verify
+        try:
+            request = auth_data(farm.register('alice', REG_DATA, FACET))
+            farm.authenticate('alice', request, FACET)
+        finally:
+            u2f_v2.verify_facet = verify_facet
+        self.assertEqual(locked, [False, False])
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, SoftTokenFarm, self.directory, 0)
+
+    def test_corrupt_shard(self):
+        with SoftTokenFarm(self.directory, shards=1) as farm:
+            farm.register('alice', REG_DATA, FACET)
+        shard = os.path.join(self.directory, 'shard-0000.json')
+        with open(shard, 'w') as f:
+            f.write('{"alice": {"coun')
+
+        with SoftTokenFarm(self.directory, shards=1) as farm:
+            self.assertEqual(farm.users(), [])
+            farm.register('bob', REG_DATA, FACET)
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['shard-0000.json', 'shard-0000.json.corrupt'])
+        self.assertEqual(SoftTokenFarm(self.directory, 1).users(), ['bob'])
+
+    def test_stable_identity(self):
+        farm = SoftTokenFarm(self.directory)
+        shard = farm._shard('alice')
+        self.assertEqual(farm._device(shard, 'alice').identity,
+                         farm._device(shard, 'alice').identity)
+        self.assertNotEqual(farm._device(shard, 'alice').identity,
+                            farm._device(shard, 'bob').identity)
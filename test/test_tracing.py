@@ -0,0 +1,112 @@
+
+import unittest
+
+from u2flib_host import u2f, tracing
+from u2flib_host.constants import INS_GET_VERSION
+from u2flib_host.device import U2FDevice
+
+FACET = 'https://example.com'
+REG_DATA = {
+    'version': 'U2F_V2',
+    'challenge': 'challenge',
+    'appId': FACET
+}
+
+
+class RecordingSpan(object):
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.parent = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        if self.tracer.stack:
+            self.parent = self.tracer.stack[-1].name
+        self.tracer.stack.append(self)
+        self.tracer.spans.append(self)
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.tracer.stack.pop()
+        return False
+
+
+class RecordingTracer(object):
+
+    def __init__(self):
+        self.spans = []
+        self.stack = []
+
+    def start_as_current_span(self, name, attributes=None, **kwargs):
+        return RecordingSpan(self, name, attributes)
+
+    def find(self, name):
+        return [s for s in self.spans if s.name == name]
+
+
+class LoopbackDevice(U2FDevice):
+
+    path = '/dev/hidraw7'
+    cid = b'\0\0\0\x2a'
+    version_cache = None
+
+    def _do_send_apdu(self, apdu_data):
+        if bytearray(apdu_data)[1] == INS_GET_VERSION:
+            return b'U2F_V2\x90\x00'
+        return b'response\x90\x00'
+
+
+class TestTracing(unittest.TestCase):
+
+    def setUp(self):
+        self.tracer = RecordingTracer()
+        tracing.set_tracer(self.tracer)
+
+    def tearDown(self):
+        tracing.set_tracer(None)
+
+    def test_disabled(self):
+        tracing.set_tracer(None)
+        with tracing.span('u2f.test', device=LoopbackDevice()) as span:
+            span.set_attribute('key', 'value')
+        self.assertEqual(self.tracer.spans, [])
+
+    def test_register(self):
+        u2f.register(LoopbackDevice(), REG_DATA, FACET)
+
+        register, = self.tracer.find('u2f.register')
+        self.assertIsNone(register.parent)
+        self.assertEqual(register.attributes['u2f.device.path'],
+                         '/dev/hidraw7')
+        self.assertEqual(register.attributes['u2f.device.cid'], '0000002a')
+        self.assertEqual(register.attributes['u2f.facet'], FACET)
+
+        version, = self.tracer.find('u2f.get_version')
+        self.assertEqual(version.parent, 'u2f.register')
+        self.assertEqual(version.attributes['u2f.versions'], 'U2F_V2')
+
+        verify, = self.tracer.find('u2f.verify_facet')
+        self.assertEqual(verify.parent, 'u2f.register')
+        self.assertEqual(verify.attributes['u2f.app_id'], FACET)
+
+        apdus = self.tracer.find('u2f.apdu')
+        self.assertEqual([a.parent for a in apdus],
+                         ['u2f.get_version', 'u2f.register'])
+        self.assertEqual([a.attributes['u2f.apdu.ins'] for a in apdus],
+                         [0x03, 0x01])
+        self.assertEqual(apdus[1].attributes['u2f.apdu.sw'], 0x9000)
+        self.assertEqual(apdus[1].attributes['u2f.device.path'],
+                         '/dev/hidraw7')
+
+    def test_device_attributes(self):
+        class Device(object):
+            path = b'/dev/hidraw0'
+        self.assertEqual(tracing.device_attributes(Device()), {
+            'u2f.device.type': 'Device',
+            'u2f.device.path': '/dev/hidraw0'
+        })
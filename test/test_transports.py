@@ -0,0 +1,150 @@
+import sys
+import time
+import unittest
+
+from u2flib_host import exc, transports, u2f
+from u2flib_host.device import U2FDevice
+from u2flib_host.metrics import Metrics
+from u2flib_host.transports import TransportRegistry
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+
+class FakeTransport(object):
+
+    def __init__(self, devices=(), delay=0, error=None):
+        self.devices = list(devices)
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def list_devices(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.devices
+
+
+class FakeEntryPoint(object):
+
+    def __init__(self, name, transport):
+        self.name = name
+        self.transport = transport
+        self.loaded = False
+
+    def load(self):
+        self.loaded = True
+        return self.transport
+
+
+class TestTransportRegistry(unittest.TestCase):
+
+    def registry(self, *transports):
+        return TransportRegistry(transports, group=None)
+
+    def test_lazy_import(self):
+        name = 'u2flib_host.soft_farm'
+        sys.modules.pop(name, None)
+        registry = self.registry(('farm', name))
+        self.assertEqual(registry.names(), ['farm'])
+        self.assertNotIn(name, sys.modules)
+        result = registry.enumerate()
+        self.assertIn(name, sys.modules)
+        # The module has no list_devices(), which is reported.
+        self.assertIsInstance(result.errors['farm'], AttributeError)
+
+    def test_errors_reported(self):
+        good = FakeTransport(['a', 'b'])
+        registry = self.registry(('missing', 'u2flib_host.no_such_module'),
+                                 ('bad', FakeTransport(error=IOError('Bad'))),
+                                 ('good', good))
+        result = registry.enumerate()
+        self.assertEqual(result.devices, ['a', 'b'])
+        self.assertEqual(sorted(result.errors), ['bad', 'missing'])
+        self.assertIsInstance(result.errors['missing'], ImportError)
+        self.assertEqual(sorted(result.timings), ['bad', 'good', 'missing'])
+        self.assertEqual(registry.list_devices(), ['a', 'b'])
+
+    def test_parallel(self):
+        registry = self.registry(('slow', FakeTransport(['a'], 0.3)),
+                                 ('fast', FakeTransport(['b'])),
+                                 ('slower', FakeTransport(['c'], 0.3)))
+        start = time.time()
+        result = registry.enumerate()
+        self.assertLess(time.time() - start, 0.5)
+        # Devices are in the order of the transports.
+        self.assertEqual(result.devices, ['a', 'b', 'c'])
+        self.assertEqual(registry.list_devices(['fast']), ['b'])
+
+    def test_timeout(self):
+        registry = self.registry(('slow', FakeTransport(['a'], 0.5)),
+                                 ('fast', FakeTransport(['b'])))
+        result = registry.enumerate(timeout=0.1)
+        self.assertEqual(result.devices, ['b'])
+        self.assertIsInstance(result.errors['slow'],
+                              exc.DeadlineExceededError)
+
+    def test_entry_points(self):
+        builtin = FakeTransport(['a'])
+        replaced = FakeEntryPoint('builtin', FakeTransport(['b']))
+        plugin = FakeEntryPoint('plugin', FakeTransport(['c']))
+        with patch.object(transports, '_entry_points',
+                          return_value=[replaced, plugin]) as entry_points:
+            registry = TransportRegistry([('builtin', builtin)], 'group')
+            entry_points.assert_not_called()
+            self.assertEqual(registry.names(), ['builtin', 'plugin'])
+            self.assertFalse(plugin.loaded)
+            self.assertEqual(registry.list_devices(), ['b', 'c'])
+            self.assertTrue(plugin.loaded)
+            registry.names()
+        entry_points.assert_called_once_with('group')
+        self.assertEqual(builtin.calls, 0)
+
+    def test_register(self):
+        registry = self.registry(('a', FakeTransport(['a'])))
+        registry.register('b', FakeTransport(['b']))
+        self.assertEqual(registry.list_devices(), ['a', 'b'])
+        registry.unregister('a')
+        self.assertEqual([t.name for t in registry], ['b'])
+
+    def test_list_compat(self):
+        # Transport modules can be added as to the list TRANSPORTS used to be.
+        name = 'u2flib_host.socket_transport'
+        registry = self.registry(('socket', name))
+        module = __import__(name, fromlist=['list_devices'])
+        first = FakeTransport(['a'])
+        registry.append(module)
+        registry.insert(0, first)
+        registry.append(FakeTransport(['b']))
+        self.assertEqual(len(registry), 3)
+        self.assertIn(module, registry)
+        self.assertIn(first, registry)
+        self.assertIs(list(registry)[1].parse_address, module.parse_address)
+        with patch.object(module, 'list_devices', return_value=['c']):
+            self.assertEqual(registry.list_devices(), ['a', 'c', 'b'])
+        registry.remove(module)
+        self.assertNotIn('socket', registry.names())
+        self.assertRaises(ValueError, registry.remove, module)
+
+    def test_list_assigned(self):
+        with patch.object(u2f, 'TRANSPORTS', [FakeTransport(['a']),
+                                              FakeTransport(['b'])]):
+            self.assertEqual(u2f.list_devices(), ['a', 'b'])
+
+    def test_metrics(self):
+        metrics = Metrics()
+        U2FDevice.metrics = metrics
+        try:
+            self.registry(('bad', FakeTransport(error=IOError()))).enumerate()
+        finally:
+            U2FDevice.metrics = None
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['counters'],
+                         [{'name': 'list_devices_errors',
+                           'labels': {'transport': 'bad'}, 'value': 1}])
+        self.assertEqual(snapshot['timings'][0]['labels'],
+                         {'transport': 'bad'})
@@ -62,3 +62,17 @@ class TestU2F(unittest.TestCase):
         self.assertRaises(ValueError, u2f.get_lib,
                           MockDevice('U2F_V2'),
                           {'version': 'invalid_version'})
+
+    def test_get_lib_prepared(self):
+        prepared = u2f.prepare_register({
+            'version': 'U2F_V2',
+            'challenge': 'challenge',
+            'appId': 'https://example.com'
+        }, 'https://example.com')
+        self.assertIsInstance(prepared, u2f_v2.PreparedRegistration)
+        self.assertEqual(u2f.get_lib(MockDevice('U2F_V2'), prepared), u2f_v2)
+
+    def test_prepare_unsupported_by_lib(self):
+        self.assertRaises(ValueError, u2f.prepare_register,
+                          '{"version": "invalid_version"}',
+                          'https://example.com')
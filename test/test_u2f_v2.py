@@ -118,3 +118,42 @@ class TestU2FV2(unittest.TestCase):
             self.assertEqual(device.ins, INS_SIGN)
             self.assertEqual(device.p1, 0x07)
             self.assertEqual(e.code, APDU_USE_NOT_SATISFIED)
+
+    def test_prepared_register_reused(self):
+        calls = []
+        orig = u2f_v2.verify_facet
+        u2f_v2.verify_facet = lambda app_id, facet: calls.append(app_id)
+        try:
+            prepared = u2f_v2.prepare_register(REG_DATA, FACET)
+            device = MockDevice(DUMMY_RESP)
+            requests = []
+            for _ in range(3):
+                u2f_v2.register(device, prepared, FACET)
+                requests.append(device.request)
+        finally:
+            u2f_v2.verify_facet = orig
+
+        self.assertEqual(calls, [FACET])
+        self.assertEqual(len(set(requests)), 1)
+        self.assertIs(requests[0], prepared.payload)
+
+    def test_prepared_authenticate_check_only(self):
+        prepared = u2f_v2.prepare_authenticate(AUTH_DATA, FACET)
+        device = MockDevice(DUMMY_RESP)
+        u2f_v2.authenticate(device, prepared, FACET, True)
+        self.assertEqual(device.p1, 0x07)
+        u2f_v2.authenticate(device, prepared, FACET, False)
+        self.assertEqual(device.p1, 0x03)
+        self.assertEqual(device.request[-64:], websafe_decode(KEY_HANDLE))
+
+    def test_prepared_other_facet(self):
+        prepared = u2f_v2.prepare_register(REG_DATA, FACET)
+        orig = u2f_v2.verify_facet
+        u2f_v2.verify_facet = lambda app_id, facet: None
+        try:
+            other = u2f_v2.prepare_register(prepared, 'https://www.example.com')
+        finally:
+            u2f_v2.verify_facet = orig
+        self.assertIsNot(other, prepared)
+        self.assertEqual(other.facet, 'https://www.example.com')
+        self.assertIs(u2f_v2.prepare_register(prepared, FACET), prepared)
@@ -1,11 +1,14 @@
 # coding=utf-8
 
+import binascii
 import unittest
 
 from u2flib_host.utils import (
     u2str,
     websafe_encode,
-    websafe_decode
+    websafe_decode,
+    websafe_encode_many,
+    websafe_decode_many
 )
 
 
@@ -55,3 +58,33 @@ class TestWebSafe(unittest.TestCase):
     def test_websafe_encode_unicode(self):
         self.assertEqual(websafe_encode(u''), u'')
         self.assertEqual(websafe_encode(u'foobar'), u'Zm9vYmFy')
+
+    def test_websafe_alphabet(self):
+        self.assertEqual(websafe_encode(b'\xfb\xff\xbf'), u'-_-_')
+        self.assertEqual(websafe_decode(u'-_-_'), b'\xfb\xff\xbf')
+
+    def test_websafe_buffers(self):
+        data = bytearray(b'foobar')
+        self.assertEqual(websafe_encode(data), u'Zm9vYmFy')
+        self.assertEqual(websafe_encode(memoryview(data)[1:4]), u'b29i')
+        self.assertEqual(websafe_decode(bytearray(b'Zm9vYg')), b'foob')
+        self.assertEqual(websafe_decode(memoryview(b'xZm9vYg')[1:]), b'foob')
+
+    def test_websafe_decode_padded(self):
+        self.assertEqual(websafe_decode(b'Zg=='), b'f')
+        self.assertEqual(websafe_decode(u'Zm8='), b'fo')
+
+    def test_websafe_decode_malformed(self):
+        for data in (u'Zg=x', u'a b', u'Z', u'Zm9vY'):
+            self.assertRaises(binascii.Error, websafe_decode, data)
+            self.assertRaises(binascii.Error, websafe_decode_many,
+                              [data.encode('ascii')])
+
+    def test_websafe_many(self):
+        values = [b'', b'f', b'fo', b'foo', b'\xfb\xff\xbf']
+        encoded = websafe_encode_many(values)
+        self.assertEqual(encoded, [websafe_encode(v) for v in values])
+        self.assertEqual(websafe_decode_many(encoded), values)
+        self.assertEqual(websafe_decode_many([e.encode('ascii')
+                                              for e in encoded]), values)
+        self.assertEqual(websafe_encode_many([u'foobar']), [u'Zm9vYmFy'])
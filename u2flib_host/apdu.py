@@ -0,0 +1,127 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from u2flib_host.constants import APDU_OK
+from u2flib_host import exc
+import struct
+
+__all__ = [
+    'encode_apdu',
+    'encode_short_apdu',
+    'parse_apdu',
+    'APDUResponse'
+]
+
+# CLA INS P1 P2, followed by the 3 byte extended length Lc.
+_HEADER = struct.Struct('>B B B B B H')
+_STATUS = struct.Struct('>H')
+# Extended length Le of 0x0000, for the maximum response size.
+_LE = b'\0\0'
+# CLA INS P1 P2, followed by either the 1 byte Lc or, without data, Le.
+_SHORT_HEADER = struct.Struct('>B B B B B')
+# Short Le of 0x00, for the maximum response size.
+_SHORT_LE = b'\0'
+
+
+def encode_apdu(ins, p1=0, p2=0, data=b''):
+    """
+    Encodes a command APDU using extended length encoding.
+    """
+    size = len(data)
+    if size > 0xffff:
+        raise ValueError('APDU data too long: %d' % size)
+    return b''.join((_HEADER.pack(0, ins, p1, p2, 0, size), data, _LE))
+
+
+def encode_short_apdu(ins, p1=0, p2=0, data=b''):
+    """
+    Encodes a command APDU using short encoding, which is three bytes shorter
+    than extended length encoding, but limited to 255 bytes of data and 256
+    bytes of response data.
+    """
+    size = len(data)
+    if size > 0xff:
+        raise ValueError('APDU data too long for short encoding: %d' % size)
+    if size == 0:
+        return _SHORT_HEADER.pack(0, ins, p1, p2, 0)
+    return b''.join((_SHORT_HEADER.pack(0, ins, p1, p2, size), data,
+                     _SHORT_LE))
+
+
+def parse_apdu(apdu):
+    """
+    Parses a command APDU using either short or extended length encoding.
+    Returns a tuple of (cla, ins, p1, p2, data).
+    """
+    apdu = bytearray(apdu)
+    if len(apdu) < 4:
+        raise ValueError('APDU too short')
+    cla, ins, p1, p2 = apdu[:4]
+    body = apdu[4:]
+    if len(body) <= 1:  # No data, optional short Le.
+        data = b''
+    elif body[0] == 0 and len(body) >= 3:  # Extended length.
+        lc = body[1] << 8 | body[2]
+        data = body[3:3 + lc] if len(body) > 3 else b''
+        if len(body) > 3 and (len(data) != lc or
+                              len(body) - 3 - lc not in (0, 2)):
+            raise ValueError('Invalid extended length APDU')
+    else:
+        lc = body[0]
+        data = body[1:1 + lc]
+        if len(data) != lc or len(body) - 1 - lc not in (0, 1):
+            raise ValueError('Invalid short APDU')
+    return cla, ins, p1, p2, bytes(data)
+
+
+class APDUResponse(object):
+
+    """
+    A response APDU. data is a memoryview of the response data, without the
+    trailing status word.
+    """
+
+    __slots__ = ('data', 'status')
+
+    def __init__(self, resp):
+        size = len(resp) - _STATUS.size
+        if size < 0:
+            raise exc.DeviceError('Invalid APDU response')
+        self.data = memoryview(resp)[:size]
+        self.status = _STATUS.unpack_from(resp, size)[0]
+
+    def check(self):
+        """
+        Raises APDUError unless the status word indicates success, returns
+        self otherwise.
+        """
+        if self.status != APDU_OK:
+            raise exc.APDUError(self.status)
+        return self
+
+    def tobytes(self):
+        return self.data.tobytes()
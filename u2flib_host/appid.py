@@ -25,15 +25,55 @@
 # ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
-import requests
 try:
     from urlparse import urlparse
 except ImportError:
     from urllib.parse import urlparse
 
+from u2flib_host import tracing
+
 SUFFIX_URL = 'https://publicsuffix.org/list/effective_tld_names.dat'
 
 
+def parse_suffixes(text):
+    """
+    Parses the public suffix list, returning a list of suffixes.
+    """
+    suffixes = []
+    for line in text.splitlines():
+        if not line.startswith('//') and line:
+            suffixes.append(line.strip())
+    return suffixes
+
+
+def check_response(status_code, headers):
+    """
+    Checks an HTTP response to a Trusted Facet List request.
+
+    Returns the location to follow for an authorized redirect, or None if the
+    response holds the Trusted Facet List. headers must support
+    case-insensitive lookup of lowercase header names.
+    """
+    # If the server returns an HTTP redirect (status code 3xx) the
+    # server must also send the header "FIDO-AppID-Redirect-Authorized:
+    # true" and the client must verify the presence of such a header
+    # before following the redirect. This protects against abuse of
+    # open redirectors within the target domain by unauthorized
+    # parties.
+    if 300 <= status_code < 400:
+        if headers.get('fido-appid-redirect-authorized') != 'true':
+            raise ValueError('Redirect must set '
+                             'FIDO-AppID-Redirect-Authorized: true')
+        return headers['location']
+
+    # The response must set a MIME Content-Type of
+    # "application/fido.trusted-apps+json"
+    if headers.get('content-type') != 'application/fido.trusted-apps+json':
+        raise ValueError('Response must have Content-Type: '
+                         'application/fido.trusted-apps+json')
+    return None
+
+
 class AppIDVerifier(object):
 
     def __init__(self):
@@ -45,11 +85,10 @@ class AppIDVerifier(object):
             # https://publicsuffix.org/list/effective_tld_names.dat (the client
             # may cache such data), or equivalent functionality as available on
             # the platform
-            resp = requests.get(SUFFIX_URL, verify=True)
-            self._suffixes = []
-            for line in resp.text.splitlines():
-                if not line.startswith('//') and line:
-                    self._suffixes.append(line.strip())
+            import requests
+            with tracing.span('u2f.appid.suffixes', {'http.url': SUFFIX_URL}):
+                resp = requests.get(SUFFIX_URL, verify=True)
+                self._suffixes = parse_suffixes(resp.text)
         return self._suffixes
 
     def get_json(self, app_id):
@@ -58,30 +97,17 @@ class AppIDVerifier(object):
         return self._cache[app_id]
 
     def fetch_json(self, app_id):
-        target = app_id
-        while True:
-            resp = requests.get(target, allow_redirects=False, verify=True)
-
-            # If the server returns an HTTP redirect (status code 3xx) the
-            # server must also send the header "FIDO-AppID-Redirect-Authorized:
-            # true" and the client must verify the presence of such a header
-            # before following the redirect. This protects against abuse of
-            # open redirectors within the target domain by unauthorized
-            # parties.
-            if 300 <= resp.status_code < 400:
-                if resp.headers.get('FIDO-AppID-Redirect-Authorized') != \
-                        'true':
-                    raise ValueError('Redirect must set '
-                                     'FIDO-AppID-Redirect-Authorized: true')
-                target = resp.headers['location']
-            else:
-                # The response must set a MIME Content-Type of
-                # "application/fido.trusted-apps+json"
-                if resp.headers['Content-Type'] != \
-                        'application/fido.trusted-apps+json':
-                    raise ValueError('Response must have Content-Type: '
-                                     'application/fido.trusted-apps+json')
-                return resp.json()
+        # Imported here, as most facets can be verified without a fetch.
+        import requests
+        with tracing.span('u2f.appid.fetch', {'u2f.app_id': app_id}) as span:
+            target = app_id
+            while True:
+                resp = requests.get(target, allow_redirects=False, verify=True)
+                location = check_response(resp.status_code, resp.headers)
+                if location is None:
+                    return resp.json()
+                target = location
+                span.set_attribute('u2f.appid.redirected', True)
 
     def least_specific(self, url):
         # The least-specific private label is the portion of the host portion
@@ -123,7 +149,11 @@ class AppIDVerifier(object):
 
         return True
 
-    def verify_facet(self, app_id, facet, version=(1, 0)):
+    def requires_fetch(self, app_id, facet):
+        """
+        Returns True if the Trusted Facet List must be fetched to verify the
+        facet, False if the facet is trivially valid for the AppID.
+        """
         url = urlparse(app_id)
 
         # If the AppID is not an HTTPS URL, and matches the FacetID of the
@@ -131,7 +161,7 @@ class AppIDVerifier(object):
         # proceed
         https = url.scheme == 'https'
         if not https and app_id == facet:
-            return
+            return False
 
         # If the caller's FacetID is an https:// Origin sharing the same host
         # as the AppID, (e.g. if an application hosted at
@@ -139,14 +169,16 @@ class AppIDVerifier(object):
         # https://fido.example.com/myAppId), no additional processing is
         # necessary and the operation may proceed
         if https and '%s://%s' % (url.scheme, url.netloc) == facet:
-            return
+            return False
 
         # Begin to fetch the Trusted Facet List using the HTTP GET method. The
         # location must be identified with an HTTPS URL.
         if not https:
             raise ValueError('AppID URL must use https.')
 
-        data = self.get_json(app_id)
+        return True
+
+    def check_trusted_facets(self, app_id, facet, data, version=(1, 0)):
         # From among the objects in the trustedFacet array, select the one with
         # the verison matching that of the protocol message.
         for entry in data['trustedFacets']:
@@ -163,6 +195,11 @@ class AppIDVerifier(object):
             raise ValueError('Invalid facet: "%s", expecting one of %r' %
                             (facet, trustedFacets))
 
+    def verify_facet(self, app_id, facet, version=(1, 0)):
+        if self.requires_fetch(app_id, facet):
+            data = self.get_json(app_id)
+            self.check_trusted_facets(app_id, facet, data, version)
+
 
 verifier = AppIDVerifier()
 verify_facet = verifier.verify_facet
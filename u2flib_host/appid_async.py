@@ -0,0 +1,149 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+asyncio based AppID verification, for use from within an event loop.
+
+Requires Python 3.5 or later.
+"""
+
+from u2flib_host.appid import (SUFFIX_URL, check_response, parse_suffixes,
+                               verifier as default_verifier)
+from u2flib_host import tracing
+
+from urllib.parse import urlparse
+import asyncio
+import json
+import ssl
+
+
+async def http_get(url, timeout=10.0):
+    """
+    Performs a non-blocking HTTP GET request of url, without following
+    redirects. Returns a tuple of (status_code, headers, body), where headers
+    is a dict keyed by lowercase header names.
+    """
+    url = urlparse(url)
+    https = url.scheme == 'https'
+    port = url.port or (443 if https else 80)
+    context = ssl.create_default_context() if https else None
+    host = url.hostname if url.port is None else '%s:%d' % (url.hostname,
+                                                            url.port)
+    path = url.path or '/'
+    if url.query:
+        path += '?' + url.query
+
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(url.hostname, port, ssl=context), timeout)
+    try:
+        # HTTP/1.0 keeps the response free of chunked transfer encoding.
+        writer.write(('GET %s HTTP/1.0\r\nHost: %s\r\nAccept: */*\r\n'
+                      'Connection: close\r\n\r\n' % (path, host))
+                     .encode('ascii'))
+        raw = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+
+    head, _, body = raw.partition(b'\r\n\r\n')
+    lines = head.decode('iso-8859-1').split('\r\n')
+    try:
+        status_code = int(lines[0].split()[1])
+    except (IndexError, ValueError):
+        raise ValueError('Invalid HTTP response from %s' % url.netloc)
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return status_code, headers, body
+
+
+class AsyncAppIDVerifier(object):
+
+    """
+    Non-blocking counterpart to appid.AppIDVerifier.
+
+    Verification follows the same rules as the wrapped AppIDVerifier, and the
+    fetched suffix list and Trusted Facet Lists are stored in its caches. Once
+    a facet has been verified here, the synchronous verify_facet call made by
+    u2f_v2.register and u2f_v2.authenticate completes without any I/O.
+
+    Concurrent requests for the same resource share a single in-flight fetch.
+    """
+
+    def __init__(self, verifier=None, timeout=10.0):
+        self._verifier = verifier or default_verifier
+        self._pending = {}
+        self.timeout = timeout
+
+    def get(self, url):
+        return http_get(url, self.timeout)
+
+    async def _coalesced(self, key, fetch, *args):
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch(*args))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        # A cancelled waiter must not cancel the fetch for everyone else.
+        return await asyncio.shield(task)
+
+    async def get_suffixes(self):
+        if not hasattr(self._verifier, '_suffixes'):
+            suffixes = await self._coalesced(SUFFIX_URL, self.fetch_suffixes)
+            self._verifier._suffixes = suffixes
+        return self._verifier._suffixes
+
+    async def fetch_suffixes(self):
+        with tracing.span('u2f.appid.suffixes', {'http.url': SUFFIX_URL}):
+            status_code, _, body = await self.get(SUFFIX_URL)
+        if status_code != 200:
+            raise ValueError('Unable to fetch public suffix list')
+        return parse_suffixes(body.decode('utf8'))
+
+    async def get_json(self, app_id):
+        cache = self._verifier._cache
+        if app_id not in cache:
+            cache[app_id] = await self._coalesced(app_id, self.fetch_json,
+                                                  app_id)
+        return cache[app_id]
+
+    async def fetch_json(self, app_id):
+        with tracing.span('u2f.appid.fetch', {'u2f.app_id': app_id}) as span:
+            target = app_id
+            while True:
+                status_code, headers, body = await self.get(target)
+                location = check_response(status_code, headers)
+                if location is None:
+                    return json.loads(body.decode('utf8'))
+                target = location
+                span.set_attribute('u2f.appid.redirected', True)
+
+    async def verify_facet(self, app_id, facet, version=(1, 0)):
+        if self._verifier.requires_fetch(app_id, facet):
+            await self.get_suffixes()
+            data = await self.get_json(app_id)
+            self._verifier.check_trusted_facets(app_id, facet, data, version)
@@ -27,52 +27,75 @@
 
 from __future__ import print_function
 
-from u2flib_host import u2f, exc, __version__
-from u2flib_host.constants import APDU_USE_NOT_SATISFIED
+from u2flib_host import u2f, exc, polling, __version__
+from u2flib_host.polling import poll_devices
+from u2flib_host.cancellation import CancellationToken
+from u2flib_host.constants import APDU_USE_NOT_SATISFIED, KEEPALIVE_UPNEEDED
 from u2flib_host.utils import u2str
 from u2flib_host.yubicommon.compat import text_type
 
-import time
 import json
 import argparse
 import sys
 
 
-def authenticate(devices, params, facet, check_only):
+def authenticate(devices, params, facet, check_only, policy=None,
+                 token=None):
     """
     Interactively authenticates a AuthenticateRequest using an attached U2F
-    device.
+    device. policy is the polling.PollingPolicy used while waiting for a touch,
+    and token an optional CancellationToken bounding the whole operation.
     """
+    policy = policy or polling.PollingPolicy()
+    if token is None:
+        token = CancellationToken(policy.deadline)
+    # Parse and verify once, rather than on every retry below.
+    request = u2f.prepare_authenticate(params, facet)
+
     for device in devices[:]:
         try:
             device.open()
         except:
             devices.remove(device)
 
+    def attempt(device):
+        try:
+            return u2f.authenticate(device, request, facet, check_only,
+                                    token)
+        except exc.APDUError as e:
+            if e.code == APDU_USE_NOT_SATISFIED and check_only:
+                sys.stderr.write('\nCorrect U2F device present!\n')
+                sys.exit(0)
+            raise
+
+    prompted = []
+
+    def prompt():
+        if not prompted:
+            prompted.append(True)
+            sys.stderr.write('\nTouch the flashing U2F device to '
+                             'authenticate...\n')
+
+    def keepalive(status):
+        # Devices sending KEEPALIVE wait for the touch within the request.
+        if status == KEEPALIVE_UPNEEDED:
+            prompt()
+
+    for device in devices:
+        device.on_keepalive = keepalive
+
     try:
-        prompted = False
-        while devices:
-            removed = []
-            for device in devices:
-                try:
-                    return u2f.authenticate(device, params, facet, check_only)
-                except exc.APDUError as e:
-                    if e.code == APDU_USE_NOT_SATISFIED:
-                        if check_only:
-                            sys.stderr.write('\nCorrect U2F device present!\n')
-                            sys.exit(0)
-                        if not prompted:
-                            sys.stderr.write('\nTouch the flashing U2F device '
-                                             'to authenticate...\n')
-                            prompted = True
-                    else:
-                        removed.append(device)
-                except exc.DeviceError:
-                    removed.append(device)
-            devices = [d for d in devices if d not in removed]
-            for d in removed:
-                d.close()
-            time.sleep(0.25)
+        return poll_devices(devices, attempt, policy, prompt, token)
+    except exc.DeadlineExceededError:
+        sys.stderr.write('\nTimed out waiting for a U2F device.\n')
+        sys.exit(1)
+    except (exc.CancelledError, KeyboardInterrupt):
+        for device in devices:
+            device.cancel()
+        sys.stderr.write('\nCancelled.\n')
+        sys.exit(1)
+    except exc.DeviceError:
+        pass
     finally:
         for device in devices:
             device.close()
@@ -97,6 +120,7 @@ def parse_args():
     parser.add_argument('-o', '--outfile', help='specify a file to write '
                         'the AuthenticateResponse to, instead of stdout')
     parser.add_argument('-s', '--soft', help='Specify a soft U2F token file to use')
+    polling.add_arguments(parser)
     return parser.parse_args()
 
 
@@ -117,8 +141,12 @@ def main():
         from u2flib_host.soft import SoftU2FDevice
         devices = [SoftU2FDevice(args.soft)]
     else:
-        devices = u2f.list_devices()
-    result = authenticate(devices, params, facet, args.check_only)
+        found = u2f.TRANSPORTS.enumerate()
+        for name, error in sorted(found.errors.items()):
+            sys.stderr.write('Unable to list %s devices: %s\n' % (name, error))
+        devices = found.devices
+    result = authenticate(devices, params, facet, args.check_only,
+                          polling.policy_from_args(args))
 
     if args.outfile:
         with open(args.outfile, 'w') as f:
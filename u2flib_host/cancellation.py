@@ -0,0 +1,95 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Deadlines and cancellation for device operations.
+"""
+
+from u2flib_host import exc
+from time import time
+import threading
+
+__all__ = [
+    'CancellationToken'
+]
+
+
+class CancellationToken(object):
+
+    """
+    Bounds the time spent on an operation, and allows it to be aborted from
+    another thread.
+
+    A token expires timeout seconds after it is created, if a timeout is
+    given, and is cancelled by calling cancel(). Operations given a token call
+    check() while waiting on a device, which raises DeadlineExceededError or
+    CancelledError as appropriate.
+    """
+
+    def __init__(self, timeout=None):
+        self.deadline = time() + timeout if timeout is not None else None
+        self._event = threading.Event()
+
+    def cancel(self):
+        """
+        Cancels any operation using the token.
+        """
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def remaining(self):
+        """
+        Returns the number of seconds until the deadline, or None if there is
+        no deadline.
+        """
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time(), 0)
+
+    def check(self):
+        """
+        Raises CancelledError if the token has been cancelled, or
+        DeadlineExceededError if the deadline has passed.
+        """
+        if self._event.is_set():
+            raise exc.CancelledError('Operation cancelled')
+        if self.deadline is not None and time() >= self.deadline:
+            raise exc.DeadlineExceededError('Operation deadline exceeded')
+
+    def wait(self, timeout):
+        """
+        Sleeps for up to timeout seconds, waking up early if the token is
+        cancelled or reaches its deadline, then calls check().
+        """
+        remaining = self.remaining()
+        if remaining is not None:
+            timeout = min(timeout, remaining)
+        self._event.wait(timeout)
+        self.check()
@@ -35,3 +35,8 @@ INS_GET_VERSION = 0x03
 APDU_OK = 0x9000
 APDU_USE_NOT_SATISFIED = 0x6985
 APDU_WRONG_DATA = 0x6a80
+APDU_WRONG_LENGTH = 0x6700
+
+#U2FHID KEEPALIVE status codes
+KEEPALIVE_PROCESSING = 0x01
+KEEPALIVE_UPNEEDED = 0x02
@@ -25,10 +25,64 @@
 # ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
-from u2flib_host.constants import APDU_OK, INS_GET_VERSION
+from u2flib_host.apdu import encode_apdu, encode_short_apdu, APDUResponse
+from u2flib_host.constants import (INS_ENROLL, INS_GET_VERSION,
+                                   APDU_WRONG_LENGTH)
 from u2flib_host.yubicommon.compat import int2byte
-from u2flib_host import exc
-import struct
+from u2flib_host import exc, tracing
+from time import time
+import threading
+
+# Statuses with which a device may reject short encoding: wrong length and
+# class not supported.
+_SHORT_REJECTED = (APDU_WRONG_LENGTH, 0x6e00)
+
+
+class VersionCache(object):
+
+    """
+    Process-wide cache of the U2F versions supported by devices, and whether
+    they accept short APDU encoding, keyed by a stable device identity.
+    Entries for devices which are no longer present are dropped by calling
+    retain() with the identities currently attached.
+    """
+
+    def __init__(self):
+        self._versions = {}
+        self._short_apdus = {}
+        self._lock = threading.Lock()
+
+    def get(self, identity):
+        return self._versions.get(identity)
+
+    def put(self, identity, versions):
+        with self._lock:
+            self._versions[identity] = list(versions)
+
+    def get_short_apdus(self, identity):
+        return self._short_apdus.get(identity)
+
+    def put_short_apdus(self, identity, short_apdus):
+        with self._lock:
+            self._short_apdus[identity] = short_apdus
+
+    def invalidate(self, identity):
+        with self._lock:
+            self._versions.pop(identity, None)
+            self._short_apdus.pop(identity, None)
+
+    def retain(self, identities):
+        identities = set(identities)
+        with self._lock:
+            for entries in (self._versions, self._short_apdus):
+                for identity in list(entries):
+                    if identity not in identities:
+                        del entries[identity]
+
+    def clear(self):
+        with self._lock:
+            self._versions.clear()
+            self._short_apdus.clear()
 
 
 class U2FDevice(object):
@@ -44,6 +98,25 @@ class U2FDevice(object):
             dev.send_apdu(...)
     """
 
+    # A hashable value identifying the physical device, or None if the device
+    # can't be reliably identified, in which case version_cache isn't used.
+    identity = None
+
+    # Shared by all devices. May be replaced, or set to None to disable.
+    version_cache = VersionCache()
+
+    # A metrics.Metrics instance recording device operations, if set.
+    metrics = None
+
+    # Whether the device accepts short APDU encoding: None until known, or
+    # False to always use extended length encoding. Shared through
+    # version_cache by devices with the same identity.
+    short_apdus = None
+
+    # A cancellation.CancellationToken bounding operations on the device, if
+    # set. See u2f.register and u2f.authenticate.
+    token = None
+
     def __enter__(self):
         self.open()
         return self
@@ -66,16 +139,30 @@ class U2FDevice(object):
         """
         pass
 
+    def cancel(self):
+        """
+        Aborts any request pending on the device, if supported.
+        """
+        pass
+
     def get_supported_versions(self):
         """
         Gets a list of supported U2F versions from the device.
         """
         if not hasattr(self, '_versions'):
-            try:
-                self._versions = [self.send_apdu(INS_GET_VERSION).decode()]
-            except exc.APDUError as e:
-                # v0 didn't support the instruction.
-                self._versions = ['v0'] if e.code == 0x6d00 else []
+            cache = self.version_cache if self.identity is not None else None
+            versions = cache.get(self.identity) if cache else None
+            if versions is None:
+                with tracing.span('u2f.get_version', device=self) as span:
+                    try:
+                        versions = [self.send_apdu(INS_GET_VERSION).decode()]
+                    except exc.APDUError as e:
+                        # v0 didn't support the instruction.
+                        versions = ['v0'] if e.code == 0x6d00 else []
+                    span.set_attribute('u2f.versions', ','.join(versions))
+                if cache and versions:
+                    cache.put(self.identity, versions)
+            self._versions = versions
 
         return self._versions
 
@@ -86,28 +173,67 @@ class U2FDevice(object):
         # Subclasses should implement this.
         raise NotImplementedError('_do_send_apdu not implemented!')
 
-    def send_apdu(self, ins, p1=0, p2=0, data=b''):
+    def exchange_apdu(self, ins, p1=0, p2=0, data=b''):
         """
         Sends an APDU to the device, and waits for a response.
+        Returns an APDUResponse, without checking the status word.
+
+        Short encoding is used when the data fits and the device hasn't
+        rejected it, falling back to extended length encoding for good if it
+        does. Registrations always use extended length encoding, as their
+        responses don't fit in a short one.
         """
         if data is None:
             data = b''
         elif isinstance(data, int):
             data = int2byte(data)
 
-        size = len(data)
-        l0 = size >> 16 & 0xff
-        l1 = size >> 8 & 0xff
-        l2 = size & 0xff
-        apdu_data = struct.pack('B B B B B B B %is B B' % size,
-                                0, ins, p1, p2, l0, l1, l2, data, 0x00, 0x00)
-        try:
-            resp = self._do_send_apdu(apdu_data)
-        except Exception as e:
-            # TODO Use six.reraise if/when Six becomes an agreed dependency.
-            raise exc.DeviceError(e)
-        status = struct.unpack('>H', resp[-2:])[0]
-        data = resp[:-2]
-        if status != APDU_OK:
-            raise exc.APDUError(status)
-        return data
+        short_apdus = self.short_apdus
+        if short_apdus is None and self.identity is not None and \
+                self.version_cache is not None:
+            short_apdus = self.short_apdus = \
+                self.version_cache.get_short_apdus(self.identity)
+        if short_apdus is not False and len(data) <= 0xff and \
+                ins != INS_ENROLL:
+            response = self._exchange(ins, encode_short_apdu(ins, p1, p2,
+                                                             data))
+            if response.status not in _SHORT_REJECTED:
+                if short_apdus is None:
+                    self._learn_short_apdus(True)
+                return response
+            self._learn_short_apdus(False)
+            if self.metrics is not None:
+                self.metrics.count('apdu_short_rejected')
+        return self._exchange(ins, encode_apdu(ins, p1, p2, data))
+
+    def _learn_short_apdus(self, short_apdus):
+        self.short_apdus = short_apdus
+        if self.identity is not None and self.version_cache is not None:
+            self.version_cache.put_short_apdus(self.identity, short_apdus)
+
+    def _exchange(self, ins, apdu_data):
+        metrics = self.metrics
+        if metrics is not None:
+            start = time()
+        with tracing.span('u2f.apdu', device=self) as span:
+            span.set_attribute('u2f.apdu.ins', ins)
+            try:
+                resp = self._do_send_apdu(apdu_data)
+            except (exc.CancelledError, exc.DeadlineExceededError):
+                raise
+            except Exception as e:
+                # TODO Use six.reraise if/when Six becomes an agreed
+                # dependency.
+                raise exc.DeviceError(e)
+            response = APDUResponse(resp)
+            span.set_attribute('u2f.apdu.sw', response.status)
+        if metrics is not None:
+            metrics.observe('apdu', time() - start, ins='0x%02x' % ins)
+            metrics.count('apdu_status', sw='0x%04x' % response.status)
+        return response
+
+    def send_apdu(self, ins, p1=0, p2=0, data=b''):
+        """
+        Sends an APDU to the device, and waits for a response.
+        """
+        return self.exchange_apdu(ins, p1, p2, data).check().tobytes()
@@ -37,3 +37,11 @@ class APDUError(Exception):
 
 class DeviceError(Exception):
     pass
+
+
+class DeadlineExceededError(Exception):
+    pass
+
+
+class CancelledError(Exception):
+    pass
@@ -0,0 +1,393 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A loopback U2FHID device, for exercising the full HIDDevice stack without
+hardware.
+"""
+
+from u2flib_host.apdu import parse_apdu
+from u2flib_host.constants import (APDU_OK, APDU_USE_NOT_SATISFIED,
+                                   APDU_WRONG_DATA, APDU_WRONG_LENGTH,
+                                   INS_ENROLL, INS_SIGN, INS_GET_VERSION)
+from u2flib_host.hid_transport import (
+    HIDDevice, HID_RPT_SIZE, TYPE_INIT, STAT_ERR, CMD_INIT, CMD_WINK,
+    CMD_PING, CMD_APDU, CMD_LOCK, CMD_CANCEL, CMD_KEEPALIVE,
+    KEEPALIVE_UPNEEDED, ERR_INVALID_CMD,
+    ERR_INVALID_PAR, ERR_INVALID_LEN, ERR_INVALID_SEQ, ERR_MSG_TIMEOUT,
+    ERR_CHANNEL_BUSY, ERR_INVALID_CID
+)
+from u2flib_host import exc
+from collections import deque
+import threading
+import random
+import struct
+import time
+
+__all__ = [
+    'U2FHIDEmulator',
+    'EmulatedHIDDevice'
+]
+
+BROADCAST_CID = b'\xff\xff\xff\xff'
+U2FHID_IF_VERSION = 2
+CAPABILITY_WINK = 0x01
+CAPABILITY_CBOR = 0x04
+MAX_PAYLOAD = HID_RPT_SIZE - 7 + 128 * (HID_RPT_SIZE - 5)
+MAX_LOCK_TIME = 10
+MSG_TIMEOUT = 0.5
+KEEPALIVE_INTERVAL = 0.1
+
+
+def _is_extended(apdu):
+    # Extended length has at least a 3 byte Lc or Le, starting with a 0 byte.
+    return len(apdu) >= 7 and bytearray(apdu)[4] == 0
+
+
+def _status(code):
+    return struct.pack('>H', code)
+
+
+class _Message(object):
+
+    def __init__(self, cid, cmd, size, data):
+        self.cid = cid
+        self.cmd = cmd
+        self.size = size
+        self.data = data
+        self.seq = 0
+        self.started = time.time()
+
+    @property
+    def complete(self):
+        return len(self.data) >= self.size
+
+
+class _Handle(object):
+
+    """
+    A single open handle to an emulated device, implementing the interface of
+    hid.device. Every open handle receives a copy of each input report, as
+    with hidraw.
+    """
+
+    def __init__(self, emulator):
+        self._emulator = emulator
+        self._reports = deque()
+        self._nonblocking = False
+
+    def open(self, vendor_id=0, product_id=0, serial_number=None):
+        self._emulator._attach(self)
+
+    def open_path(self, path):
+        self._emulator._attach(self)
+
+    def close(self):
+        self._emulator._detach(self)
+        self._reports.clear()
+
+    def set_nonblocking(self, nonblocking):
+        self._nonblocking = bool(nonblocking)
+        return 0
+
+    def get_manufacturer_string(self):
+        return u'Yubico'
+
+    def get_product_string(self):
+        return u'U2FHID Emulator'
+
+    def get_serial_number_string(self):
+        return u''
+
+    def write(self, data):
+        report = bytearray(data)
+        # The first byte is the report number.
+        frame = report[1:HID_RPT_SIZE + 1]
+        frame += bytearray(HID_RPT_SIZE - len(frame))
+        self._emulator._receive(bytes(frame))
+        return len(report)
+
+    def read(self, max_length, timeout_ms=0):
+        if not self._reports:
+            return []
+        ready_at, report = self._reports[0]
+        delay = ready_at - time.time()
+        if delay > 0:
+            if self._nonblocking:
+                return []
+            time.sleep(delay)
+        self._reports.popleft()
+        return list(bytearray(report[:max_length]))
+
+
+class U2FHIDEmulator(object):
+
+    """
+    Emulates a U2FHID device, including channel allocation, message
+    fragmentation, channel locking and error reporting.
+
+    APDUs are handled by device, typically a SoftU2FDevice. Each response is
+    delayed by latency seconds plus a random jitter of up to jitter seconds,
+    drawn from a generator seeded with seed so that runs are reproducible.
+    If touch_delay is set, ENROLL and SIGN return USE_NOT_SATISFIED until
+    touch_delay seconds after the first such attempt, to emulate waiting for
+    the user. If keepalive is set, they instead respond once touched, sending
+    KEEPALIVE frames while waiting, like CTAP2 devices. Unless short_apdus is
+    set, short encoded APDUs are rejected with WRONG_LENGTH.
+    """
+
+    def __init__(self, device, latency=0.0, jitter=0.0, seed=0,
+                 touch_delay=0.0, capabilities=CAPABILITY_WINK,
+                 version=(1, 0, 0), keepalive=False, short_apdus=True):
+        self.device = device
+        self.latency = latency
+        self.jitter = jitter
+        self.touch_delay = touch_delay
+        self.capabilities = capabilities
+        self.version = version
+        self.keepalive = keepalive
+        self.short_apdus = short_apdus
+        self.winks = 0
+        self.cancels = 0
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._handles = []
+        self._channels = set()
+        self._next_cid = 1
+        self._message = None
+        self._lock_cid = None
+        self._lock_until = 0
+        self._touch_at = None
+
+    def handle(self):
+        """
+        Returns a new, unopened, hid.device compatible handle.
+        """
+        return _Handle(self)
+
+    def _attach(self, handle):
+        with self._lock:
+            if handle not in self._handles:
+                self._handles.append(handle)
+
+    def _detach(self, handle):
+        with self._lock:
+            if handle in self._handles:
+                self._handles.remove(handle)
+
+    def _send(self, cid, cmd, data, delay=0.0):
+        ready_at = time.time() + self.latency + delay
+        if self.jitter:
+            ready_at += self._random.uniform(0, self.jitter)
+        size = len(data)
+        frame = cid + struct.pack('>BH', TYPE_INIT | cmd, size) + \
+            data[:HID_RPT_SIZE - 7]
+        frames = [frame]
+        data = data[HID_RPT_SIZE - 7:]
+        seq = 0
+        while data:
+            frames.append(cid + struct.pack('>B', seq) +
+                          data[:HID_RPT_SIZE - 5])
+            data = data[HID_RPT_SIZE - 5:]
+            seq += 1
+        for handle in self._handles:
+            for frame in frames:
+                frame += b'\0' * (HID_RPT_SIZE - len(frame))
+                handle._reports.append((ready_at, frame))
+
+    def _error(self, cid, code):
+        self._send(cid, STAT_ERR & ~TYPE_INIT, struct.pack('>B', code))
+
+    def _locked_by_other(self, cid):
+        if self._lock_cid is not None and time.time() > self._lock_until:
+            self._lock_cid = None
+        return self._lock_cid not in (None, cid)
+
+    def _receive(self, frame):
+        with self._lock:
+            cid = frame[:4]
+            header = bytearray(frame[4:7])
+            message = self._message
+            if message is not None and \
+                    time.time() - message.started > MSG_TIMEOUT:
+                self._message = None
+                self._error(message.cid, ERR_MSG_TIMEOUT)
+                message = None
+
+            if header[0] & TYPE_INIT:
+                cmd = header[0] & ~TYPE_INIT
+                size = header[1] << 8 | header[2]
+                if message is not None:
+                    if message.cid != cid:
+                        self._error(cid, ERR_CHANNEL_BUSY)
+                        return
+                    elif cmd != CMD_INIT:
+                        self._message = None
+                        self._error(cid, ERR_INVALID_SEQ)
+                        return
+                if size > MAX_PAYLOAD:
+                    self._message = None
+                    self._error(cid, ERR_INVALID_LEN)
+                    return
+                message = _Message(cid, cmd, size,
+                                   frame[7:7 + min(size, HID_RPT_SIZE - 7)])
+            elif message is None or message.cid != cid:
+                return  # Spurious continuation frames are ignored.
+            elif header[0] != message.seq:
+                self._message = None
+                self._error(cid, ERR_INVALID_SEQ)
+                return
+            else:
+                message.seq += 1
+                remaining = message.size - len(message.data)
+                message.data += frame[5:5 + min(remaining, HID_RPT_SIZE - 5)]
+
+            if message.complete:
+                self._message = None
+                self._dispatch(message.cid, message.cmd, message.data)
+            else:
+                self._message = message
+
+    def _dispatch(self, cid, cmd, data):
+        if cid == BROADCAST_CID and cmd != CMD_INIT or \
+                cid not in self._channels and cid != BROADCAST_CID:
+            self._error(cid, ERR_INVALID_CID)
+        elif cmd == CMD_INIT:
+            self._init(cid, data)
+        elif cmd == CMD_CANCEL and self.capabilities & CAPABILITY_CBOR:
+            self._cancel(cid)
+        elif self._locked_by_other(cid):
+            self._error(cid, ERR_CHANNEL_BUSY)
+        elif cmd == CMD_PING:
+            self._send(cid, cmd, data)
+        elif cmd == CMD_WINK:
+            self.winks += 1
+            self._send(cid, cmd, b'')
+        elif cmd == CMD_LOCK:
+            self._set_lock(cid, data)
+        elif cmd == CMD_APDU:
+            self._apdu(cid, data)
+        else:
+            self._error(cid, ERR_INVALID_CMD)
+
+    def _init(self, cid, nonce):
+        if len(nonce) != 8:
+            self._error(cid, ERR_INVALID_LEN)
+            return
+        if cid == BROADCAST_CID:
+            new_cid = struct.pack('>I', self._next_cid)
+            self._next_cid += 1
+            self._channels.add(new_cid)
+        else:
+            new_cid = cid  # Resynchronize an existing channel.
+        self._send(cid, CMD_INIT, nonce + new_cid + struct.pack(
+            '>BBBBB', U2FHID_IF_VERSION, self.version[0], self.version[1],
+            self.version[2], self.capabilities))
+
+    def _cancel(self, cid):
+        # Pending responses on the channel are dropped, and nothing is sent.
+        self.cancels += 1
+        for handle in self._handles:
+            handle._reports = deque(r for r in handle._reports
+                                    if r[1][:4] != cid)
+
+    def _set_lock(self, cid, data):
+        if len(data) != 1 or bytearray(data)[0] > MAX_LOCK_TIME:
+            self._error(cid, ERR_INVALID_PAR)
+            return
+        seconds = bytearray(data)[0]
+        if seconds:
+            self._lock_cid = cid
+            self._lock_until = time.time() + seconds
+        else:
+            self._lock_cid = None
+        self._send(cid, CMD_LOCK, b'')
+
+    def _user_present(self):
+        if not self.touch_delay:
+            return True
+        now = time.time()
+        if self._touch_at is None:
+            self._touch_at = now + self.touch_delay
+        if now < self._touch_at:
+            return False
+        self._touch_at = None
+        return True
+
+    def _wait_for_touch(self, cid):
+        # Returns the time until the emulated touch, sending KEEPALIVE frames
+        # until then.
+        wait = self._touch_at - time.time()
+        self._touch_at = None
+        sent = 0.0
+        while sent < wait:
+            self._send(cid, CMD_KEEPALIVE,
+                       struct.pack('>B', KEEPALIVE_UPNEEDED), sent)
+            sent += KEEPALIVE_INTERVAL
+        return wait
+
+    def _apdu(self, cid, data):
+        self._send(cid, CMD_APDU, *self._apdu_response(cid, data))
+
+    def _apdu_response(self, cid, data):
+        if not self.short_apdus and not _is_extended(data):
+            return _status(APDU_WRONG_LENGTH), 0.0
+        try:
+            _, ins, p1, p2, data = parse_apdu(data)
+        except ValueError:
+            return _status(APDU_WRONG_LENGTH), 0.0
+
+        delay = 0.0
+        if ins == INS_GET_VERSION:
+            return self.device.get_supported_versions()[0].encode() + \
+                _status(APDU_OK), delay
+        if ins in (INS_ENROLL, INS_SIGN) and p1 != 0x07 and \
+                not self._user_present():
+            if not self.keepalive:
+                return _status(APDU_USE_NOT_SATISFIED), delay
+            delay = self._wait_for_touch(cid)
+        try:
+            return self.device.send_apdu(ins, p1, p2, data) + \
+                _status(APDU_OK), delay
+        except exc.APDUError as e:
+            return _status(e.code), delay
+        except ValueError:
+            return _status(APDU_WRONG_DATA), delay
+
+
+class EmulatedHIDDevice(HIDDevice):
+
+    """
+    A HIDDevice connected to a U2FHIDEmulator instead of a physical device.
+    """
+
+    def __init__(self, emulator, path='emulator'):
+        super(EmulatedHIDDevice, self).__init__(path)
+        self.emulator = emulator
+
+    def _create_handle(self):
+        return self.emulator.handle()
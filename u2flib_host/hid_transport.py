@@ -28,15 +28,27 @@
 from __future__ import print_function
 
 import os
-try:
-    import hidraw as hid  # Prefer hidraw
-except ImportError:
-    import hid
+import random
+import select
+import sys
+import threading
+from u2flib_host import linux_hidraw
+if sys.platform.startswith('linux') and \
+        os.environ.get('U2FLIB_HOST_HIDAPI') is None:
+    hid = linux_hidraw  # No compiled dependency.
+else:
+    try:
+        import hidraw as hid  # Prefer hidraw
+    except ImportError:
+        import hid
 from time import time, sleep
 from u2flib_host.device import U2FDevice
+from u2flib_host.constants import KEEPALIVE_PROCESSING, KEEPALIVE_UPNEEDED
 from u2flib_host.yubicommon.compat import byte2int, int2byte
 from u2flib_host import exc
 
+# Devices listed even if their usage page can't be determined, in which case
+# they're opened to check that they respond to INIT.
 DEVICES = [
     (0x1050, 0x0200),  # Gnubby
     (0x1050, 0x0113),  # YubiKey NEO U2F
@@ -69,44 +81,182 @@ CMD_WINK = 0x08
 CMD_PING = 0x01
 CMD_APDU = 0x03
 CMD_LOCK = 0x04
+CMD_CANCEL = 0x11
+CMD_KEEPALIVE = 0x3b
 U2FHID_YUBIKEY_DEVICE_CONFIG = U2F_VENDOR_FIRST
 
 STAT_ERR = 0xbf
 
+# U2FHID error codes
+ERR_INVALID_CMD = 0x01
+ERR_INVALID_PAR = 0x02
+ERR_INVALID_LEN = 0x03
+ERR_INVALID_SEQ = 0x04
+ERR_MSG_TIMEOUT = 0x05
+ERR_CHANNEL_BUSY = 0x06
+ERR_LOCK_REQUIRED = 0x0a
+ERR_INVALID_CID = 0x0b
+ERR_OTHER = 0x7f
+
+# Errors caused by contention with other channels, which may succeed if the
+# request is sent again.
+TRANSIENT_ERRORS = frozenset([ERR_INVALID_SEQ, ERR_MSG_TIMEOUT,
+                              ERR_CHANNEL_BUSY])
+# Errors meaning that the channel is no longer valid, and needs to be
+# allocated again with INIT.
+CHANNEL_ERRORS = frozenset([ERR_INVALID_CID])
+
+BROADCAST_CID = b"\xff\xff\xff\xff"
+
+# How often a read waiting on a file descriptor checks its cancellation token.
+TOKEN_CHECK_INTERVAL = 0.05
+
+
+def _identity(d):
+    return (d['path'], d['vendor_id'], d['product_id'],
+            d.get('serial_number'))
+
+
+def _make_device(dev_class, d):
+    device = dev_class(d['path'])
+    device.identity = _identity(d)
+    return device
+
+
+FIDO_USAGE_PAGE = 0xf1d0
+FIDO_USAGE_U2FHID = 0x01
+
+
+def _usages(d):
+    # Top level usages, or None if unknown. hidapi versions before 0.10 don't
+    # report usage pages on Linux, these are read from sysfs instead.
+    if d.get('usage_page'):
+        return [(d['usage_page'], d['usage'])]
+    if sys.platform.startswith('linux'):
+        try:
+            return linux_hidraw.usages(d['path']) or None
+        except (IOError, OSError, ValueError):
+            pass
+    return None
+
+
+def _responds(d):
+    device = _make_device(HIDDevice, d)
+    try:
+        device.open()
+    except (exc.DeviceError, IOError, OSError):
+        return False
+    try:
+        # The device is open anyway, populate the version cache.
+        device.get_supported_versions()
+    except exc.DeviceError:
+        pass
+    finally:
+        device.close()
+    return True
+
+
+# Identities of the HID devices present when last listed. Only these are
+# expired from the version cache, which other transports share.
+_listed = set()
+_listed_lock = threading.Lock()
+
 
 def list_devices(dev_class=None):
     dev_class = dev_class or HIDDevice
     devices = []
+    present = []
     for d in hid.enumerate(0, 0):
-        usage_page = d['usage_page']
-        if usage_page == 0xf1d0 and d['usage'] == 1:
-            devices.append(dev_class(d['path']))
-        # Usage page doesn't work on Linux
-        elif (d['vendor_id'], d['product_id']) in DEVICES:
-            device = HIDDevice(d['path'])
-            try:
-                device.open()
-                device.close()
-                devices.append(dev_class(d['path']))
-            except (exc.DeviceError, IOError, OSError):
-                pass
+        present.append(_identity(d))
+        usages = _usages(d)
+        if usages is not None:
+            if (FIDO_USAGE_PAGE, FIDO_USAGE_U2FHID) in usages:
+                devices.append(_make_device(dev_class, d))
+        elif (d['vendor_id'], d['product_id']) in DEVICES and _responds(d):
+            devices.append(_make_device(dev_class, d))
+    # Forget about devices which have been unplugged.
+    with _listed_lock:
+        gone = _listed.difference(present)
+        _listed.clear()
+        _listed.update(present)
+    cache = U2FDevice.version_cache
+    if cache is not None:
+        for identity in gone:
+            cache.invalidate(identity)
     return devices
 
 
-def _read_timeout(dev, size, timeout=2.0):
+def _read_timeout(dev, size, timeout=2.0, token=None):
+    # Handles with a file descriptor are waited on, others polled.
+    fileno = dev.fileno() if hasattr(dev, 'fileno') else None
     timeout += time()
     while time() < timeout:
+        if token is not None:
+            token.check()
+        if fileno is not None:
+            wait = timeout - time()
+            if token is not None:
+                wait = min(wait, TOKEN_CHECK_INTERVAL)
+            select.select([fileno], [], [], max(wait, 0))
         resp = dev.read(size)
         if resp:
             return resp
     return []
 
 
+def _report(values):
+    # Backends read reports as bytes, or as lists of ints.
+    return values if isinstance(values, bytes) else bytes(bytearray(values))
+
+
 class U2FHIDError(Exception):
     def __init__(self, code):
         super(Exception, self).__init__("U2FHIDError: 0x%02x" % code)
         self.code = code
 
+    @property
+    def transient(self):
+        """
+        True if the request may succeed if sent again.
+        """
+        return self.code in TRANSIENT_ERRORS
+
+    @property
+    def invalid_channel(self):
+        """
+        True if the channel needs to be allocated again.
+        """
+        return self.code in CHANNEL_ERRORS
+
+
+class RetryPolicy(object):
+
+    """
+    How HIDDevice.call retries requests failing with a U2FHIDError.
+
+    A request is sent at most attempts times. Transient errors are retried
+    after a random delay of between half and all of initial_delay, doubling
+    for each attempt up to max_delay, so that competing channels don't retry
+    in lockstep. An invalid channel is allocated again with INIT, and the
+    request retried immediately.
+    """
+
+    def __init__(self, attempts=4, initial_delay=0.02, max_delay=0.5):
+        if attempts < 1:
+            raise ValueError('attempts must be at least 1')
+        self.attempts = attempts
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self._random = random.Random()
+
+    def delay(self, attempt):
+        """
+        Returns the time to wait before retrying after the given (1-based)
+        failed attempt.
+        """
+        delay = min(self.initial_delay * 2 ** (attempt - 1), self.max_delay)
+        return self._random.uniform(delay / 2, delay)
+
 
 class HIDDevice(U2FDevice):
 
@@ -114,16 +264,43 @@ class HIDDevice(U2FDevice):
     U2FDevice implementation using the HID transport.
     """
 
+    # Shared by all devices. May be replaced, or set to None to disable
+    # retries.
+    retry_policy = RetryPolicy()
+
+    # Called with the status of each KEEPALIVE received while waiting for a
+    # response, if set, e.g. to prompt for a touch on KEEPALIVE_UPNEEDED.
+    on_keepalive = None
+
     def __init__(self, path):
         self.path = path
-        self.cid = b"\xff\xff\xff\xff"
+        self.cid = BROADCAST_CID
         self.capabilities = 0x00
+        # Serializes requests, e.g. with a DeviceScheduler renewing a lock.
+        self._io_lock = threading.RLock()
+        # Set when a response was abandoned, and may still arrive.
+        self._resync = False
+        # Lock time of a renewal deferred until the request in flight ends.
+        self._pending_lock = None
+
+    def _create_handle(self):
+        return hid.device()
 
     def open(self):
-        self.handle = hid.device()
-        self.handle.open_path(self.path)
-        self.handle.set_nonblocking(True)
-        self.init()
+        metrics = self.metrics
+        if metrics is not None:
+            start = time()
+        try:
+            self.handle = self._create_handle()
+            self.handle.open_path(self.path)
+            self.handle.set_nonblocking(True)
+            self.init()
+        except Exception:
+            if metrics is not None:
+                metrics.count('open_errors')
+            raise
+        if metrics is not None:
+            metrics.observe('open', time() - start)
 
     def close(self):
         if hasattr(self, 'handle'):
@@ -131,6 +308,9 @@ class HIDDevice(U2FDevice):
             del self.handle
 
     def init(self):
+        metrics = self.metrics
+        if metrics is not None:
+            start = time()
         nonce = os.urandom(8)
         resp = self.call(CMD_INIT, nonce)
 
@@ -143,10 +323,21 @@ class HIDDevice(U2FDevice):
 
         self.cid = resp[8:12]
         self.capabilities = byte2int(resp[16])
+        if metrics is not None:
+            metrics.observe('init', time() - start)
 
     def ctap2_enabled(self):
         return (self.capabilities >> 2) & 0x01
 
+    def cancel(self):
+        # CANCEL is only defined for devices supporting CTAP2, and has no
+        # response.
+        if self.ctap2_enabled() and hasattr(self, 'handle'):
+            try:
+                self._send_req(self.cid, CMD_CANCEL, b'')
+            except exc.DeviceError:
+                pass
+
     def set_mode(self, mode):
         data = mode + b"\x0f\x00\x00"
         self.call(U2FHID_YUBIKEY_DEVICE_CONFIG, data)
@@ -164,18 +355,46 @@ class HIDDevice(U2FDevice):
         return resp
 
     def lock(self, lock_time=10):
-        self.call(CMD_LOCK, lock_time)
+        # Not retried, letting the caller decide how to wait for a lock held
+        # by another channel.
+        self._call_once(CMD_LOCK, int2byte(lock_time), self.token)
+
+    def renew_lock(self, lock_time=10):
+        """
+        Renews a lock taken with lock(). While a request is in flight, e.g.
+        held open by KEEPALIVE frames waiting for a touch, the device is busy
+        and can't be sent the renewal, so it is sent as soon as the response
+        is read, before any other request.
+        """
+        self._pending_lock = lock_time
+        if self._io_lock.acquire(False):
+            try:
+                self._renew_pending_lock()
+            finally:
+                self._io_lock.release()
+
+    def _renew_pending_lock(self):
+        lock_time, self._pending_lock = self._pending_lock, None
+        if lock_time is not None:
+            self.lock(lock_time)
 
     def _write_to_device(self, to_send, timeout=2.0):
         expected = len(to_send)
         actual = 0
         stop_at = time() + timeout
+        metrics = self.metrics
+        attempts = 0
         while actual != expected:
             if (time() > stop_at):
                 raise exc.DeviceError("Unable to send data to the device")
 
             actual = self.handle.write(to_send)
+            attempts += 1
             sleep(0.025)
+        if metrics is not None:
+            metrics.count('write_attempts', attempts)
+            if attempts > 1:
+                metrics.count('write_retries', attempts - 1)
 
 
     def _send_req(self, cid, cmd, data):
@@ -185,23 +404,37 @@ class HIDDevice(U2FDevice):
         payload = cid + int2byte(TYPE_INIT | cmd) + bc_h + bc_l + \
             data[:HID_RPT_SIZE - 7]
         payload += b'\0' * (HID_RPT_SIZE - len(payload))
-        self._write_to_device([0] + [byte2int(c) for c in payload])
+        # Written as bytearrays, which every backend accepts, with a leading
+        # report number of 0.
+        self._write_to_device(bytearray(b'\0' + payload))
         data = data[HID_RPT_SIZE - 7:]
         seq = 0
         while len(data) > 0:
             payload = cid + int2byte(0x7f & seq) + data[:HID_RPT_SIZE - 5]
             payload += b'\0' * (HID_RPT_SIZE - len(payload))
-            self._write_to_device([0] + [byte2int(c) for c in payload])
+            self._write_to_device(bytearray(b'\0' + payload))
             data = data[HID_RPT_SIZE - 5:]
             seq += 1
 
-    def _read_resp(self, cid, cmd):
+    def _read_resp(self, cid, cmd, token=None):
+        metrics = self.metrics
+        frames = 0
         resp = b'.'
         header = cid + int2byte(TYPE_INIT | cmd)
+        keepalive = cid + int2byte(TYPE_INIT | CMD_KEEPALIVE)
+        # Each frame, including KEEPALIVE, restarts the read timeout, so
+        # there's no limit on how long a device can keep a request pending.
         while resp and resp[:5] != header:
-            resp_vals = _read_timeout(self.handle, HID_RPT_SIZE)
-            resp = b''.join(int2byte(v) for v in resp_vals)
-            if resp[:5] == cid + int2byte(STAT_ERR):
+            resp = _report(_read_timeout(self.handle, HID_RPT_SIZE,
+                                         token=token))
+            frames += 1
+            if resp[:5] == keepalive:
+                self._keepalive(byte2int(resp[7]))
+            elif resp[:5] == cid + int2byte(STAT_ERR):
+                if metrics is not None:
+                    metrics.count('read_frames', frames)
+                    metrics.count('hid_errors',
+                                  code='0x%02x' % byte2int(resp[7]))
                 raise U2FHIDError(byte2int(resp[7]))
 
         if not resp:
@@ -213,8 +446,8 @@ class HIDDevice(U2FDevice):
 
         seq = 0
         while data_len > 0:
-            resp_vals = _read_timeout(self.handle, HID_RPT_SIZE)
-            resp = b''.join(int2byte(v) for v in resp_vals)
+            resp = _report(_read_timeout(self.handle, HID_RPT_SIZE,
+                                         token=token))
             if resp[:4] != cid:
                 raise exc.DeviceError("Wrong CID from device!")
             if byte2int(resp[4]) != seq & 0x7f:
@@ -223,11 +456,91 @@ class HIDDevice(U2FDevice):
             new_data = resp[5:min(5 + data_len, HID_RPT_SIZE)]
             data_len -= len(new_data)
             data += new_data
+        if metrics is not None:
+            metrics.count('read_frames', frames + seq)
         return data
 
-    def call(self, cmd, data=b''):
+    def _keepalive(self, status):
+        self._count('keepalives', status='0x%02x' % status)
+        if self.on_keepalive is not None:
+            self.on_keepalive(status)
+
+    def call(self, cmd, data=b'', token=None):
+        """
+        Sends a U2FHID command and returns the response data.
+
+        Failed requests are retried according to retry_policy. If a
+        CancellationToken is given, or set on the device, the call is aborted
+        once it is cancelled or reaches its deadline, sending CANCEL to the
+        device where supported.
+        """
         if isinstance(data, int):
             data = int2byte(data)
+        if token is None:
+            token = self.token
 
-        self._send_req(self.cid, cmd, data)
-        return self._read_resp(self.cid, cmd)
+        policy = self.retry_policy
+        attempt = 0
+        while True:
+            try:
+                return self._call_once(cmd, data, token)
+            except U2FHIDError as e:
+                attempt += 1
+                if policy is None or attempt >= policy.attempts:
+                    raise
+                if e.invalid_channel and cmd != CMD_INIT:
+                    self._count('reinits')
+                    self.cid = BROADCAST_CID
+                    self.init()
+                elif e.transient:
+                    self._count('call_retries', code='0x%02x' % e.code)
+                    delay = policy.delay(attempt)
+                    if token is not None:
+                        token.wait(delay)
+                    else:
+                        sleep(delay)
+                else:
+                    raise
+
+    def _count(self, name, **labels):
+        if self.metrics is not None:
+            self.metrics.count(name, **labels)
+
+    def _resync_channel(self):
+        # The response to an abandoned request may still arrive on the
+        # channel, and be taken for the response to the next one. A new
+        # channel is allocated instead, skipping any reports on the old one
+        # until the INIT response.
+        self._count('channel_resyncs')
+        self.cid = BROADCAST_CID
+        self.init()
+        self._resync = False
+
+    def _call_once(self, cmd, data, token):
+        if token is not None:
+            token.check()
+
+        metrics = self.metrics
+        if metrics is not None:
+            start = time()
+        with self._io_lock:
+            if self._resync and cmd != CMD_INIT:
+                self._resync_channel()
+            if cmd == CMD_LOCK:
+                self._pending_lock = None
+            self._send_req(self.cid, cmd, data)
+            try:
+                resp = self._read_resp(self.cid, cmd, token)
+            except (exc.CancelledError, exc.DeadlineExceededError):
+                self._resync = True
+                self.cancel()
+                raise
+            if self._pending_lock is not None:
+                try:
+                    self._renew_pending_lock()
+                except (U2FHIDError, exc.DeviceError, exc.CancelledError,
+                        exc.DeadlineExceededError):
+                    pass  # The response is still valid.
+        if metrics is not None:
+            metrics.observe('call', time() - start, cmd='0x%02x' % cmd)
+        return resp
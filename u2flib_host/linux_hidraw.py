@@ -0,0 +1,228 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A pure Python HID backend for Linux, using the hidraw devices directly.
+
+Provides the parts of the hidapi module interface used by hid_transport,
+enumerate() and device(), but reads and writes reports as bytes rather than
+lists of ints, and exposes the file descriptor of an open device, so that it
+can be waited on with select, poll or epoll.
+"""
+
+import errno
+import os
+
+__all__ = [
+    'parse_report_descriptor',
+    'usages',
+    'enumerate',
+    'device'
+]
+
+SYSFS_HIDRAW = '/sys/class/hidraw'
+DEV_DIR = '/dev'
+
+# Short item prefixes, with the size bits masked out.
+_USAGE_PAGE = 0x04
+_USAGE = 0x08
+_COLLECTION = 0xa0
+_END_COLLECTION = 0xc0
+_PUSH = 0xa4
+_POP = 0xb4
+_LONG_ITEM = 0xfe
+_APPLICATION = 0x01
+
+_AGAIN = (errno.EAGAIN, errno.EWOULDBLOCK)
+
+
+def _items(data):
+    data = bytearray(data)
+    i = 0
+    while i < len(data):
+        prefix = data[i]
+        if prefix == _LONG_ITEM:
+            if i + 1 >= len(data):
+                raise ValueError('Truncated long item')
+            i += 3 + data[i + 1]
+            continue
+        size = (0, 1, 2, 4)[prefix & 0x03]
+        if i + 1 + size > len(data):
+            raise ValueError('Truncated item at offset %d' % i)
+        value = 0
+        for j in range(size):
+            value |= data[i + 1 + j] << (8 * j)
+        yield prefix & 0xfc, size, value
+        i += 1 + size
+
+
+def parse_report_descriptor(data):
+    """
+    Parses a HID report descriptor, returning a list of (usage_page, usage)
+    for each top level application collection.
+    """
+    collections = []
+    usage_page = 0
+    stack = []
+    usages = []
+    depth = 0
+    for tag, size, value in _items(data):
+        if tag == _USAGE_PAGE:
+            usage_page = value
+        elif tag == _PUSH:
+            stack.append(usage_page)
+        elif tag == _POP:
+            if not stack:
+                raise ValueError('Pop without push')
+            usage_page = stack.pop()
+        elif tag == _USAGE:
+            # A 4 byte usage includes its usage page.
+            usages.append((value >> 16, value & 0xffff) if size == 4 else
+                          (usage_page, value))
+        elif tag == _COLLECTION:
+            if depth == 0 and value == _APPLICATION and usages:
+                collections.append(usages[0])
+            depth += 1
+        elif tag == _END_COLLECTION:
+            depth -= 1
+        # Local items only apply up to the next main item.
+        if tag & 0x0c == 0x00:
+            usages = []
+    return collections
+
+
+def _read_uevent(path):
+    values = {}
+    with open(path) as f:
+        for line in f:
+            key, sep, value = line.rstrip('\n').partition('=')
+            if sep:
+                values[key] = value
+    return values
+
+
+def usages(path):
+    """
+    Returns the top level (usage_page, usage) of the hidraw device at path,
+    e.g. /dev/hidraw0, from its report descriptor in sysfs.
+    """
+    if isinstance(path, bytes):
+        path = path.decode('utf8')
+    name = os.path.basename(path)
+    with open(os.path.join(SYSFS_HIDRAW, name, 'device',
+                           'report_descriptor'), 'rb') as f:
+        return parse_report_descriptor(f.read())
+
+
+def _info(name):
+    device_dir = os.path.join(SYSFS_HIDRAW, name, 'device')
+    uevent = _read_uevent(os.path.join(device_dir, 'uevent'))
+    _, vendor_id, product_id = uevent['HID_ID'].split(':')
+    collections = usages(name)
+    info = {
+        'path': os.path.join(DEV_DIR, name).encode('utf8'),
+        'vendor_id': int(vendor_id, 16),
+        'product_id': int(product_id, 16),
+        'serial_number': uevent.get('HID_UNIQ', u''),
+        'product_string': uevent.get('HID_NAME', u''),
+        'usage_page': 0,
+        'usage': 0,
+    }
+    return info, collections
+
+
+def enumerate(vendor_id=0, product_id=0):
+    """
+    Lists hidraw devices, optionally filtered by vendor and product ID, like
+    hid.enumerate(). A device with several top level collections is listed
+    once for each. Devices that disappear while listing are skipped.
+    """
+    try:
+        names = sorted(os.listdir(SYSFS_HIDRAW))
+    except OSError:
+        return []
+    devices = []
+    for name in names:
+        try:
+            info, collections = _info(name)
+        except (IOError, OSError, KeyError, ValueError):
+            continue
+        if vendor_id and info['vendor_id'] != vendor_id or \
+                product_id and info['product_id'] != product_id:
+            continue
+        for usage_page, usage in collections or [(0, 0)]:
+            devices.append(dict(info, usage_page=usage_page, usage=usage))
+    return devices
+
+
+class device(object):
+
+    """
+    An open hidraw device, with the interface of hid.device.
+    """
+
+    def __init__(self):
+        self._fd = None
+
+    def open_path(self, path):
+        if isinstance(path, bytes):
+            path = path.decode('utf8')
+        self._fd = os.open(path, os.O_RDWR | os.O_NONBLOCK |
+                           getattr(os, 'O_CLOEXEC', 0))
+
+    def fileno(self):
+        if self._fd is None:
+            raise ValueError('Device not open')
+        return self._fd
+
+    def set_nonblocking(self, nonblocking):
+        # Reads are always non-blocking, wait on fileno() instead.
+        return 0
+
+    def write(self, data):
+        # The first byte is the report number, 0 for unnumbered reports.
+        fd = self.fileno()
+        try:
+            return os.write(fd, bytes(bytearray(data)))
+        except OSError as e:
+            if e.errno in _AGAIN:
+                return 0
+            raise
+
+    def read(self, max_length, timeout_ms=0):
+        fd = self.fileno()
+        try:
+            return os.read(fd, max_length)
+        except OSError as e:
+            if e.errno in _AGAIN:
+                return b''
+            raise
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
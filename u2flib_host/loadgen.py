@@ -0,0 +1,437 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Load generator driving registrations and authentications with soft U2F
+devices against a relying party.
+"""
+
+from __future__ import print_function
+
+from u2flib_host.soft_farm import SoftTokenFarm
+from u2flib_host import __version__
+from time import time, sleep
+import collections
+import math
+import threading
+import argparse
+import tempfile
+import shutil
+import json
+import sys
+try:
+    from urlparse import urlparse
+except ImportError:
+    from urllib.parse import urlparse
+
+__all__ = [
+    'HTTPRelyingParty',
+    'LoadGenerator',
+    'Report'
+]
+
+REGISTER = 'register'
+AUTHENTICATE = 'authenticate'
+# Reported for tasks which couldn't be read.
+INPUT = 'input'
+SCENARIOS = {
+    REGISTER: [REGISTER],
+    AUTHENTICATE: [AUTHENTICATE],
+    'both': [REGISTER, AUTHENTICATE]
+}
+
+
+def percentile(values, p):
+    """
+    Returns the p:th percentile of a sorted list, using the nearest rank.
+    """
+    if not values:
+        return None
+    rank = int(math.ceil(p / 100.0 * len(values))) - 1
+    return values[min(max(rank, 0), len(values) - 1)]
+
+
+class Report(object):
+
+    """
+    Latencies and errors of completed operations, by type.
+    """
+
+    def __init__(self):
+        self._latencies = collections.defaultdict(list)
+        self._errors = collections.defaultdict(int)
+        self._lock = threading.Lock()
+        self.started = time()
+        self.finished = None
+
+    def record(self, kind, seconds):
+        with self._lock:
+            self._latencies[kind].append(seconds)
+
+    def error(self, kind):
+        with self._lock:
+            self._errors[kind] += 1
+
+    def summary(self):
+        """
+        Returns a dict of the duration of the run, and for each operation
+        type, its counts, throughput and latency percentiles in seconds.
+        """
+        duration = (self.finished or time()) - self.started
+        summary = {'duration': duration, 'operations': {}}
+        with self._lock:
+            kinds = set(self._latencies) | set(self._errors)
+            for kind in sorted(kinds):
+                latencies = sorted(self._latencies[kind])
+                summary['operations'][kind] = {
+                    'count': len(latencies),
+                    'errors': self._errors[kind],
+                    'throughput': len(latencies) / duration if duration
+                    else 0.0,
+                    'p50': percentile(latencies, 50),
+                    'p90': percentile(latencies, 90),
+                    'p99': percentile(latencies, 99),
+                    'max': latencies[-1] if latencies else None,
+                }
+        return summary
+
+    def format(self):
+        """
+        Returns the summary as a human readable table.
+        """
+        summary = self.summary()
+        lines = ['%-14s %8s %8s %10s %9s %9s %9s %9s' % (
+            'operation', 'count', 'errors', 'ops/s', 'p50 ms', 'p90 ms',
+            'p99 ms', 'max ms')]
+        for kind, stats in sorted(summary['operations'].items()):
+            times = [stats[k] for k in ('p50', 'p90', 'p99', 'max')]
+            lines.append('%-14s %8d %8d %10.1f %s' % (
+                kind, stats['count'], stats['errors'], stats['throughput'],
+                ' '.join('%9.1f' % (t * 1000) if t is not None else
+                         '%9s' % '-' for t in times)))
+        lines.append('Duration: %.2f s' % summary['duration'])
+        return '\n'.join(lines)
+
+
+class HTTPRelyingParty(object):
+
+    """
+    A relying party reached over HTTP. For an operation (register or
+    authenticate) and a user, the request is fetched with:
+
+        GET <url>/<operation>?user=<user>
+
+    and the response posted as JSON with:
+
+        POST <url>/<operation>?user=<user>
+
+    Any status other than 2xx is an error.
+    """
+
+    def __init__(self, url, timeout=10.0):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            import requests
+            session = self._local.session = requests.Session()
+        return session
+
+    def begin(self, kind, user):
+        resp = self._session().get('%s/%s' % (self.url, kind),
+                                   params={'user': user},
+                                   timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.json()
+
+    def complete(self, kind, user, response):
+        resp = self._session().post('%s/%s' % (self.url, kind),
+                                    params={'user': user},
+                                    data=json.dumps(response),
+                                    headers={'Content-Type':
+                                             'application/json'},
+                                    timeout=self.timeout)
+        resp.raise_for_status()
+
+
+class _Pacer(object):
+
+    # Spaces out the start of operations to a fixed rate, across threads.
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._next = time()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            start_at = self._next
+            self._next = max(start_at, time()) + self.interval
+        delay = start_at - time()
+        if delay > 0:
+            sleep(delay)
+
+
+def _origin(request):
+    # The facet of a web page on the appId's origin, as a browser would use.
+    app_id = request.get('appId')
+    if not app_id:
+        raise ValueError('Request has no appId, a facet must be given')
+    url = urlparse(app_id)
+    return '%s://%s' % (url.scheme, url.netloc)
+
+
+class LoadGenerator(object):
+
+    """
+    Runs tasks concurrently against a relying party, using a SoftTokenFarm.
+
+    A task is a list of steps run in order, each a (user, operation, request)
+    tuple, where operation is register or authenticate. If request is None it
+    is fetched from relying_party, and the response is always posted to
+    relying_party, if set. At most
+    concurrency tasks run at the same time, and if rate is set no more than
+    rate tasks are started per second. If facet is None, the origin of the
+    appId of each request is used as facet. Each completed task is passed to
+    on_result, if set, as (user, operation, response or None, error or None).
+    An error raised when getting the next task is reported as an input
+    error, with user None, and the run goes on with the task after it.
+    """
+
+    def __init__(self, farm, relying_party=None, concurrency=1, rate=None,
+                 facet=None, on_result=None):
+        if concurrency < 1:
+            raise ValueError('concurrency must be at least 1')
+        self.farm = farm
+        self.relying_party = relying_party
+        self.concurrency = concurrency
+        self.rate = rate
+        self.facet = facet
+        self.on_result = on_result
+
+    def _operation(self, user, kind, request):
+        if request is None:
+            request = self.relying_party.begin(kind, user)
+        facet = self.facet or _origin(request)
+        if kind == REGISTER:
+            response = self.farm.register(user, request, facet)
+        elif kind == AUTHENTICATE:
+            response = self.farm.authenticate(user, request, facet)
+        else:
+            raise ValueError('Unknown operation: %s' % kind)
+        if self.relying_party is not None:
+            self.relying_party.complete(kind, user, response)
+        return response
+
+    def run(self, tasks):
+        """
+        Runs all tasks, returning a Report.
+        """
+        report = Report()
+        tasks = iter(tasks)
+        lock = threading.Lock()
+        pacer = _Pacer(self.rate) if self.rate else None
+
+        def worker():
+            while True:
+                with lock:
+                    try:
+                        task = next(tasks, None)
+                    except Exception as e:
+                        report.error(INPUT)
+                        if self.on_result is not None:
+                            self.on_result(None, INPUT, None, e)
+                        continue
+                if task is None:
+                    return
+                for user, kind, request in task:
+                    if pacer is not None:
+                        pacer.wait()
+                    start = time()
+                    try:
+                        response = self._operation(user, kind, request)
+                    except Exception as e:
+                        report.error(kind)
+                        response, error = None, e
+                    else:
+                        report.record(kind, time() - start)
+                        error = None
+                    if self.on_result is not None:
+                        self.on_result(user, kind, response, error)
+                    if error is not None:
+                        break  # Later steps depend on this one.
+
+        threads = [threading.Thread(target=worker)
+                   for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        report.finished = time()
+        return report
+
+
+def generate_tasks(count, users, scenario):
+    """
+    Yields count iterations of the scenario, cycling through users named
+    user0 to user<users - 1>.
+    """
+    for i in range(count):
+        user = 'user%d' % (i % users)
+        yield [(user, kind, None) for kind in SCENARIOS[scenario]]
+
+
+class _TaskReader(object):
+
+    # Unlike a generator, goes on with the next line after raising.
+
+    def __init__(self, f):
+        self._lines = iter(f)
+        self._line_number = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = ''
+        while not line:
+            line = next(self._lines).strip()
+            self._line_number += 1
+        try:
+            task = json.loads(line)
+            return [(task['user'], task['operation'], task['request'])]
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError('Invalid task on line %d: %s' %
+                             (self._line_number, e))
+
+    next = __next__
+
+
+def read_tasks(f):
+    """
+    Returns an iterator of single step tasks from NDJSON lines of the form:
+
+        {"user": ..., "operation": "register", "request": {...}}
+
+    A malformed line raises ValueError, after which iteration can go on with
+    the next line.
+    """
+    return _TaskReader(f)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generates load against a U2F relying party, using soft "
+        "U2F devices.",
+        add_help=True
+    )
+    parser.add_argument('-v', '--version', action='version',
+                        version='%(prog)s ' + __version__)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('-u', '--url', help='base URL of the relying party')
+    source.add_argument('-i', '--infile', help='NDJSON file of requests to '
+                        'complete, instead of fetching them')
+    parser.add_argument('-o', '--outfile', help='write results as NDJSON to '
+                        'the given file')
+    parser.add_argument('-d', '--directory', help='directory to keep the '
+                        'soft devices in (default: a temporary directory)')
+    parser.add_argument('--shards', type=int, default=16,
+                        help='number of store files for the soft devices '
+                        '(default: %(default)s)')
+    parser.add_argument('-c', '--concurrency', type=int, default=4,
+                        help='number of concurrent operations '
+                        '(default: %(default)s)')
+    parser.add_argument('-r', '--rate', type=float,
+                        help='maximum number of operations started per second')
+    parser.add_argument('-n', '--count', type=int, default=100,
+                        help='number of iterations, with --url '
+                        '(default: %(default)s)')
+    parser.add_argument('--users', type=int, default=100,
+                        help='number of users, with --url '
+                        '(default: %(default)s)')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS),
+                        default='both', help='operations per iteration, '
+                        'with --url (default: %(default)s)')
+    parser.add_argument('--facet', help='the facet to use (default: the '
+                        'origin of the appId of each request)')
+    parser.add_argument('--json', action='store_true',
+                        help='print the report as JSON')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    directory = args.directory or tempfile.mkdtemp(prefix='u2f-loadgen-')
+    out = open(args.outfile, 'w') if args.outfile else None
+    out_lock = threading.Lock()
+
+    def on_result(user, kind, response, error):
+        if out is None:
+            return
+        result = {'user': user, 'operation': kind}
+        if error is None:
+            result['response'] = response
+        else:
+            result['error'] = str(error)
+        with out_lock:
+            out.write(json.dumps(result) + '\n')
+
+    infile = open(args.infile, 'r') if args.infile else None
+    try:
+        with SoftTokenFarm(directory, args.shards) as farm:
+            if infile is not None:
+                relying_party = None
+                tasks = read_tasks(infile)
+            else:
+                relying_party = HTTPRelyingParty(args.url)
+                tasks = generate_tasks(args.count, args.users, args.scenario)
+            generator = LoadGenerator(farm, relying_party, args.concurrency,
+                                      args.rate, args.facet, on_result)
+            report = generator.run(tasks)
+    finally:
+        for f in (infile, out):
+            if f is not None:
+                f.close()
+        if not args.directory:
+            shutil.rmtree(directory)
+
+    if args.json:
+        print(json.dumps(report.summary()))
+    else:
+        print(report.format())
+    summary = report.summary()
+    if any(op['errors'] for op in summary['operations'].values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
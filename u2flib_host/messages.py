@@ -0,0 +1,219 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Typed U2F_V2 request and response messages.
+
+The messages are read-only mappings using the JSON field names, so they can
+be used wherever the equivalent dicts are, but hold their values as
+attributes and only encode binary fields when they are first accessed.
+u2f_v2.register and u2f_v2.authenticate return a response message when given
+a request message, and dicts when given dicts.
+"""
+
+from u2flib_host.utils import websafe_decode, websafe_encode
+from u2flib_host.yubicommon.compat import string_types
+import json
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+__all__ = [
+    'RegisterRequest',
+    'SignRequest',
+    'RegisterResponse',
+    'SignResponse'
+]
+
+VERSION = 'U2F_V2'
+
+
+class _Message(Mapping):
+
+    __slots__ = ()
+
+    # JSON field names, in order, mapped to the attributes holding them.
+    _fields = ()
+
+    def __getitem__(self, key):
+        for name, attr in self._fields:
+            if name == key:
+                value = getattr(self, attr)
+                if value is not None:
+                    return value
+                break
+        raise KeyError(key)
+
+    def __iter__(self):
+        for name, attr in self._fields:
+            if getattr(self, attr) is not None:
+                yield name
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, self.to_dict())
+
+    def to_dict(self):
+        return dict((name, getattr(self, attr)) for name, attr in self._fields
+                    if getattr(self, attr) is not None)
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_dict(cls, data):
+        raise NotImplementedError()
+
+    @classmethod
+    def from_json(cls, data):
+        """
+        Parses a message from JSON text, or returns it as is if it already is
+        an instance of cls.
+        """
+        if isinstance(data, cls):
+            return data
+        if isinstance(data, string_types):
+            data = json.loads(data)
+        return cls.from_dict(data)
+
+
+class RegisterRequest(_Message):
+
+    __slots__ = ('version', 'challenge', 'app_id')
+    _fields = (('version', 'version'), ('challenge', 'challenge'),
+               ('appId', 'app_id'))
+
+    def __init__(self, challenge, app_id=None, version=VERSION):
+        self.version = version
+        self.challenge = challenge
+        self.app_id = app_id
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['challenge'], data.get('appId'), data['version'])
+
+
+class SignRequest(_Message):
+
+    __slots__ = ('version', 'challenge', 'app_id', 'key_handle')
+    _fields = (('version', 'version'), ('challenge', 'challenge'),
+               ('appId', 'app_id'), ('keyHandle', 'key_handle'))
+
+    def __init__(self, challenge, key_handle, app_id=None, version=VERSION):
+        self.version = version
+        self.challenge = challenge
+        self.app_id = app_id
+        self.key_handle = key_handle
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['challenge'], data['keyHandle'], data.get('appId'),
+                   data['version'])
+
+
+class RegisterResponse(_Message):
+
+    """
+    The registration_data attribute holds the raw response from the device,
+    and client_data the JSON text, both encoded on access by field name.
+    """
+
+    __slots__ = ('registration_data', 'client_data', '_registration_data',
+                 '_client_data')
+    _fields = (('registrationData', 'encoded_registration_data'),
+               ('clientData', 'encoded_client_data'))
+
+    def __init__(self, registration_data, client_data):
+        self.registration_data = registration_data
+        self.client_data = client_data
+        self._registration_data = None
+        self._client_data = None
+
+    @property
+    def encoded_registration_data(self):
+        if self._registration_data is None:
+            self._registration_data = websafe_encode(self.registration_data)
+        return self._registration_data
+
+    @property
+    def encoded_client_data(self):
+        if self._client_data is None:
+            self._client_data = websafe_encode(self.client_data)
+        return self._client_data
+
+    @classmethod
+    def from_dict(cls, data):
+        response = cls(websafe_decode(data['registrationData']),
+                       websafe_decode(data['clientData']).decode('utf8'))
+        response._registration_data = data['registrationData']
+        response._client_data = data['clientData']
+        return response
+
+
+class SignResponse(_Message):
+
+    """
+    The signature_data attribute holds the raw response from the device,
+    and client_data the JSON text, both encoded on access by field name.
+    """
+
+    __slots__ = ('signature_data', 'client_data', 'key_handle',
+                 '_signature_data', '_client_data')
+    _fields = (('clientData', 'encoded_client_data'),
+               ('signatureData', 'encoded_signature_data'),
+               ('keyHandle', 'key_handle'))
+
+    def __init__(self, signature_data, client_data, key_handle):
+        self.signature_data = signature_data
+        self.client_data = client_data
+        self.key_handle = key_handle
+        self._signature_data = None
+        self._client_data = None
+
+    @property
+    def encoded_signature_data(self):
+        if self._signature_data is None:
+            self._signature_data = websafe_encode(self.signature_data)
+        return self._signature_data
+
+    @property
+    def encoded_client_data(self):
+        if self._client_data is None:
+            self._client_data = websafe_encode(self.client_data)
+        return self._client_data
+
+    @classmethod
+    def from_dict(cls, data):
+        response = cls(websafe_decode(data['signatureData']),
+                       websafe_decode(data['clientData']).decode('utf8'),
+                       data['keyHandle'])
+        response._signature_data = data['signatureData']
+        response._client_data = data['clientData']
+        return response
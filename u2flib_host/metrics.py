@@ -0,0 +1,147 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Collection of counts and timings of device operations.
+
+Instrumentation is disabled by default. To enable it for all devices:
+
+    from u2flib_host.device import U2FDevice
+    from u2flib_host.metrics import Metrics
+
+    U2FDevice.metrics = metrics = Metrics()
+    ...
+    print(metrics.to_prometheus())
+
+The metrics attribute can also be set on a single device instance.
+"""
+
+from __future__ import division
+
+import threading
+import json
+
+__all__ = [
+    'Metrics'
+]
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\')
+                                          .replace('"', '\\"'))
+                             for k, v in labels)
+
+
+class Metrics(object):
+
+    """
+    Thread safe collection of counters and timings, keyed by name and labels.
+
+    Recorded names:
+      Timings: list_devices (transport), open, init, call (cmd), apdu (ins).
+      Counters: write_attempts, write_retries, read_frames, apdu_status (sw),
+      apdu_short_rejected, hid_errors (code), open_errors,
+      list_devices_errors (transport), channel_resyncs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timings = {}
+
+    def count(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            timing = self._timings.get(key)
+            if timing is None:
+                self._timings[key] = [1, seconds, seconds]
+            else:
+                timing[0] += 1
+                timing[1] += seconds
+                timing[2] = max(timing[2], seconds)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+
+    def snapshot(self):
+        """
+        Returns the current values as a dict, suitable for serialization.
+        """
+        with self._lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in
+                        sorted(self._counters.items())]
+            timings = [{'name': name, 'labels': dict(labels), 'count': count,
+                        'sum': total, 'max': max_, 'mean': total / count}
+                       for (name, labels), (count, total, max_) in
+                       sorted(self._timings.items())]
+        return {'counters': counters, 'timings': timings}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), sort_keys=True)
+
+    def to_prometheus(self, prefix='u2flib_host_'):
+        """
+        Returns the current values in the Prometheus text exposition format.
+        Timings are exported as summaries, in seconds.
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            # Copied, as observe() updates the lists in place.
+            timings = sorted((key, tuple(timing))
+                             for key, timing in self._timings.items())
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            metric = '%s%s_total' % (prefix, name)
+            if metric not in typed:
+                typed.add(metric)
+                lines.append('# TYPE %s counter' % metric)
+            lines.append('%s%s %d' % (metric, _format_labels(labels), value))
+        for (name, labels), (count, total, max_) in timings:
+            metric = '%s%s_seconds' % (prefix, name)
+            if metric not in typed:
+                typed.add(metric)
+                lines.append('# TYPE %s summary' % metric)
+            lines.append('%s_count%s %d' % (metric, _format_labels(labels),
+                                            count))
+            lines.append('%s_sum%s %.9f' % (metric, _format_labels(labels),
+                                            total))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,167 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Polling of devices while waiting for the user to touch one of them.
+"""
+
+from u2flib_host.constants import APDU_USE_NOT_SATISFIED
+from u2flib_host import exc, tracing
+from time import time, sleep
+
+__all__ = [
+    'PollingPolicy',
+    'poll_devices'
+]
+
+
+class PollingPolicy(object):
+
+    """
+    Intervals between attempts while waiting for user presence.
+
+    The first fast_polls attempts are made initial_interval seconds apart, so
+    that a quick touch is picked up quickly. After that the interval grows by
+    a factor of backoff per attempt, up to max_interval, to limit the traffic
+    to devices nobody is touching. No attempts are started more than deadline
+    seconds after the first, if a deadline is set.
+    """
+
+    def __init__(self, initial_interval=0.1, fast_polls=5, backoff=1.5,
+                 max_interval=0.5, deadline=None):
+        if initial_interval <= 0 or max_interval < initial_interval:
+            raise ValueError('Invalid polling intervals')
+        if backoff < 1:
+            raise ValueError('backoff must be at least 1')
+        self.initial_interval = initial_interval
+        self.fast_polls = fast_polls
+        self.backoff = backoff
+        self.max_interval = max_interval
+        self.deadline = deadline
+
+    def intervals(self):
+        """
+        Yields the time to wait after each attempt, indefinitely.
+        """
+        interval = self.initial_interval
+        attempt = 0
+        while True:
+            attempt += 1
+            yield interval
+            if attempt >= self.fast_polls:
+                interval = min(interval * self.backoff, self.max_interval)
+
+
+def poll_devices(devices, operation, policy=None, on_waiting=None,
+                 token=None):
+    """
+    Calls operation(device) for each of the (open) devices in turn, until one
+    of them succeeds, and returns the result.
+
+    Devices failing with USE_NOT_SATISFIED are tried again later, following
+    policy. on_waiting is called the first time that happens. Devices failing
+    in any other way are closed and dropped. Raises DeviceError once no devices
+    remain, and DeadlineExceededError if the policy deadline passes first.
+    If a CancellationToken is given, waiting ends as soon as it is cancelled
+    or reaches its deadline, raising CancelledError or DeadlineExceededError.
+    """
+    policy = policy or PollingPolicy()
+    devices = list(devices)
+    if policy.deadline is not None:
+        deadline = time() + policy.deadline
+    waiting = False
+    for interval in policy.intervals():
+        removed = []
+        for device in devices:
+            if token is not None:
+                token.check()
+            try:
+                return operation(device)
+            except exc.APDUError as e:
+                if e.code == APDU_USE_NOT_SATISFIED:
+                    if not waiting and on_waiting is not None:
+                        on_waiting()
+                    waiting = True
+                else:
+                    removed.append(device)
+            except exc.DeviceError:
+                removed.append(device)
+        for device in removed:
+            devices.remove(device)
+            device.close()
+        if not devices:
+            raise exc.DeviceError('No device was able to complete the '
+                                  'operation')
+
+        if policy.deadline is not None:
+            remaining = deadline - time()
+            if remaining <= 0:
+                raise exc.DeadlineExceededError(
+                    'No user presence within %.1f seconds' % policy.deadline)
+            interval = min(interval, remaining)
+        with tracing.span('u2f.touch_wait', {'u2f.touch_wait.interval':
+                                             interval}):
+            if token is not None:
+                token.wait(interval)
+            else:
+                sleep(interval)
+
+
+def add_arguments(parser):
+    """
+    Adds command line arguments for configuring a PollingPolicy to an
+    argparse parser.
+    """
+    defaults = PollingPolicy()
+    parser.add_argument('--poll-interval', type=float, metavar='SECONDS',
+                        default=defaults.initial_interval,
+                        help='initial time between attempts while waiting '
+                        'for a touch (default: %(default)s)')
+    parser.add_argument('--fast-polls', type=int, metavar='N',
+                        default=defaults.fast_polls,
+                        help='number of attempts made at the initial '
+                        'interval (default: %(default)s)')
+    parser.add_argument('--poll-backoff', type=float, metavar='FACTOR',
+                        default=defaults.backoff,
+                        help='factor by which the interval grows after that '
+                        '(default: %(default)s)')
+    parser.add_argument('--poll-max-interval', type=float, metavar='SECONDS',
+                        default=defaults.max_interval,
+                        help='maximum time between attempts '
+                        '(default: %(default)s)')
+    parser.add_argument('-t', '--timeout', type=float, metavar='SECONDS',
+                        help='give up if no device is touched within the '
+                        'given time')
+
+
+def policy_from_args(args):
+    """
+    Creates a PollingPolicy from arguments added with add_arguments.
+    """
+    return PollingPolicy(args.poll_interval, args.fast_polls,
+                         args.poll_backoff, args.poll_max_interval,
+                         args.timeout)
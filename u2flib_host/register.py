@@ -27,21 +27,29 @@
 
 from __future__ import print_function
 
-from u2flib_host import u2f, exc, __version__
-from u2flib_host.constants import APDU_USE_NOT_SATISFIED
+from u2flib_host import u2f, exc, polling, __version__
+from u2flib_host.polling import poll_devices
+from u2flib_host.cancellation import CancellationToken
 from u2flib_host.utils import u2str
 from u2flib_host.yubicommon.compat import text_type
 
-import time
 import json
 import argparse
 import sys
 
 
-def register(devices, params, facet):
+def register(devices, params, facet, policy=None, token=None):
     """
     Interactively registers a single U2F device, given the RegistrationRequest.
+    policy is the polling.PollingPolicy used while waiting for a touch, and
+    token an optional CancellationToken bounding the whole operation.
     """
+    policy = policy or polling.PollingPolicy()
+    if token is None:
+        token = CancellationToken(policy.deadline)
+    # Parse and verify once, rather than on every retry below.
+    request = u2f.prepare_register(params, facet)
+
     for device in devices[:]:
         try:
             device.open()
@@ -50,26 +58,21 @@ def register(devices, params, facet):
 
     sys.stderr.write('\nTouch the U2F device you wish to register...\n')
     try:
-        while devices:
-            removed = []
-            for device in devices:
-                try:
-                    return u2f.register(device, params, facet)
-                except exc.APDUError as e:
-                    if e.code == APDU_USE_NOT_SATISFIED:
-                        pass
-                    else:
-                        removed.append(device)
-                except exc.DeviceError:
-                    removed.append(device)
-            devices = [d for d in devices if d not in removed]
-            for d in removed:
-                d.close()
-            time.sleep(0.25)
+        return poll_devices(
+            devices,
+            lambda device: u2f.register(device, request, facet, token),
+            policy, token=token)
+    except exc.DeadlineExceededError:
+        sys.stderr.write('\nTimed out waiting for a U2F device.\n')
+    except (exc.CancelledError, KeyboardInterrupt):
+        for device in devices:
+            device.cancel()
+        sys.stderr.write('\nCancelled.\n')
+    except exc.DeviceError:
+        sys.stderr.write('\nUnable to register with any U2F device.\n')
     finally:
         for device in devices:
             device.close()
-    sys.stderr.write('\nUnable to register with any U2F device.\n')
     sys.exit(1)
 
 
@@ -89,6 +92,7 @@ def parse_args():
                         'the RegistrationResponse to, instead of stdout')
     parser.add_argument('-s', '--soft', help='Specify a soft U2F device file '
                         'to use')
+    polling.add_arguments(parser)
     return parser.parse_args()
 
 
@@ -109,8 +113,11 @@ def main():
         from u2flib_host.soft import SoftU2FDevice
         devices = [SoftU2FDevice(args.soft)]
     else:
-        devices = u2f.list_devices()
-    result = register(devices, params, facet)
+        found = u2f.TRANSPORTS.enumerate()
+        for name, error in sorted(found.errors.items()):
+            sys.stderr.write('Unable to list %s devices: %s\n' % (name, error))
+        devices = found.devices
+    result = register(devices, params, facet, polling.policy_from_args(args))
 
     if args.outfile:
         with open(args.outfile, 'w') as f:
@@ -0,0 +1,271 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Parsing and verification of the registrationData and signatureData of U2F_V2
+responses.
+
+Parsing slices the data without copying it, so the parsed fields are
+memoryviews into the original buffer. Verification requires cryptography.
+"""
+
+from u2flib_host.utils import websafe_decode
+from u2flib_host.yubicommon.compat import text_type
+from hashlib import sha256
+import struct
+
+__all__ = [
+    'RegistrationData',
+    'SignatureData',
+    'parse_registration_data',
+    'parse_signature_data',
+    'verify_registration',
+    'verify_signature',
+    'verify_registrations',
+    'verify_signatures'
+]
+
+PUBLIC_KEY_SIZE = 65
+_COUNTER = struct.Struct('>I')
+
+
+def _view(data):
+    if isinstance(data, text_type):
+        data = websafe_decode(data)
+    return memoryview(data)
+
+
+def _bytes(data):
+    return data.tobytes() if isinstance(data, memoryview) else bytes(data)
+
+
+def _der_length(view, offset):
+    # Returns the total length of the DER element starting at offset.
+    if len(view) < offset + 2:
+        raise ValueError('Truncated certificate')
+    length = bytearray(view[offset + 1:offset + 2])[0]
+    header = 2
+    if length & 0x80:
+        size = length & 0x7f
+        if size == 0 or size > 4 or len(view) < offset + 2 + size:
+            raise ValueError('Invalid certificate length')
+        length = 0
+        for b in bytearray(view[offset + 2:offset + 2 + size]):
+            length = length << 8 | b
+        header += size
+    return header + length
+
+
+class RegistrationData(object):
+
+    """
+    The parsed fields of registrationData: the raw public_key, key_handle,
+    the DER encoded attestation certificate and the signature.
+    """
+
+    __slots__ = ('public_key', 'key_handle', 'certificate', 'signature')
+
+    def __init__(self, public_key, key_handle, certificate, signature):
+        self.public_key = public_key
+        self.key_handle = key_handle
+        self.certificate = certificate
+        self.signature = signature
+
+
+class SignatureData(object):
+
+    """
+    The parsed fields of signatureData: the user_presence flag, counter and
+    signature, along with the raw flags byte and counter needed to verify it.
+    """
+
+    __slots__ = ('flags', 'user_presence', 'counter', 'signature')
+
+    def __init__(self, flags, counter, signature):
+        self.flags = flags
+        self.user_presence = bool(flags & 0x01)
+        self.counter = counter
+        self.signature = signature
+
+
+def parse_registration_data(data):
+    """
+    Parses registrationData, given as raw bytes-like data or websafe base64
+    text. Raises ValueError if it is malformed.
+    """
+    view = _view(data)
+    if len(view) < 1 + PUBLIC_KEY_SIZE + 1 or \
+            bytearray(view[0:1])[0] != 0x05:
+        raise ValueError('Invalid registration data')
+    offset = 1 + PUBLIC_KEY_SIZE
+    public_key = view[1:offset]
+    kh_len = bytearray(view[offset:offset + 1])[0]
+    offset += 1
+    key_handle = view[offset:offset + kh_len]
+    offset += kh_len
+    cert_len = _der_length(view, offset)
+    if len(view) <= offset + cert_len:
+        raise ValueError('Truncated registration data')
+    certificate = view[offset:offset + cert_len]
+    signature = view[offset + cert_len:]
+    return RegistrationData(public_key, key_handle, certificate, signature)
+
+
+def parse_signature_data(data):
+    """
+    Parses signatureData, given as raw bytes-like data or websafe base64
+    text. Raises ValueError if it is malformed.
+    """
+    view = _view(data)
+    if len(view) <= 5:
+        raise ValueError('Invalid signature data')
+    flags = bytearray(view[0:1])[0]
+    counter = _COUNTER.unpack(_bytes(view[1:5]))[0]
+    return SignatureData(flags, counter, view[5:])
+
+
+def _client_param(client_data):
+    if isinstance(client_data, text_type):
+        client_data = client_data.encode('utf8')
+    return sha256(client_data).digest()
+
+
+class _Verifier(object):
+
+    # Caches loaded keys and app parameters, for verifying many responses.
+
+    def __init__(self):
+        from cryptography.hazmat.backends import default_backend
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import ec
+        from cryptography import exceptions, x509
+        self._backend = default_backend()
+        self._ec = ec
+        self._x509 = x509
+        self._algorithm = ec.ECDSA(hashes.SHA256())
+        self._invalid = exceptions.InvalidSignature
+        self._keys = {}
+        self._certificates = {}
+        self._app_params = {}
+
+    def _app_param(self, app_id):
+        app_param = self._app_params.get(app_id)
+        if app_param is None:
+            app_param = sha256(app_id.encode('utf8')).digest()
+            self._app_params[app_id] = app_param
+        return app_param
+
+    def _public_key(self, public_key):
+        public_key = _bytes(public_key)
+        key = self._keys.get(public_key)
+        if key is None:
+            ec = self._ec
+            try:
+                key = ec.EllipticCurvePublicKey.from_encoded_point(
+                    ec.SECP256R1(), public_key)
+            except AttributeError:  # cryptography < 2.5
+                key = ec.EllipticCurvePublicNumbers.from_encoded_point(
+                    ec.SECP256R1(), public_key).public_key(self._backend)
+            self._keys[public_key] = key
+        return key
+
+    def _certificate_key(self, certificate):
+        certificate = _bytes(certificate)
+        key = self._certificates.get(certificate)
+        if key is None:
+            key = self._x509.load_der_x509_certificate(
+                certificate, self._backend).public_key()
+            self._certificates[certificate] = key
+        return key
+
+    def _verify(self, key, signature, message):
+        try:
+            key.verify(_bytes(signature), message, self._algorithm)
+            return True
+        except self._invalid:
+            return False
+
+    def registration(self, registration_data, client_data, app_id):
+        if not isinstance(registration_data, RegistrationData):
+            registration_data = parse_registration_data(registration_data)
+        message = b''.join([b'\0', self._app_param(app_id),
+                            _client_param(client_data),
+                            _bytes(registration_data.key_handle),
+                            _bytes(registration_data.public_key)])
+        return self._verify(
+            self._certificate_key(registration_data.certificate),
+            registration_data.signature, message)
+
+    def signature(self, signature_data, client_data, app_id, public_key):
+        if not isinstance(signature_data, SignatureData):
+            signature_data = parse_signature_data(signature_data)
+        message = b''.join([self._app_param(app_id),
+                            struct.pack('>B', signature_data.flags),
+                            _COUNTER.pack(signature_data.counter),
+                            _client_param(client_data)])
+        return self._verify(self._public_key(public_key),
+                            signature_data.signature, message)
+
+
+def verify_registration(registration_data, client_data, app_id):
+    """
+    Verifies the attestation signature of registrationData, raw, as text or
+    parsed, against the clientData JSON text and the appId. Returns True if
+    the signature is valid.
+    """
+    return _Verifier().registration(registration_data, client_data, app_id)
+
+
+def verify_signature(signature_data, client_data, app_id, public_key):
+    """
+    Verifies signatureData, raw, as text or parsed, against the clientData
+    JSON text, the appId and the raw public key from the registration. Returns
+    True if the signature is valid.
+    """
+    return _Verifier().signature(signature_data, client_data, app_id,
+                                 public_key)
+
+
+def verify_registrations(items):
+    """
+    Verifies many (registration_data, client_data, app_id) tuples, see
+    verify_registration, returning a list of results. Attestation
+    certificates and app IDs shared by several responses are only processed
+    once.
+    """
+    verifier = _Verifier()
+    return [verifier.registration(*item) for item in items]
+
+
+def verify_signatures(items):
+    """
+    Verifies many (signature_data, client_data, app_id, public_key) tuples,
+    see verify_signature, returning a list of results. Public keys and app
+    IDs shared by several responses are only loaded once.
+    """
+    verifier = _Verifier()
+    return [verifier.signature(*item) for item in items]
@@ -0,0 +1,189 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Exclusive, fair access to devices shared between threads and processes.
+"""
+
+from u2flib_host.hid_transport import (U2FHIDError, ERR_CHANNEL_BUSY,
+                                       ERR_INVALID_CMD)
+from u2flib_host import exc
+from collections import deque
+from contextlib import contextmanager
+from time import sleep
+import threading
+import random
+
+__all__ = [
+    'DeviceScheduler'
+]
+
+# The longest lock allowed by the U2FHID specification, in seconds.
+MAX_LOCK_TIME = 10
+
+
+def _device_key(device):
+    # Handles to the same physical device share a queue.
+    key = getattr(device, 'identity', None)
+    if key is None:
+        key = getattr(device, 'path', None)
+    return key if key is not None else id(device)
+
+
+class DeviceScheduler(object):
+
+    """
+    Serializes operations on devices.
+
+    Within a process, callers using the same scheduler are given access to a
+    device in the order they asked for it. Across processes, the U2FHID
+    channel lock keeps other channels from interleaving requests with the
+    operation: the lock is taken for lock_time seconds, and renewed
+    renew_margin seconds before it runs out for as long as the operation
+    lasts. While another channel holds the lock, acquiring it is retried with
+    jittered exponential backoff, starting at retry_interval seconds.
+
+    Devices without a lock command, or rejecting it, are only serialized
+    within the process.
+    """
+
+    def __init__(self, lock_time=MAX_LOCK_TIME, renew_margin=2.0,
+                 retry_interval=0.05, max_retry_interval=1.0):
+        if not 0 < lock_time <= MAX_LOCK_TIME:
+            raise ValueError('lock_time must be between 1 and %d' %
+                             MAX_LOCK_TIME)
+        if not 0 <= renew_margin < lock_time:
+            raise ValueError('renew_margin must be less than lock_time')
+        self.lock_time = lock_time
+        self.renew_margin = renew_margin
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self._condition = threading.Condition()
+        self._queues = {}
+        self._random = random.Random()
+
+    @contextmanager
+    def exclusive(self, device, token=None):
+        """
+        Context manager giving the caller exclusive use of an open device.
+        Waiting for the device ends with an exception if token, a
+        CancellationToken, is cancelled or reaches its deadline.
+        """
+        key = _device_key(device)
+        self._enqueue(key, token)
+        try:
+            locked = self._lock_device(device, token)
+            if not locked:
+                yield device
+                return
+            stop = threading.Event()
+            renewal = threading.Thread(target=self._renew,
+                                       args=(device, stop))
+            renewal.daemon = True
+            renewal.start()
+            try:
+                yield device
+            finally:
+                stop.set()
+                renewal.join()
+                self._unlock_device(device)
+        finally:
+            self._dequeue(key)
+
+    def run(self, device, operation, token=None):
+        """
+        Calls operation(device) with exclusive use of device, and returns the
+        result.
+        """
+        with self.exclusive(device, token):
+            return operation(device)
+
+    def _enqueue(self, key, token):
+        ticket = object()
+        with self._condition:
+            queue = self._queues.setdefault(key, deque())
+            queue.append(ticket)
+            try:
+                while queue[0] is not ticket:
+                    if token is None:
+                        self._condition.wait()
+                    else:
+                        # Cancellation doesn't notify the condition.
+                        token.check()
+                        self._condition.wait(0.05)
+            except BaseException:
+                queue.remove(ticket)
+                if not queue:
+                    del self._queues[key]
+                self._condition.notify_all()
+                raise
+
+    def _dequeue(self, key):
+        with self._condition:
+            queue = self._queues[key]
+            queue.popleft()
+            if not queue:
+                del self._queues[key]
+            self._condition.notify_all()
+
+    def _lock_device(self, device, token):
+        if not hasattr(device, 'lock'):
+            return False
+        interval = self.retry_interval
+        while True:
+            try:
+                device.lock(self.lock_time)
+                return True
+            except U2FHIDError as e:
+                if e.code == ERR_INVALID_CMD:
+                    return False
+                if e.code != ERR_CHANNEL_BUSY:
+                    raise
+            if device.metrics is not None:
+                device.metrics.count('lock_busy')
+            delay = self._random.uniform(interval / 2, interval)
+            if token is not None:
+                token.wait(delay)
+            else:
+                sleep(delay)
+            interval = min(interval * 2, self.max_retry_interval)
+
+    def _renew(self, device, stop):
+        # Renewals are deferred while a request is in flight, rather than
+        # waiting behind it for as long as it takes.
+        while not stop.wait(self.lock_time - self.renew_margin):
+            try:
+                device.renew_lock(self.lock_time)
+            except (U2FHIDError, exc.DeviceError, exc.CancelledError,
+                    exc.DeadlineExceededError):
+                return
+
+    def _unlock_device(self, device):
+        try:
+            device.lock(0)
+        except (U2FHIDError, exc.DeviceError):
+            pass  # The lock expires by itself.
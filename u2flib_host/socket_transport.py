@@ -0,0 +1,520 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Access to U2F devices on another host, over a TCP or Unix socket.
+
+The server side exposes local devices, see SocketServer and u2f-server(1).
+Clients list its devices with list_devices(), and get SocketDevices, which
+send their APDUs through one connection per server. Requests are pipelined:
+devices don't wait for each other's responses.
+
+Messages in either direction are a header, of a request ID, an operation and
+the payload length, followed by the payload. Responses carry the ID of their
+request, and may arrive in any order.
+"""
+
+from __future__ import print_function
+
+from u2flib_host.apdu import parse_apdu
+from u2flib_host.constants import (APDU_OK, APDU_WRONG_DATA,
+                                   APDU_WRONG_LENGTH, INS_GET_VERSION)
+from u2flib_host.device import U2FDevice
+from u2flib_host import exc, __version__
+import argparse
+import itertools
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+__all__ = [
+    'list_devices',
+    'SocketDevice',
+    'SocketServer'
+]
+
+# Environment variable of the comma separated addresses list_devices() uses
+# by default.
+ADDRESS_ENV = 'U2FLIB_HOST_SOCKET'
+DEFAULT_PORT = 6842
+
+_HEADER = struct.Struct('>I B I')
+_NAME_SIZE = struct.Struct('>B')
+_STATUS = struct.Struct('>H')
+MAX_PAYLOAD = 0x20000
+
+OP_LIST = 0x01  # Response payload: JSON list of device names.
+OP_APDU = 0x02  # Request payload: length prefixed device name, command APDU.
+OP_ERROR = 0x7f  # Response payload: error message.
+
+# Interval at which waiting requests check their cancellation token.
+_POLL_INTERVAL = 0.1
+
+
+def parse_address(address):
+    """
+    Parses an address of the form host:port, host, or unix:path, returning
+    the socket family and the address to connect or bind to. An IPv6 address
+    must be given in brackets to be followed by a port, as [host]:port.
+    """
+    if address.startswith('unix:'):
+        return socket.AF_UNIX, address[5:]
+    if address.startswith('['):
+        host, sep, port = address[1:].partition(']')
+        if not sep or port and not port.startswith(':'):
+            raise ValueError('Invalid address: %s' % address)
+        return socket.AF_INET6, (host, int(port[1:] or DEFAULT_PORT))
+    if address.count(':') > 1:  # A bare IPv6 address, without a port.
+        return socket.AF_INET6, (address, DEFAULT_PORT)
+    host, sep, port = address.partition(':')
+    return socket.AF_INET, (host, int(port) if sep else DEFAULT_PORT)
+
+
+def _recv_exactly(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise EOFError('Connection closed')
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def _read_message(sock):
+    request_id, op, size = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    if size > MAX_PAYLOAD:
+        raise ValueError('Message too long: %d' % size)
+    return request_id, op, _recv_exactly(sock, size)
+
+
+def _pack_message(request_id, op, payload):
+    return _HEADER.pack(request_id, op, len(payload)) + payload
+
+
+def _open_socket(address, timeout=None):
+    family, target = parse_address(address)
+    if family == socket.AF_UNIX:
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(target)
+    else:
+        sock = socket.create_connection(target, timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.settimeout(None)
+    return sock
+
+
+class _Pending(object):
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._payload = None
+        self._error = None
+
+    def _resolve(self, payload=None, error=None):
+        self._payload = payload
+        self._error = error
+        self._event.set()
+
+    def result(self, token=None):
+        if token is None:
+            self._event.wait()
+        else:
+            while not self._event.wait(_POLL_INTERVAL):
+                token.check()
+        if self._error is not None:
+            raise self._error
+        return self._payload
+
+
+class SocketConnection(object):
+
+    """
+    A connection to a SocketServer, shared by all devices on it. A reader
+    thread matches responses to requests, so that any number of requests can
+    be in flight at once.
+    """
+
+    def __init__(self, address, timeout=5.0):
+        self.address = address
+        self._sock = _open_socket(address, timeout)
+        self._ids = itertools.count(1)
+        self._send_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._error = None
+        reader = threading.Thread(target=self._read_loop,
+                                  name='u2f-socket-%s' % address)
+        reader.daemon = True
+        reader.start()
+
+    @property
+    def closed(self):
+        return self._error is not None
+
+    def submit(self, op, payload=b''):
+        """
+        Sends a request without waiting for its response. Returns an object
+        whose result(token=None) method waits for the response payload.
+        """
+        pending = _Pending()
+        with self._lock:
+            if self._error is not None:
+                raise self._error
+            request_id = next(self._ids) & 0xffffffff
+            self._pending[request_id] = pending
+        try:
+            with self._send_lock:
+                self._sock.sendall(_pack_message(request_id, op, payload))
+        except (IOError, OSError) as e:
+            self._fail(exc.DeviceError('Connection to %s lost: %s' %
+                                       (self.address, e)))
+        return pending
+
+    def request(self, op, payload=b'', token=None):
+        return self.submit(op, payload).result(token)
+
+    def close(self):
+        self._fail(exc.DeviceError('Connection to %s closed' % self.address))
+
+    def _fail(self, error):
+        with self._lock:
+            if self._error is None:
+                self._error = error
+            pending, self._pending = self._pending, {}
+        for p in pending.values():
+            p._resolve(error=error)
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except (IOError, OSError):
+            pass
+        self._sock.close()
+
+    def _read_loop(self):
+        try:
+            while True:
+                request_id, op, payload = _read_message(self._sock)
+                with self._lock:
+                    # Responses to cancelled requests are dropped.
+                    pending = self._pending.pop(request_id, None)
+                if pending is None:
+                    continue
+                if op == OP_ERROR:
+                    pending._resolve(error=exc.DeviceError(
+                        payload.decode('utf8')))
+                else:
+                    pending._resolve(payload)
+        except (EOFError, ValueError, IOError, OSError) as e:
+            self._fail(exc.DeviceError('Connection to %s lost: %s' %
+                                       (self.address, e)))
+
+
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+def connect(address):
+    """
+    Returns the open connection to address, connecting if needed.
+    """
+    with _connections_lock:
+        connection = _connections.get(address)
+        if connection is None or connection.closed:
+            connection = SocketConnection(address)
+            _connections[address] = connection
+        return connection
+
+
+def _addresses():
+    return [a.strip() for a in os.environ.get(ADDRESS_ENV, '').split(',')
+            if a.strip()]
+
+
+def list_devices(addresses=None):
+    """
+    Lists the devices of the servers at addresses, by default those in the
+    U2FLIB_HOST_SOCKET environment variable.
+    """
+    devices = []
+    for address in _addresses() if addresses is None else addresses:
+        names = json.loads(connect(address).request(OP_LIST).decode('utf8'))
+        devices.extend(SocketDevice(address, name) for name in names)
+    return devices
+
+
+class SocketDevice(U2FDevice):
+
+    """
+    A device exposed by a SocketServer.
+    """
+
+    def __init__(self, address, name):
+        self.address = address
+        self.name = name
+        self.identity = (address, name)
+        name = name.encode('utf8')
+        self._prefix = _NAME_SIZE.pack(len(name)) + name
+
+    def _do_send_apdu(self, apdu_data):
+        return connect(self.address).request(OP_APDU,
+                                             self._prefix + apdu_data,
+                                             self.token)
+
+    def __repr__(self):
+        return 'SocketDevice(%r, %r)' % (self.address, self.name)
+
+
+def _respond(device, apdu):
+    # Handles a command APDU, like a device would.
+    try:
+        _, ins, p1, p2, data = parse_apdu(apdu)
+    except ValueError:
+        return _STATUS.pack(APDU_WRONG_LENGTH)
+    try:
+        if ins == INS_GET_VERSION:
+            # Soft devices only implement get_supported_versions().
+            versions = device.get_supported_versions()
+            if not versions or versions == ['v0']:
+                raise exc.APDUError(0x6d00)
+            response = versions[0].encode()
+        else:
+            response = device.send_apdu(ins, p1, p2, data)
+    except exc.APDUError as e:
+        return _STATUS.pack(e.code)
+    except ValueError:  # Soft devices reject unknown key handles this way.
+        return _STATUS.pack(APDU_WRONG_DATA)
+    return response + _STATUS.pack(APDU_OK)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def setup(self):
+        self._send_lock = threading.Lock()
+        if self.server.family != socket.AF_UNIX:
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.owner._connected()
+
+    def handle(self):
+        while True:
+            try:
+                message = _read_message(self.request)
+            except (EOFError, ValueError, IOError, OSError):
+                return
+            # Requests to different devices are handled concurrently.
+            worker = threading.Thread(target=self._process, args=message)
+            worker.daemon = True
+            worker.start()
+
+    def _process(self, request_id, op, payload):
+        try:
+            response = self.server.owner._process(op, payload)
+        except Exception as e:
+            op, response = OP_ERROR, (str(e) or repr(e)).encode('utf8')
+        try:
+            with self._send_lock:
+                self.request.sendall(_pack_message(request_id, op, response))
+        except (IOError, OSError):
+            pass
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _TCP6Server(_TCPServer):
+    address_family = socket.AF_INET6
+
+
+if hasattr(socket, 'AF_UNIX'):
+    class _UnixServer(socketserver.ThreadingMixIn,
+                      socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+class SocketServer(object):
+
+    """
+    Exposes devices to SocketDevice clients. devices is a dict of devices by
+    name, e.g. SoftU2FDevices. If hid is set, local HID devices are exposed
+    as well, listed again whenever a client lists devices. Requests to a
+    device are serialized, requests to different devices are not.
+    """
+
+    def __init__(self, address, devices=None, hid=False):
+        family, target = parse_address(address)
+        if family == socket.AF_UNIX:
+            server_class = _UnixServer
+        elif family == socket.AF_INET6:
+            server_class = _TCP6Server
+        else:
+            server_class = _TCPServer
+        self._server = server_class(target, _Handler)
+        self._server.family = family
+        self._server.owner = self
+        self._devices = dict(devices or {})
+        self._hid_devices = {}
+        self.hid = hid
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._device_locks = {}
+
+    @property
+    def address(self):
+        """
+        The address clients can connect to, e.g. after binding to port 0.
+        """
+        if self._server.family == socket.AF_UNIX:
+            return 'unix:' + self._server.server_address
+        host, port = self._server.server_address[:2]
+        if ':' in host:
+            host = '[%s]' % host
+        return '%s:%d' % (host, port)
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def start(self):
+        """
+        Serves in a background thread.
+        """
+        thread = threading.Thread(target=self.serve_forever,
+                                  name='u2f-server')
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
+        with self._lock:
+            hid_devices, self._hid_devices = self._hid_devices, {}
+        for device in hid_devices.values():
+            device.close()
+        if self._server.family == socket.AF_UNIX:
+            try:
+                os.unlink(self._server.server_address)
+            except OSError:
+                pass
+
+    def _connected(self):
+        with self._lock:
+            self.connections += 1
+
+    def _refresh_hid(self):
+        from u2flib_host import hid_transport
+        found = {}
+        for device in hid_transport.list_devices():
+            path = device.path
+            if isinstance(path, bytes):
+                path = path.decode('utf8', 'replace')
+            found['hid:' + path] = device
+        with self._lock:
+            current = self._hid_devices
+            gone = [d for name, d in current.items() if name not in found]
+            for name, device in found.items():
+                if name not in current:
+                    try:
+                        device.open()
+                    except (exc.DeviceError, IOError, OSError):
+                        continue  # Busy, or unplugged since it was listed.
+                    current[name] = device
+            for device in gone:
+                device.close()
+            self._hid_devices = dict((name, current[name])
+                                     for name in found if name in current)
+
+    def _lookup(self, name):
+        with self._lock:
+            device = self._devices.get(name) or self._hid_devices.get(name)
+            if device is None:
+                raise ValueError('No such device: %s' % name)
+            lock = self._device_locks.setdefault(name, threading.Lock())
+        return device, lock
+
+    def _process(self, op, payload):
+        if op == OP_LIST:
+            if self.hid:
+                self._refresh_hid()
+            with self._lock:
+                names = sorted(self._devices) + sorted(self._hid_devices)
+            return json.dumps(names).encode('utf8')
+        if op == OP_APDU:
+            size = _NAME_SIZE.unpack_from(payload)[0]
+            name = payload[1:1 + size].decode('utf8')
+            device, lock = self._lookup(name)
+            with lock:
+                return _respond(device, payload[1 + size:])
+        raise ValueError('Unsupported operation: 0x%02x' % op)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Exposes U2F devices to other hosts, over a TCP or Unix "
+        "socket.",
+        add_help=True
+    )
+    parser.add_argument('-v', '--version', action='version',
+                        version='%(prog)s ' + __version__)
+    parser.add_argument('-l', '--listen', default='localhost:%d' %
+                        DEFAULT_PORT, help='address to listen on, host:port, '
+                        '[ipv6]:port or unix:path (default: %(default)s)')
+    parser.add_argument('-s', '--soft', action='append', default=[],
+                        metavar='FILE', help='expose a soft U2F device, '
+                        'stored in the given file (may be repeated)')
+    parser.add_argument('--no-hid', dest='hid', action='store_false',
+                        help="don't expose local HID devices")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    devices = {}
+    if args.soft:
+        from u2flib_host.soft import SoftU2FDevice
+        for filename in args.soft:
+            devices['soft:' + os.path.basename(filename)] = \
+                SoftU2FDevice(filename)
+    server = SocketServer(args.listen, devices, args.hid)
+    sys.stderr.write('Listening on %s\n' % server.address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
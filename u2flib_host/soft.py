@@ -39,7 +39,10 @@ from u2flib_host.device import U2FDevice
 from u2flib_host.constants import INS_ENROLL, INS_SIGN
 from u2flib_host.yubicommon.compat import byte2int, int2byte
 from u2flib_host import exc
+import atexit
 import base64
+import multiprocessing
+import threading
 import json
 import os
 import struct
@@ -72,6 +75,76 @@ def _b16text(s):
     return base64.b16encode(s).decode('ascii')
 
 
+_attestation = []
+
+
+def _attestation_key():
+    """
+    Returns the attestation private key, loaded once per process.
+    """
+    if not _attestation:
+        _attestation.append(serialization.load_pem_private_key(
+            CERT_PRIV, password=None, backend=default_backend(),
+        ))
+    return _attestation[0]
+
+
+def _generate_registration(client_param, app_param):
+    """
+    Generates a new key pair, returning the key handle, the private key as
+    PEM and the raw registration response.
+    """
+    # ECC key generation
+    privu = ec.generate_private_key(CURVE(), default_backend())
+    pubu = privu.public_key()
+    pub_key_der = pubu.public_bytes(
+        serialization.Encoding.DER,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    pub_key = pub_key_der[-65:]
+
+    key_handle = os.urandom(64)
+    priv_key_pem = privu.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+
+    # Attestation signature
+    cert = CERT
+    cert_priv = _attestation_key()
+    signer = cert_priv.signer(ec.ECDSA(hashes.SHA256()))
+    signer.update(
+        b'\x00' + app_param + client_param + key_handle + pub_key
+    )
+    signature = signer.finalize()
+
+    raw_response = b'\x05' + pub_key + int2byte(len(key_handle)) + \
+        key_handle + cert + signature
+
+    return key_handle, priv_key_pem, raw_response
+
+
+def _sign(priv_pem, app_param, counter, client_param):
+    """
+    Signs an authentication, returning the raw response.
+    """
+    privu = serialization.load_pem_private_key(
+        priv_pem, password=None, backend=default_backend(),
+    )
+
+    # Create signature
+    touch = b'\x01' # Always indicate user presence
+    counter = struct.pack('>I', counter)
+
+    signer = privu.signer(ec.ECDSA(hashes.SHA256()))
+    signer.update(app_param + touch + counter + client_param)
+    signature = signer.finalize()
+    raw_response = touch + counter + signature
+
+    return raw_response
+
+
 class SoftU2FDevice(U2FDevice):
 
     """
@@ -107,46 +180,19 @@ class SoftU2FDevice(U2FDevice):
     def _register(self, data):
         client_param = data[:32]
         app_param = data[32:]
-
-        # ECC key generation
-        privu = ec.generate_private_key(CURVE(), default_backend())
-        pubu = privu.public_key()
-        pub_key_der = pubu.public_bytes(
-            serialization.Encoding.DER,
-            serialization.PublicFormat.SubjectPublicKeyInfo,
-        )
-        pub_key = pub_key_der[-65:]
+        key_handle, priv_key_pem, raw_response = _generate_registration(
+            client_param, app_param)
 
         # Store
-        key_handle = os.urandom(64)
-        priv_key_pem = privu.private_bytes(
-            serialization.Encoding.PEM,
-            serialization.PrivateFormat.PKCS8,
-            serialization.NoEncryption(),
-        )
         self.data['keys'][_b16text(key_handle)] = {
             'priv_key': priv_key_pem.decode('ascii'),
             'app_param': _b16text(app_param),
         }
         self._persist()
 
-        # Attestation signature
-        cert = CERT
-        cert_priv = serialization.load_pem_private_key(
-            CERT_PRIV, password=None, backend=default_backend(),
-        )
-        signer = cert_priv.signer(ec.ECDSA(hashes.SHA256()))
-        signer.update(
-            b'\x00' + app_param + client_param + key_handle + pub_key
-        )
-        signature = signer.finalize()
-
-        raw_response = b'\x05' + pub_key + int2byte(len(key_handle)) + \
-            key_handle + cert + signature
-
         return raw_response
 
-    def _authenticate(self, data):
+    def _unwrap(self, data):
         client_param = data[:32]
         app_param = data[32:64]
         kh_len = byte2int(data[64])
@@ -158,22 +204,120 @@ class SoftU2FDevice(U2FDevice):
         unwrapped = self.data['keys'][key_handle]
         if app_param != base64.b16decode(unwrapped['app_param']):
             raise ValueError("Incorrect app param!")
-        priv_pem = unwrapped['priv_key'].encode('ascii')
-        privu = serialization.load_pem_private_key(
-            priv_pem, password=None, backend=default_backend(),
-        )
+        return client_param, app_param, unwrapped['priv_key'].encode('ascii')
+
+    def _authenticate(self, data):
+        client_param, app_param, priv_pem = self._unwrap(data)
 
         # Increment counter
         self.data['counter'] += 1
         self._persist()
 
-        # Create signature
-        touch = b'\x01' # Always indicate user presence
-        counter = struct.pack('>I', self.data['counter'])
+        return _sign(priv_pem, app_param, self.data['counter'], client_param)
+
+
+class SigningPool(object):
 
-        signer = privu.signer(ec.ECDSA(hashes.SHA256()))
-        signer.update(app_param + touch + counter + client_param)
-        signature = signer.finalize()
-        raw_response = touch + counter + signature
+    """
+    A pool of worker processes for PooledSoftU2FDevices, which may be shared
+    by any number of them. The processes are started on first use, using the
+    spawn start method, as forking a process running other threads may
+    deadlock on locks held by those threads. processes defaults to the number
+    of CPUs.
+
+    Stop the pool with close(), or use it as a context manager:
+
+        with SigningPool(4) as pool:
+            dev = PooledSoftU2FDevice(filename, pool)
+    """
+
+    def __init__(self, processes=None, start_method='spawn'):
+        self.processes = processes
+        self.start_method = start_method
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                if hasattr(multiprocessing, 'get_context'):
+                    context = multiprocessing.get_context(self.start_method)
+                else:  # Python 2 can only fork.
+                    context = multiprocessing
+                self._pool = context.Pool(self.processes)
+            return self._pool
+
+    def apply(self, func, args):
+        return self._get_pool().apply(func, args)
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+
+_shared_pool = []
+_shared_pool_lock = threading.Lock()
+
+
+def shared_pool():
+    """
+    Returns the SigningPool used by PooledSoftU2FDevices by default, which is
+    stopped when the interpreter exits.
+    """
+    with _shared_pool_lock:
+        if not _shared_pool:
+            pool = SigningPool()
+            atexit.register(pool.close)
+            _shared_pool.append(pool)
+        return _shared_pool[0]
+
+
+class PooledSoftU2FDevice(SoftU2FDevice):
+
+    """
+    A SoftU2FDevice which does key generation and signing in a SigningPool,
+    so that concurrent operations from multiple threads run in parallel.
+
+    The key store is kept, and persisted, by the process using the device,
+    which is safe to use from multiple threads. pool defaults to
+    shared_pool(). Closing the device leaves the pool running.
+    """
+
+    def __init__(self, filename, pool=None):
+        super(PooledSoftU2FDevice, self).__init__(filename)
+        self.pool = pool if pool is not None else shared_pool()
+        self._lock = threading.Lock()
+
+    def _register(self, data):
+        client_param = data[:32]
+        app_param = data[32:]
+        key_handle, priv_key_pem, raw_response = self.pool.apply(
+            _generate_registration, (client_param, app_param))
+
+        with self._lock:
+            self.data['keys'][_b16text(key_handle)] = {
+                'priv_key': priv_key_pem.decode('ascii'),
+                'app_param': _b16text(app_param),
+            }
+            self._persist()
 
         return raw_response
+
+    def _authenticate(self, data):
+        with self._lock:
+            client_param, app_param, priv_pem = self._unwrap(data)
+            self.data['counter'] += 1
+            self._persist()
+            counter = self.data['counter']
+
+        return self.pool.apply(
+            _sign, (priv_pem, app_param, counter, client_param))
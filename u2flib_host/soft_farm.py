@@ -0,0 +1,189 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Many soft U2F devices in one process, for load testing relying parties.
+"""
+
+from u2flib_host.device import U2FDevice
+from u2flib_host.soft import SoftU2FDevice
+from u2flib_host import u2f
+import hashlib
+import tempfile
+import threading
+import json
+import os
+
+__all__ = [
+    'SoftTokenFarm'
+]
+
+
+class _Shard(object):
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.dirty = False
+        try:
+            with open(filename, 'r') as fp:
+                self.users = json.load(fp)
+        except IOError:
+            self.users = {}
+        except ValueError:
+            # Set a corrupt shard aside, rather than failing every operation
+            # on its users.
+            os.rename(filename, filename + '.corrupt')
+            self.users = {}
+
+    def persist(self):
+        # Written to a temporary file first, so that a crash can't leave a
+        # partially written shard behind.
+        directory, name = os.path.split(self.filename)
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', prefix=name + '.',
+                                   dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as fp:
+                json.dump(self.users, fp)
+            if os.name == 'nt' and os.path.exists(self.filename):
+                os.remove(self.filename)  # rename doesn't replace on Windows.
+            os.rename(tmp, self.filename)
+        except Exception:
+            os.remove(tmp)
+            raise
+        self.dirty = False
+
+
+class _FarmDevice(SoftU2FDevice):
+
+    # A SoftU2FDevice with its data kept in a shard of a SoftTokenFarm.
+
+    def __init__(self, shard, data, identity):
+        U2FDevice.__init__(self)
+        self._shard = shard
+        self.data = data
+        self.identity = identity
+
+    def _persist(self):
+        self._shard.dirty = True
+
+
+class SoftTokenFarm(object):
+
+    """
+    A collection of soft U2F devices, one per user ID, stored in directory.
+
+    Users are spread over a fixed number of shard files by a hash of the user
+    ID, so that a large number of users doesn't mean as many files, nor a
+    single contended one. Shards are loaded when first used, and changes are
+    written by flush(), or when leaving a with block:
+
+        with SoftTokenFarm('tokens') as farm:
+            resp = farm.register('alice', register_request, facet)
+
+    All devices share one attestation key. The methods are thread safe, and
+    operations for users in different shards run concurrently.
+    """
+
+    def __init__(self, directory, shards=16):
+        if shards < 1:
+            raise ValueError('shards must be at least 1')
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = os.path.abspath(directory)
+        self.shards = shards
+        self._shards = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.flush()
+
+    def _shard(self, user_id):
+        digest = hashlib.sha1(user_id.encode('utf8')).hexdigest()
+        return self._load_shard(int(digest[:8], 16) % self.shards)
+
+    def _load_shard(self, index):
+        with self._lock:
+            shard = self._shards.get(index)
+            if shard is None:
+                shard = _Shard(os.path.join(self.directory,
+                                            'shard-%04d.json' % index))
+                self._shards[index] = shard
+            return shard
+
+    def _device(self, shard, user_id):
+        data = shard.users.get(user_id)
+        if data is None:
+            data = shard.users[user_id] = {'counter': 0, 'keys': {}}
+        return _FarmDevice(shard, data, (self.directory, user_id))
+
+    def register(self, user_id, data, facet):
+        """
+        Registers a new key for user_id, returning the RegisterResponse.
+        """
+        # Facet verification may fetch a Trusted Facet List, so it's done
+        # before taking the lock shared with the other users of the shard.
+        data = u2f.prepare_register(data, facet)
+        shard = self._shard(user_id)
+        with shard.lock:
+            return u2f.register(self._device(shard, user_id), data, facet)
+
+    def authenticate(self, user_id, data, facet, check_only=False):
+        """
+        Authenticates using the keys of user_id, returning the
+        AuthenticateResponse.
+        """
+        data = u2f.prepare_authenticate(data, facet)
+        shard = self._shard(user_id)
+        with shard.lock:
+            return u2f.authenticate(self._device(shard, user_id), data, facet,
+                                    check_only)
+
+    def users(self):
+        """
+        Returns the IDs of all users with a device, loading all shards.
+        """
+        users = []
+        for index in range(self.shards):
+            shard = self._load_shard(index)
+            with shard.lock:
+                users.extend(shard.users)
+        return users
+
+    def flush(self):
+        """
+        Writes changed shards to disk.
+        """
+        with self._lock:
+            shards = list(self._shards.values())
+        for shard in shards:
+            with shard.lock:
+                if shard.dirty:
+                    shard.persist()
@@ -0,0 +1,120 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Optional tracing of register and authenticate ceremonies.
+
+Spans are created through a tracer compatible with the OpenTelemetry tracing
+API, which is not a dependency of this library. Tracing is disabled until a
+tracer is set:
+
+    from opentelemetry import trace
+    from u2flib_host import tracing
+
+    tracing.set_tracer(trace.get_tracer('u2flib_host'))
+
+Spans are named u2f.register, u2f.authenticate, u2f.verify_facet,
+u2f.appid.fetch, u2f.appid.suffixes, u2f.get_version, u2f.apdu and
+u2f.touch_wait, and are tagged with the device path and U2FHID channel ID
+where applicable.
+"""
+
+import binascii
+
+__all__ = [
+    'set_tracer',
+    'span',
+    'device_attributes'
+]
+
+
+class _NoopSpan(object):
+
+    def set_attribute(self, key, value):
+        pass
+
+    def record_exception(self, exception, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class NoopTracer(object):
+
+    """
+    Tracer which records nothing, used when tracing is disabled.
+    """
+
+    def start_as_current_span(self, name, *args, **kwargs):
+        return _NOOP_SPAN
+
+
+_tracer = NoopTracer()
+
+
+def set_tracer(tracer):
+    """
+    Sets the tracer used for all spans. None disables tracing.
+    """
+    global _tracer
+    _tracer = tracer if tracer is not None else NoopTracer()
+
+
+def span(name, attributes=None, device=None):
+    """
+    Starts a span as the current span, returning a context manager.
+    If device is given, attributes identifying it are added to the span.
+    """
+    if isinstance(_tracer, NoopTracer):
+        return _NOOP_SPAN
+    if device is not None:
+        attributes = dict(attributes or {})
+        attributes.update(device_attributes(device))
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+def device_attributes(device):
+    """
+    Returns span attributes identifying a device.
+    """
+    attributes = {'u2f.device.type': type(device).__name__}
+    path = getattr(device, 'path', None)
+    if path is not None:
+        if isinstance(path, bytes):
+            path = path.decode('utf8', 'replace')
+        attributes['u2f.device.path'] = path
+    cid = getattr(device, 'cid', None)
+    if isinstance(cid, bytes):
+        attributes['u2f.device.cid'] = binascii.hexlify(cid).decode('ascii')
+    return attributes
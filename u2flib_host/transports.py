@@ -0,0 +1,295 @@
+# Copyright (c) 2018 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Registry of device transports, imported when first used and enumerated in
+parallel.
+"""
+
+from u2flib_host.device import U2FDevice
+from u2flib_host import exc
+from importlib import import_module
+from time import time
+import threading
+
+__all__ = [
+    'Transport',
+    'Enumeration',
+    'TransportRegistry'
+]
+
+# Entry point group through which other packages can add transports. An entry
+# point refers to a module, or any object, with a list_devices() function.
+ENTRY_POINT_GROUP = 'u2flib_host.transports'
+
+DEFAULT_TRANSPORTS = [
+    ('hid', 'u2flib_host.hid_transport'),
+    ('socket', 'u2flib_host.socket_transport')
+]
+
+
+def _entry_points(group):
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        try:
+            import pkg_resources
+        except ImportError:
+            return []
+        return list(pkg_resources.iter_entry_points(group))
+    eps = entry_points()
+    if hasattr(eps, 'select'):
+        return list(eps.select(group=group))
+    return list(eps.get(group, []))
+
+
+class Transport(object):
+
+    """
+    A named transport. The target is either an object with a list_devices()
+    function, the dotted name of a module, or an entry point to load, and is
+    only imported when first needed. Other attributes are those of the
+    loaded target.
+    """
+
+    def __init__(self, name, target):
+        self.name = name
+        self._target = target
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self._module is None:
+                target = self._target
+                if hasattr(target, 'list_devices'):
+                    self._module = target
+                elif hasattr(target, 'load'):
+                    self._module = target.load()
+                else:
+                    self._module = import_module(target)
+            return self._module
+
+    def list_devices(self):
+        return self.load().list_devices()
+
+    def __getattr__(self, name):
+        # Otherwise acts as the module, loading it.
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+    def __repr__(self):
+        return 'Transport(%r)' % self.name
+
+
+class Enumeration(object):
+
+    """
+    The result of listing devices over several transports: the devices found,
+    and per transport name the exception it failed with, and the time it took
+    in seconds.
+    """
+
+    def __init__(self, names):
+        self.names = names
+        self.errors = {}
+        self.timings = {}
+        self._found = {}
+
+    @property
+    def devices(self):
+        # In the order of the transports, not of their completion.
+        return [d for name in self.names for d in self._found.get(name, [])]
+
+    def _add(self, name, devices, error, elapsed):
+        self._found[name] = devices
+        if error is not None:
+            self.errors[name] = error
+        self.timings[name] = elapsed
+
+
+class TransportRegistry(object):
+
+    """
+    Transports to list devices from, by name. The built-in transports are
+    registered up front, others are discovered through the
+    u2flib_host.transports entry point group when first needed.
+
+    For compatibility with the list of transport modules u2f.TRANSPORTS used
+    to be, transports can also be added with append() and insert(), and are
+    then named after their module.
+    """
+
+    def __init__(self, transports=DEFAULT_TRANSPORTS,
+                 group=ENTRY_POINT_GROUP):
+        self._transports = {}
+        self._order = []
+        self._group = group
+        self._lock = threading.Lock()
+        for name, target in transports:
+            self.register(name, target)
+
+    def register(self, name, target):
+        """
+        Adds a transport, replacing any previous one with the same name.
+        """
+        with self._lock:
+            if name not in self._transports:
+                self._order.append(name)
+            self._transports[name] = Transport(name, target)
+
+    def unregister(self, name):
+        with self._lock:
+            if self._transports.pop(name, None) is not None:
+                self._order.remove(name)
+
+    def _name_for(self, target):
+        # The name a transport is registered under, or would be if appended.
+        with self._lock:
+            for name, transport in self._transports.items():
+                if target in (transport._target, transport._module, name) or \
+                        getattr(target, '__name__', None) == transport._target:
+                    return name
+        return getattr(target, '__name__', None) or repr(target)
+
+    def append(self, target):
+        """
+        Adds a transport module, or other object with a list_devices()
+        function, last.
+        """
+        self.register(self._name_for(target), target)
+
+    def insert(self, index, target):
+        """
+        Adds a transport module, or other object with a list_devices()
+        function, at index in the order of transports.
+        """
+        name = self._name_for(target)
+        self.register(name, target)
+        with self._lock:
+            self._order.remove(name)
+            self._order.insert(index, name)
+
+    def remove(self, target):
+        """
+        Removes a transport, given as by append(), or by name.
+        """
+        name = self._name_for(target)
+        if name not in self.names():
+            raise ValueError('No such transport: %r' % (target,))
+        self.unregister(name)
+
+    def _discover(self):
+        with self._lock:
+            group, self._group = self._group, None
+        if group is None:
+            return
+        for ep in _entry_points(group):
+            self.register(ep.name, ep)
+
+    def names(self):
+        self._discover()
+        with self._lock:
+            return list(self._order)
+
+    def get(self, name):
+        self._discover()
+        with self._lock:
+            return self._transports[name]
+
+    def __iter__(self):
+        return iter([self.get(name) for name in self.names()])
+
+    def __len__(self):
+        return len(self.names())
+
+    def __contains__(self, target):
+        return self._name_for(target) in self.names()
+
+    def enumerate(self, names=None, timeout=None):
+        """
+        Lists devices of all transports, or of those named, in parallel.
+        Returns an Enumeration. A failing transport doesn't fail the others,
+        its exception is recorded instead. If timeout is given, transports
+        taking longer are given up on and fail with DeadlineExceededError.
+        """
+        transports = [self.get(name) for name in
+                      (self.names() if names is None else names)]
+        result = Enumeration([t.name for t in transports])
+        lock = threading.Lock()
+
+        def run(transport):
+            start = time()
+            devices, error = [], None
+            try:
+                devices = transport.list_devices()
+            except Exception as e:
+                error = e
+            elapsed = time() - start
+            with lock:
+                if transport.name not in result.timings:
+                    result._add(transport.name, devices, error, elapsed)
+            _record(transport.name, error, elapsed)
+
+        if len(transports) == 1 and timeout is None:
+            run(transports[0])
+            return result
+
+        threads = []
+        for transport in transports:
+            thread = threading.Thread(target=run, args=(transport,),
+                                      name='u2f-list-%s' % transport.name)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        deadline = None if timeout is None else time() + timeout
+        for thread in threads:
+            thread.join(None if deadline is None else
+                        max(0, deadline - time()))
+        with lock:
+            for transport in transports:
+                if transport.name not in result.timings:
+                    result._add(transport.name, [], exc.DeadlineExceededError(
+                        'Listing %s devices timed out' % transport.name),
+                        timeout)
+        return result
+
+    def list_devices(self, names=None):
+        """
+        Lists devices of all transports, or of those named, ignoring failing
+        transports. Use enumerate() to find out about failures.
+        """
+        return self.enumerate(names).devices
+
+
+def _record(name, error, elapsed):
+    metrics = U2FDevice.metrics
+    if metrics is not None:
+        metrics.observe('list_devices', elapsed, transport=name)
+        if error is not None:
+            metrics.count('list_devices_errors', transport=name)
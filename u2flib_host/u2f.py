@@ -26,14 +26,14 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 from u2flib_host import u2f_v2
-from u2flib_host import hid_transport
+from u2flib_host import tracing
+from u2flib_host.transports import TransportRegistry
 from u2flib_host.yubicommon.compat import string_types
+from contextlib import contextmanager
 
 import json
 
-TRANSPORTS = [
-    hid_transport
-]
+TRANSPORTS = TransportRegistry()
 
 LIB_VERSIONS = {
     'U2F_V2': u2f_v2
@@ -41,34 +41,98 @@ LIB_VERSIONS = {
 
 
 def list_devices():
-    # Combine list_devices for all transports, ignoring exceptions.
-    devices = []
-    for transport in TRANSPORTS:
-        try:
-            devices.extend(transport.list_devices())
-        except:
-            pass
-    return devices
+    # Combine list_devices for all transports, skipping failing ones. Their
+    # errors are available through TRANSPORTS.enumerate().
+    transports = TRANSPORTS
+    if not isinstance(transports, TransportRegistry):
+        # Replaced by a list of transport modules, as it used to be.
+        registry = TransportRegistry([], group=None)
+        for transport in transports:
+            registry.append(transport)
+        transports = registry
+    return transports.list_devices()
 
 
-def get_lib(device, data):
+def _parse(data):
     if isinstance(data, string_types):
         data = json.loads(data)
+    return data
 
-    version = data['version']
-    if version not in device.get_supported_versions():
-        raise ValueError("Device does not support U2F version: %s" % version)
+
+def _version(data):
+    # Prepared requests carry their version as an attribute.
+    version = getattr(data, 'version', None)
+    return version if version is not None else data['version']
+
+
+def _lib(version):
     if version not in LIB_VERSIONS:
         raise ValueError("Library does not support U2F version: %s" % version)
-
     return LIB_VERSIONS[version]
 
 
-def register(device, data, facet):
-    lib = get_lib(device, data)
-    return lib.register(device, data, facet)
+def get_lib(device, data):
+    version = _version(_parse(data))
+    if version not in device.get_supported_versions():
+        raise ValueError("Device does not support U2F version: %s" % version)
+
+    return _lib(version)
+
+
+def prepare_register(data, facet):
+    """
+    Parses and verifies a RegisterRequest once, so that it can be passed to
+    register repeatedly, e.g. while waiting for the user to touch a device.
+    """
+    data = _parse(data)
+    return _lib(_version(data)).prepare_register(data, facet)
+
+
+def prepare_authenticate(data, facet):
+    """
+    Parses and verifies an AuthenticateRequest once, so that it can be passed
+    to authenticate repeatedly.
+    """
+    data = _parse(data)
+    return _lib(_version(data)).prepare_authenticate(data, facet)
+
+
+@contextmanager
+def _bounded(device, token):
+    # Sets token on device for the duration of an operation.
+    if token is None:
+        yield
+        return
+    token.check()
+    previous = device.token
+    device.token = token
+    try:
+        yield
+    finally:
+        device.token = previous
+
+
+def register(device, data, facet, token=None):
+    """
+    Registers device using a RegisterRequest. If a CancellationToken is given,
+    the operation is aborted once it is cancelled or reaches its deadline.
+    """
+    data = _parse(data)
+    with tracing.span('u2f.register', {'u2f.facet': facet}, device), \
+            _bounded(device, token):
+        lib = get_lib(device, data)
+        return lib.register(device, data, facet)
 
 
-def authenticate(device, data, facet, check_only=False):
-    lib = get_lib(device, data)
-    return lib.authenticate(device, data, facet, check_only)
+def authenticate(device, data, facet, check_only=False, token=None):
+    """
+    Authenticates using device and an AuthenticateRequest. If a
+    CancellationToken is given, the operation is aborted once it is cancelled
+    or reaches its deadline.
+    """
+    data = _parse(data)
+    with tracing.span('u2f.authenticate', {'u2f.facet': facet,
+                                           'u2f.check_only': check_only},
+                      device), _bounded(device, token):
+        lib = get_lib(device, data)
+        return lib.authenticate(device, data, facet, check_only)
@@ -26,56 +26,148 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 from u2flib_host.constants import INS_ENROLL, INS_SIGN
-from u2flib_host.utils import websafe_decode, websafe_encode
+from u2flib_host.utils import websafe_decode
 from u2flib_host.appid import verify_facet
+from u2flib_host.messages import (RegisterRequest, SignRequest,
+                                  RegisterResponse, SignResponse)
 from u2flib_host.yubicommon.compat import string_types, int2byte
+from u2flib_host import tracing
 
 from hashlib import sha256
 import json
 
 VERSION = 'U2F_V2'
 
+_app_params = {}
+
+
+def _app_param(app_id):
+    try:
+        return _app_params[app_id]
+    except KeyError:
+        if len(_app_params) >= 256:
+            _app_params.clear()
+        app_param = sha256(app_id.encode('utf8')).digest()
+        _app_params[app_id] = app_param
+        return app_param
+
+
+class PreparedRequest(object):
 
-def register(device, data, facet):
     """
-    Register a U2F device
+    A request which has been parsed, verified against a facet and encoded into
+    an APDU payload. It can be sent any number of times, to any device, without
+    redoing that work. Sending it returns a response message if data was a
+    request message, and a dict otherwise.
+    """
 
-    data = {
-        "version": "U2F_V2",
-        "challenge": string, //b64 encoded challenge
-        "appId": string, //app_id
-    }
+    version = VERSION
+    typ = None
+
+    def __init__(self, data, facet):
+        if isinstance(data, string_types):
+            data = json.loads(data)
+
+        if data['version'] != VERSION:
+            raise ValueError('Unsupported U2F version: %s' % data['version'])
+
+        self.data = data
+        self.facet = facet
+        self.typed = isinstance(data, (RegisterRequest, SignRequest))
+
+        app_id = data.get('appId', facet)
+        with tracing.span('u2f.verify_facet', {'u2f.app_id': app_id,
+                                               'u2f.facet': facet}):
+            verify_facet(app_id, facet)
+        self.app_param = _app_param(app_id)
+
+        client_data = {
+            'typ': self.typ,
+            'challenge': data['challenge'],
+            'origin': facet
+        }
+        self.client_data = json.dumps(client_data)
+        self.client_param = sha256(self.client_data.encode('utf8')).digest()
+
+    @classmethod
+    def prepare(cls, data, facet):
+        """
+        Returns data as an instance of cls, prepared for the given facet.
+        """
+        if isinstance(data, cls) and data.facet == facet:
+            return data
+        if isinstance(data, PreparedRequest):
+            data = data.data
+        return cls(data, facet)
+
+
+class PreparedRegistration(PreparedRequest):
+
+    typ = 'navigator.id.finishEnrollment'
+
+    def __init__(self, data, facet):
+        super(PreparedRegistration, self).__init__(data, facet)
+        self.payload = self.client_param + self.app_param
+
+    def send(self, device):
+        p1 = 0x03
+        p2 = 0
+        response = RegisterResponse(
+            device.send_apdu(INS_ENROLL, p1, p2, self.payload),
+            self.client_data)
+        return response if self.typed else response.to_dict()
+
+
+class PreparedAuthentication(PreparedRequest):
+
+    typ = 'navigator.id.getAssertion'
 
+    def __init__(self, data, facet):
+        super(PreparedAuthentication, self).__init__(data, facet)
+        key_handle = websafe_decode(self.data['keyHandle'])
+        self.payload = self.client_param + self.app_param + int2byte(
+            len(key_handle)) + key_handle
+
+    def send(self, device, check_only=False):
+        p1 = 0x07 if check_only else 0x03
+        p2 = 0
+        response = SignResponse(
+            device.send_apdu(INS_SIGN, p1, p2, self.payload),
+            self.client_data, self.data['keyHandle'])
+        return response if self.typed else response.to_dict()
+
+
+def prepare_register(data, facet):
+    """
+    Prepares a RegisterRequest for sending, see register.
     """
+    return PreparedRegistration.prepare(data, facet)
 
-    if isinstance(data, string_types):
-        data = json.loads(data)
 
-    if data['version'] != VERSION:
-        raise ValueError('Unsupported U2F version: %s' % data['version'])
+def prepare_authenticate(data, facet):
+    """
+    Prepares an AuthenticateRequest for sending, see authenticate.
+    """
+    return PreparedAuthentication.prepare(data, facet)
 
-    app_id = data.get('appId', facet)
-    verify_facet(app_id, facet)
-    app_param = sha256(app_id.encode('utf8')).digest()
 
-    client_data = {
-        'typ': 'navigator.id.finishEnrollment',
-        'challenge': data['challenge'],
-        'origin': facet
+def register(device, data, facet):
+    """
+    Register a U2F device
+
+    data = {
+        "version": "U2F_V2",
+        "challenge": string, //b64 encoded challenge
+        "appId": string, //app_id
     }
-    client_data = json.dumps(client_data)
-    client_param = sha256(client_data.encode('utf8')).digest()
 
-    request = client_param + app_param
+    data may also be a messages.RegisterRequest, in which case a
+    messages.RegisterResponse is returned, or the result of prepare_register,
+    which avoids repeating the parsing and facet verification when retrying.
 
-    p1 = 0x03
-    p2 = 0
-    response = device.send_apdu(INS_ENROLL, p1, p2, request)
+    """
 
-    return {
-        'registrationData': websafe_encode(response),
-        'clientData': websafe_encode(client_data)
-    }
+    return prepare_register(data, facet).send(device)
 
 
 def authenticate(device, data, facet, check_only=False):
@@ -89,38 +181,10 @@ def authenticate(device, data, facet, check_only=False):
         'keyHandle': websafe_encode(self.binding.key_handle)
     }
 
-    """
-
-    if isinstance(data, string_types):
-        data = json.loads(data)
-
-    if data['version'] != VERSION:
-        raise ValueError('Unsupported U2F version: %s' % data['version'])
-
-    app_id = data.get('appId', facet)
-    verify_facet(app_id, facet)
-    app_param = sha256(app_id.encode('utf8')).digest()
+    data may also be a messages.SignRequest, in which case a
+    messages.SignResponse is returned, or the result of prepare_authenticate,
+    which avoids repeating the parsing and facet verification when retrying.
 
-    key_handle = websafe_decode(data['keyHandle'])
-
-    # Client data
-    client_data = {
-        'typ': 'navigator.id.getAssertion',
-        'challenge': data['challenge'],
-        'origin': facet
-    }
-    client_data = json.dumps(client_data)
-    client_param = sha256(client_data.encode('utf8')).digest()
-
-    request = client_param + app_param + int2byte(
-        len(key_handle)) + key_handle
-
-    p1 = 0x07 if check_only else 0x03
-    p2 = 0
-    response = device.send_apdu(INS_SIGN, p1, p2, request)
+    """
 
-    return {
-        'clientData': websafe_encode(client_data),
-        'signatureData': websafe_encode(response),
-        'keyHandle': data['keyHandle']
-    }
+    return prepare_authenticate(data, facet).send(device, check_only)
@@ -27,15 +27,37 @@
 
 from u2flib_host.yubicommon.compat import text_type
 
-from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import a2b_base64, b2a_base64
 from hashlib import sha256
 
 __all__ = [
     'u2str',
     'websafe_encode',
-    'websafe_decode'
+    'websafe_decode',
+    'websafe_encode_many',
+    'websafe_decode_many'
 ]
 
+try:
+    _ENCODE = bytes.maketrans(b'+/', b'-_')
+    _DECODE = bytes.maketrans(b'-_', b'+/')
+except AttributeError:  # Python 2
+    from string import maketrans
+    _ENCODE = maketrans(b'+/', b'-_')
+    _DECODE = maketrans(b'-_', b'+/')
+
+# Padding needed, by length modulo 4.
+_PADDING = (b'', b'===', b'==', b'=')
+
+try:
+    b2a_base64(b'', newline=False)
+
+    def _b64encode(data):
+        return b2a_base64(data, newline=False)
+except TypeError:  # Python < 3.6
+    def _b64encode(data):
+        return b2a_base64(data)[:-1]
+
 
 def u2str(data):
     """Recursively converts unicode objects to UTF-8 encoded byte strings."""
@@ -50,13 +72,42 @@ def u2str(data):
 
 
 def websafe_decode(data):
+    """
+    Decodes unpadded URL-safe base64, given as text or any bytes-like object.
+    """
     if isinstance(data, text_type):
         data = data.encode('ascii')
-    data += b'=' * (-len(data) % 4)
-    return urlsafe_b64decode(data)
+    elif isinstance(data, memoryview):
+        data = data.tobytes()
+    # Exactly the missing padding, as a2b_base64 accepts malformed input
+    # given excess padding.
+    return a2b_base64(data.translate(_DECODE) + _PADDING[len(data) % 4])
 
 
 def websafe_encode(data):
+    """
+    Encodes text or any bytes-like object as unpadded URL-safe base64 text.
+    """
     if isinstance(data, text_type):
         data = data.encode('ascii')
-    return urlsafe_b64encode(data).replace(b'=', b'').decode('ascii')
+    return _b64encode(data).translate(_ENCODE).rstrip(b'=').decode('ascii')
+
+
+def websafe_decode_many(items):
+    """
+    Decodes each of items, see websafe_decode, returning a list.
+    """
+    decode, table, padding = a2b_base64, _DECODE, _PADDING
+    return [decode(item.translate(table) + padding[len(item) % 4])
+            if isinstance(item, bytes) else websafe_decode(item)
+            for item in items]
+
+
+def websafe_encode_many(items):
+    """
+    Encodes each of items, see websafe_encode, returning a list.
+    """
+    encode, table = _b64encode, _ENCODE
+    return [encode(item).translate(table).rstrip(b'=').decode('ascii')
+            if not isinstance(item, text_type) else websafe_encode(item)
+            for item in items]